@@ -0,0 +1,105 @@
+"""
+Measure BOMGraph build, rollup and flatten times on a generated BOM, against
+the dict-of-lists walk analyses used to do. No server is involved.
+
+The BOM has --levels levels; every assembly uses --fanout parts picked from
+the next level, so deeper parts are shared by many assemblies.
+
+Usage:
+    python -m benchmarks.bench_bom [--lines N] [--levels N] [--fanout N]
+"""
+from src.api.bom import BOMGraph
+import argparse
+import random
+import time
+import tracemalloc
+
+
+def _generate(lines, levels, fanout):
+    """Return (parent, child, quantity) triples of a layered BOM."""
+    rng = random.Random(0)
+    per_level = max(1, lines // fanout // (levels - 1))
+    names = [['TOP']] + [
+        [f"L{level}-{n}" for n in range(per_level)]
+        for level in range(1, levels)
+    ]
+    triples = []
+
+    for level in range(levels - 1):
+        for parent in names[level]:
+            for child in rng.sample(names[level + 1],
+                                    min(fanout, len(names[level + 1]))):
+                triples.append((parent, child, rng.randint(1, 4)))
+
+    return triples
+
+
+def _dict_rollup(triples):
+    """Total quantities by walking every path with an explicit stack."""
+    children = {}
+
+    for parent, child, quantity in triples:
+        children.setdefault(parent, []).append((child, quantity))
+
+    total = {}
+    stack = [('TOP', 1)]
+
+    while stack:
+        part, quantity = stack.pop()
+        total[part] = total.get(part, 0) + quantity
+
+        for child, per in children.get(part, ()):
+            stack.append((child, quantity * per))
+
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lines', type=int, default=100000)
+    parser.add_argument('--levels', type=int, default=6)
+    parser.add_argument('--fanout', type=int, default=5)
+    args = parser.parse_args()
+
+    triples = _generate(args.lines, args.levels, args.fanout)
+    print(f"{len(triples)} BOM lines")
+
+    start = time.perf_counter()
+    graph = BOMGraph.from_lines(triples)
+    build = time.perf_counter() - start
+
+    tracemalloc.start()
+    BOMGraph.from_lines(triples)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    arrays = (graph.parents.nbytes + graph.children.nbytes
+              + graph.quantities.nbytes)
+
+    start = time.perf_counter()
+    total = graph.rollup('TOP')
+    rollup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    flat = graph.flatten('TOP')
+    flatten = time.perf_counter() - start
+
+    print(f"build        {build * 1000:10.1f} ms, peak "
+          f"{peak / 2 ** 20:.1f} MiB, line arrays {arrays / 2 ** 20:.1f} MiB")
+    print(f"rollup       {rollup * 1000:10.1f} ms")
+    print(f"flatten      {flatten * 1000:10.1f} ms, {len(flat)} parts")
+
+    # the path walk explodes with sharing, so it only runs on shallow BOMs
+    if args.fanout ** (args.levels - 1) <= 10 ** 6:
+        start = time.perf_counter()
+        expected = _dict_rollup(triples)
+        walk = time.perf_counter() - start
+
+        assert all(abs(total[graph.index(part)] - quantity) < 1e-6 * quantity
+                   for part, quantity in expected.items())
+
+        print(f"dict walk    {walk * 1000:10.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
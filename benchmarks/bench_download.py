@@ -0,0 +1,105 @@
+"""
+Measure FilesAPI.download_file throughput for different worker counts
+against the stand-in server, which serves one generated file with Range
+support and a fixed delay per request to model vault latency.
+
+Usage:
+    python -m benchmarks.bench_download [--size MB] [--range-size BYTES]
+        [--latency MS] [--workers 1,4,8]
+"""
+from benchmarks.stand_in_server import StandInHandler, start_server
+from src.api.files import FilesAPI
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import time
+
+
+def _file_handler(content, latency):
+    """Stand-in handler serving content as File 'BENCH'."""
+    checksum = hashlib.md5(content).hexdigest().upper()
+
+    class FileHandler(StandInHandler):
+
+        def do_GET(self):
+            if "File('BENCH')/$value" in self.path:
+                time.sleep(latency)
+                self._send_content()
+            elif "File('BENCH')" in self.path:
+                self._send_json({
+                    'id': 'BENCH',
+                    'filename': 'bench.bin',
+                    'file_size': len(content),
+                    'checksum': checksum
+                })
+            else:
+                super().do_GET()
+
+        def _send_content(self):
+            match = re.match(r'bytes=(\d+)-(\d+)',
+                             self.headers.get('Range', ''))
+
+            if match is None:
+                self.send_response(200)
+                body = memoryview(content)
+            else:
+                start, end = map(int, match.groups())
+                body = memoryview(content)[start:end + 1]
+
+                self.send_response(206)
+                self.send_header(
+                    'Content-Range',
+                    f"bytes {start}-{start + len(body) - 1}/{len(content)}"
+                )
+
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return FileHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=float, default=64)
+    parser.add_argument('--range-size', type=int, default=1024 * 1024)
+    parser.add_argument('--latency', type=float, default=20)
+    parser.add_argument('--workers', default='1,4,8')
+    args = parser.parse_args()
+
+    content = os.urandom(int(args.size * 1024 * 1024))
+
+    server, base_url = start_server(
+        _file_handler(content, args.latency / 1000)
+    )
+
+    files_api = FilesAPI(
+        base_url=base_url,
+        client_id='IOMApp',
+        database='stand-in',
+        username='admin',
+        password_hash=hashlib.md5(b'innovator')
+    )
+
+    directory = tempfile.mkdtemp()
+
+    try:
+        for workers in [int(w) for w in args.workers.split(',')]:
+            start = time.perf_counter()
+            files_api.download_file('BENCH', directory, workers=workers,
+                                    range_size=args.range_size)
+            elapsed = time.perf_counter() - start
+
+            print(f"workers={workers:<3} "
+                  f"{len(content) / elapsed / 2 ** 20:8.1f} MB/s")
+    finally:
+        shutil.rmtree(directory)
+        files_api.close()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Compare requests/sec of unpooled module-level requests calls against the
+pooled session owned by CommonAPI.
+
+Usage:
+    python -m benchmarks.bench_session [--requests N] [--threads T]
+"""
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.stand_in_server import start_server
+from src.api.parts import PartsAPI
+import argparse
+import hashlib
+import requests
+import time
+
+
+def _run(call, total, threads):
+    """Issue `total` calls over `threads` workers and return requests/sec."""
+    start = time.perf_counter()
+
+    if threads == 1:
+        for _ in range(total):
+            call()
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for future in [pool.submit(call) for _ in range(total)]:
+                future.result()
+
+    return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=1)
+    args = parser.parse_args()
+
+    server, base_url = start_server()
+
+    parts_api = PartsAPI(
+        base_url=base_url,
+        client_id='bench',
+        database='bench',
+        username='bench',
+        password_hash=hashlib.md5(b'bench'),
+        pool_maxsize=max(args.threads, 10)
+    )
+
+    part_url = f"{base_url}/server/odata/Part('{'0' * 32}')"
+
+    def unpooled():
+        requests.get(url=part_url, headers=parts_api._headers_auth).json()
+
+    def pooled():
+        parts_api.search_part_id('0' * 32)
+
+    before = _run(unpooled, args.requests, args.threads)
+    after = _run(pooled, args.requests, args.threads)
+
+    print(f"requests: {args.requests}, threads: {args.threads}")
+    print(f"module-level requests (new connection per call): {before:9.1f} req/s")
+    print(f"CommonAPI pooled session (keep-alive):           {after:9.1f} req/s")
+    print(f"speedup: {after / before:.2f}x")
+
+    parts_api.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
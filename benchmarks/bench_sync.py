@@ -0,0 +1,82 @@
+"""
+Measure FilesAPI.sync_directory against the stand-in server: a first sync
+of a generated tree, an incremental sync with nothing changed, and one
+after a fraction of the files was modified.
+
+Usage:
+    python -m benchmarks.bench_sync [--files N] [--file-size BYTES]
+        [--changed PERCENT] [--workers N]
+"""
+from benchmarks.stand_in_server import start_server
+from src.api.files import FilesAPI
+from src.api.transfer import SyncManifest
+import argparse
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=5000)
+    parser.add_argument('--file-size', type=int, default=4096)
+    parser.add_argument('--changed', type=float, default=1)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    server, base_url = start_server()
+
+    files_api = FilesAPI(
+        base_url=base_url,
+        client_id='IOMApp',
+        database='stand-in',
+        username='admin',
+        password_hash=hashlib.md5(b'innovator')
+    )
+
+    directory = tempfile.mkdtemp()
+    paths = []
+
+    try:
+        for n in range(args.files):
+            folder = os.path.join(directory, f"dir{n // 500}")
+            os.makedirs(folder, exist_ok=True)
+
+            path = os.path.join(folder, f"part{n}.step")
+            paths.append(path)
+
+            with open(path, 'wb') as f:
+                f.write(os.urandom(args.file_size))
+
+        manifest = SyncManifest(os.path.join(directory, 'manifest.json'))
+
+        def sync(label):
+            start = time.perf_counter()
+            result = files_api.sync_directory(
+                directory, manifest, workers=args.workers,
+                chunk_size=1024 * 1024
+            )
+            elapsed = time.perf_counter() - start
+
+            print(f"{label:<12} {elapsed:8.2f} s  uploaded "
+                  f"{len(result.uploaded):<6} unchanged "
+                  f"{len(result.unchanged)}")
+
+        sync('first')
+        sync('unchanged')
+
+        for path in paths[:int(len(paths) * args.changed / 100)]:
+            with open(path, 'wb') as f:
+                f.write(os.urandom(args.file_size))
+
+        sync('changed')
+    finally:
+        shutil.rmtree(directory)
+        files_api.close()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Measure FilesAPI.upload_file throughput for different worker counts against
+the stand-in server, with a fixed delay added to every chunk request to
+model vault round-trip latency.
+
+A final run per worker count uses AdaptiveChunkSize and reports the chunk
+sizes it settled on.
+
+Usage:
+    python -m benchmarks.bench_upload [--size MB] [--chunk-size BYTES]
+        [--latency MS] [--workers 1,4,8]
+"""
+from benchmarks.stand_in_server import StandInHandler, start_server
+from src.api.files import FilesAPI
+from src.api.transfer import AdaptiveChunkSize, TransferStats
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+
+
+def _delayed_handler(latency):
+    """Stand-in handler that sleeps `latency` seconds per chunk."""
+
+    class DelayedHandler(StandInHandler):
+
+        def do_POST(self):
+            if 'vault.UploadFile' in self.path:
+                time.sleep(latency)
+
+            super().do_POST()
+
+    return DelayedHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=float, default=8)
+    parser.add_argument('--chunk-size', type=int, default=256 * 1024)
+    parser.add_argument('--latency', type=float, default=10)
+    parser.add_argument('--workers', default='1,4,8')
+    args = parser.parse_args()
+
+    server, base_url = start_server(_delayed_handler(args.latency / 1000))
+
+    files_api = FilesAPI(
+        base_url=base_url,
+        client_id='IOMApp',
+        database='stand-in',
+        username='admin',
+        password_hash=hashlib.md5(b'innovator')
+    )
+
+    handle, path = tempfile.mkstemp()
+    size = int(args.size * 1024 * 1024)
+
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            f.write(os.urandom(size))
+
+        for workers in [int(w) for w in args.workers.split(',')]:
+            start = time.perf_counter()
+            files_api.upload_file(path, 'BENCH-1', workers=workers,
+                                  chunk_size=args.chunk_size)
+            elapsed = time.perf_counter() - start
+
+            print(f"workers={workers:<3} {size / elapsed / 2 ** 20:8.1f} MB/s")
+
+            stats = TransferStats()
+            files_api.upload_file(path, 'BENCH-1', workers=workers,
+                                  chunk_size=AdaptiveChunkSize(),
+                                  stats=stats)
+
+            print(f"workers={workers:<3} {stats.mb_per_second:8.1f} "
+                  f"MB/s adaptive, largest chunk "
+                  f"{max(stats.chunk_sizes) // 1024} KiB, chunk latency "
+                  f"p50 {stats.latency_percentile(50) * 1000:.0f} ms "
+                  f"p95 {stats.latency_percentile(95) * 1000:.0f} ms, "
+                  f"commit {stats.phases['commit'] * 1000:.0f} ms")
+    finally:
+        os.remove(path)
+        files_api.close()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Measure client CPU time and peak Python memory per GB uploaded by
+FilesAPI.upload_file.
+
+Chunk requests go through the full requests stack but are answered by an
+adapter that never touches the network, so the numbers cover reading the
+file, building headers and preparing requests, not socket time.
+
+Usage:
+    python -m benchmarks.bench_upload_cpu [--size MB] [--chunk-size BYTES]
+        [--workers N]
+"""
+from benchmarks.stand_in_server import start_server
+from requests.adapters import BaseAdapter
+from src.api.files import FilesAPI
+import argparse
+import hashlib
+import os
+import requests
+import tempfile
+import time
+import tracemalloc
+
+
+class NullAdapter(BaseAdapter):
+    """
+    Answers every request with an empty 200 after touching its body.
+    """
+
+    def send(self, request, **kwargs):
+        if request.body is not None:
+            memoryview(request.body)
+
+        response = requests.Response()
+        response.status_code = 200
+        response.request = request
+        response._content = b'{}'
+
+        return response
+
+    def close(self):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=256)
+    parser.add_argument('--chunk-size', type=int, default=1024 * 1024)
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+
+    server, base_url = start_server()
+
+    files_api = FilesAPI(
+        base_url=base_url,
+        client_id='IOMApp',
+        database='stand-in',
+        username='admin',
+        password_hash=hashlib.md5(b'innovator')
+    )
+
+    # Authenticated and transaction ids come from the stand-in; chunks and
+    # commits are swallowed by the null adapter.
+    transaction_id = files_api._get_transaction_id()
+    files_api._get_transaction_id = lambda: transaction_id
+    files_api._session.mount('http://', NullAdapter())
+
+    handle, path = tempfile.mkstemp()
+    size = args.size * 1024 * 1024
+
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            f.write(os.urandom(size))
+
+        def upload():
+            files_api.upload_file(path, 'BENCH-1', workers=args.workers,
+                                  chunk_size=args.chunk_size)
+
+        # warm the page cache
+        upload()
+
+        cpu = time.process_time()
+        upload()
+        cpu = time.process_time() - cpu
+
+        tracemalloc.start()
+        upload()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        per_gb = 2 ** 30 / size
+        print(f"CPU time     {cpu * per_gb:8.3f} s/GB")
+        print(f"peak memory  {peak / 2 ** 20:8.2f} MiB")
+    finally:
+        os.remove(path)
+        files_api.close()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Minimal local stand-in for an InnovatorServer used by the benchmarks.
+
+It answers the OAuth discovery and token requests made by CommonAPI and
+returns small canned OData payloads for everything else, so the numbers
+measure client overhead rather than server work.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Request handler speaking keep-alive HTTP/1.1.
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    # Buffer writes so headers and body leave in one segment; the base
+    # handler flushes after every request.
+    wbufsize = 64 * 1024
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+
+        return self.rfile.read(length) if length else b''
+
+    def do_GET(self):
+        if self.path.endswith('/.well-known/openid-configuration'):
+            host = self.headers['Host']
+            self._send_json({
+                'token_endpoint': f"http://{host}/OAuthServer/connect/token"
+            })
+            return
+
+        self._send_json({
+            'value': [{'id': '0' * 32, 'item_number': '0403'}]
+        })
+
+    def do_POST(self):
+        self._read_body()
+
+        if self.path.endswith('/connect/token'):
+            self._send_json({
+                'access_token': 'stand-in-token',
+                'expires_in': 3600,
+                'token_type': 'Bearer'
+            })
+            return
+
+        if self.path.endswith('vault.BeginTransaction'):
+            self._send_json({'transactionId': 'stand-in-transaction'})
+            return
+
+        self._send_json({'id': '0' * 32})
+
+    def do_PATCH(self):
+        self._read_body()
+        self._send_json({'id': '0' * 32})
+
+    def do_DELETE(self):
+        self.send_response(204)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+def start_server(handler=StandInHandler):
+    """
+    Start the stand-in server on a free local port in a daemon thread.
+
+    Returns the server and the base_url to hand to the API classes.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    host, port = server.server_address
+
+    return server, f"http://{host}:{port}/InnovatorServer"
@@ -1,6 +1,10 @@
 from . import (
+    auth,
     common,
     parts,
     documents,
-    files
+    files,
+    airworthiness,
+    client
 )
+from .client import ArasClient
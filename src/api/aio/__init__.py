@@ -0,0 +1,12 @@
+from . import (
+    common,
+    parts,
+    documents,
+    files,
+    airworthiness
+)
+from .common import AsyncCommonAPI
+from .parts import AsyncPartsAPI
+from .documents import AsyncDocumentAPI
+from .files import AsyncFilesAPI
+from .airworthiness import AsyncAirworthinessAPI
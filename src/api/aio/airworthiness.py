@@ -0,0 +1,9 @@
+from .common import AsyncCommonAPI
+from ..airworthiness import _AirworthinessMethods
+
+
+class AsyncAirworthinessAPI(_AirworthinessMethods, AsyncCommonAPI):
+    """
+    Asyncio counterpart of AirworthinessAPI. Every method is awaited, except
+    the iter_ methods, which are used with ``async for``.
+    """
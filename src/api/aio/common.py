@@ -0,0 +1,477 @@
+from ..auth import default_token_store
+from ..common import _password_hash_str, _validate_credentials
+from ..query import Query, encode_params
+import aiohttp
+import asyncio
+
+
+class AsyncCommonAPI:
+    """
+    Asyncio counterpart of CommonAPI.
+
+    The object is not usable until it has been opened, preferably with
+    ``async with``::
+
+        async with AsyncPartsAPI(base_url, client_id, database, username,
+                                 password_hash) as parts_api:
+            part = await parts_api.search_part_id(part_id)
+
+    Parameters
+    ----------
+    base_url : str
+        The url where Aras Innovator is hosted.
+        e.g. http://innovator.hangar18.io/InnovatorServer
+    client_id : str
+        OAuth client ID, see Innovator deployment docs to learn what this is
+        and where to find it.
+    database : str
+        Name of the Aras database to connect to.
+    username : str
+        Name of the Aras user to log in as.
+    password_hash : hashlib._hashlib.HASH or None
+        An md5 hash of the user's password. If this is None or the arg is
+        omitted, the user will be prompted for the password via getpass.
+    concurrency : int
+        Maximum number of requests this object keeps in flight at once.
+        Defaults to 100.
+    pool_limit : int
+        Maximum number of open connections held by the connection pool.
+        Defaults to 100.
+    limit_per_host : int
+        Maximum number of open connections to a single host. 0 means no
+        per-host limit. Defaults to 0.
+    token_store : src.api.auth.TokenStore or None
+        Cache for discovery documents and access tokens, shared with the
+        blocking API classes. If omitted, a process-wide in-memory store is
+        used.
+    """
+    def __init__(self, base_url, client_id, database, username,
+                 password_hash=None, concurrency=100, pool_limit=100,
+                 limit_per_host=0, token_store=None):
+
+        _validate_credentials(
+            base_url, client_id, database, username, password_hash
+        )
+
+        if not isinstance(concurrency, int) or concurrency < 1:
+            raise ValueError(
+                "The concurrency parameter must be a positive integer."
+            )
+
+        if not isinstance(pool_limit, int) or pool_limit < 1:
+            raise ValueError(
+                "The pool_limit parameter must be a positive integer."
+            )
+
+        if not isinstance(limit_per_host, int) or limit_per_host < 0:
+            raise ValueError(
+                "The limit_per_host parameter must be a non-negative integer."
+            )
+
+        self._base_url = base_url
+        self._client_id = client_id
+        self._database = database
+        self._username = username
+
+        self._pool_limit = pool_limit
+        self._limit_per_host = limit_per_host
+        self._concurrency = concurrency
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+        self._password_hash = password_hash
+        self._password_hash_str = None
+
+        self._token_store = (
+            token_store if token_store is not None else default_token_store
+        )
+        self._token_key = self._token_store.make_key(
+            base_url, database, client_id, username, password_hash
+        )
+        self._token_lock = asyncio.Lock()
+
+        self._session = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def open(self):
+        """
+        Create the connection pool and obtain an access token.
+        """
+        if self._session is not None:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=self._pool_limit,
+            limit_per_host=self._limit_per_host
+        )
+        self._session = aiohttp.ClientSession(connector=connector)
+
+        try:
+            await self._get_token()
+        except BaseException:
+            await self.close()
+            raise
+
+    async def close(self):
+        """
+        Close the connection pool.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _get_token(self):
+        """
+        Return a valid access token, authenticating only when the token store
+        holds no usable token for these credentials.
+        """
+        token = self._token_store.get_token(self._token_key)
+
+        if token is not None:
+            return token
+
+        async with self._token_lock:
+            token = self._token_store.get_token(self._token_key)
+
+            if token is None:
+                token = await self._authenticate()
+
+        return token
+
+    async def _authenticate(self):
+        """
+        Obtain a new access token, preferring the refresh token grant and
+        falling back to the password grant.
+        """
+        discovery = self._token_store.get_discovery(self._token_key)
+
+        if discovery is None:
+            oauth_query_url = (
+                f"{self._base_url}/OAuthServer/.well-known/"
+                "openid-configuration"
+            )
+
+            async with self._session.get(oauth_query_url) as response:
+                response.raise_for_status()
+                discovery = await response.json(content_type=None)
+
+            self._token_store.set_discovery(self._token_key, discovery)
+
+        token_endpoint_url = discovery['token_endpoint']
+
+        refresh_token = self._token_store.get_refresh_token(self._token_key)
+
+        if refresh_token is not None:
+            async with self._session.post(
+                token_endpoint_url,
+                data={
+                    "grant_type": "refresh_token",
+                    "client_id": self._client_id,
+                    "refresh_token": refresh_token
+                }
+            ) as response:
+                if response.ok:
+                    token = await response.json(content_type=None)
+                    self._token_store.set_token(self._token_key, token)
+
+                    return token["access_token"]
+
+        if self._password_hash_str is None:
+            self._password_hash_str = _password_hash_str(self._password_hash)
+
+        request_body = {
+            "grant_type": "password",
+            "scope": "Innovator",
+            "client_id": self._client_id,
+            "username": self._username,
+            "password": self._password_hash_str,
+            "database": self._database
+        }
+
+        async with self._session.post(
+            token_endpoint_url,
+            data=request_body
+        ) as response:
+            response.raise_for_status()
+            token = await response.json(content_type=None)
+
+        self._token_store.set_token(self._token_key, token)
+
+        return token["access_token"]
+
+    def query(self, item_type):
+        """
+        Start a composable OData query against an entity set. Execute it
+        with ``await query.get()``, ``await query.count()`` or
+        ``async for record in query.iter()``.
+
+        Parameters
+        ----------
+        item_type : str
+            Entity set or navigation path, e.g. "Part".
+        """
+        return Query(self, item_type)
+
+    async def _execute_query(self, query):
+        """
+        Run a Query and return the decoded response.
+        """
+        query_response = await self._request(
+            "GET",
+            url=query.url(self._base_url)
+        )
+
+        return await self._json(query_response)
+
+    async def _count_query(self, query):
+        """
+        Run a Query with $count and return the number of matching rows.
+        """
+        count_query = query.top(0)
+        query_url = count_query.url(self._base_url)
+        query_url += ("&" if "?" in query_url else "?") + "$count=true"
+
+        query_response = await self._request(
+            "GET",
+            url=query_url
+        )
+        query_response.raise_for_status()
+
+        return (await self._json(query_response))['@odata.count']
+
+    async def _get_json(self, url, tags=(), tags_from=None):
+        """
+        GET a url and return the decoded body. The asyncio API has no
+        response cache, so the cache tags are ignored.
+        """
+        query_response = await self._request("GET", url=url)
+
+        return await self._json(query_response)
+
+    async def _request_json(self, method, url, data=None, invalidate=None):
+        """
+        Send a request and return the decoded body, see
+        CommonAPI._request_json. There is no cache to invalidate.
+        """
+        query_response = await self._request(method, url=url, data=data)
+
+        return await self._json(query_response)
+
+    async def _delete_item(self, url, item_type, item_id):
+        """
+        Send a DELETE request for an item and return the response.
+        """
+        return await self._request("DELETE", url=url)
+
+    @staticmethod
+    async def _run(steps):
+        """
+        Run the generator of a method decorated with _steps, awaiting every
+        coroutine it yields and sending back the result, or throwing in the
+        exception, as an await in its place would.
+        """
+        value = None
+        error = None
+
+        while True:
+            try:
+                if error is None:
+                    step = steps.send(value)
+                else:
+                    step = steps.throw(error)
+            except StopIteration as stop:
+                return stop.value
+
+            try:
+                value = await step
+                error = None
+            except BaseException as step_error:
+                value = None
+                error = step_error
+
+    @staticmethod
+    async def _map(function, items, workers):
+        """
+        Return [await function(item) for item in items], awaiting up to
+        workers calls at once.
+        """
+        slots = asyncio.Semaphore(workers)
+
+        async def call(item):
+            async with slots:
+                return await function(item)
+
+        return await asyncio.gather(*[call(item) for item in items])
+
+    @staticmethod
+    async def _collect(records):
+        """
+        Return the records of an async iterator, e.g. Query.iter(), as a
+        list.
+        """
+        return [record async for record in records]
+
+    @staticmethod
+    async def _run_blocking(function, *args):
+        """
+        Call a function that blocks on disk or CPU, e.g. a hash of a file,
+        in the default executor.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            None, function, *args
+        )
+
+    @staticmethod
+    def _status_code(response):
+        """
+        Return the HTTP status of a response returned by _request.
+        """
+        return response.status
+
+    @staticmethod
+    async def _content(response):
+        """
+        Return the body of a response returned by _request as bytes.
+        """
+        return await response.read()
+
+    def _iter_items(self, item_type, page_size=1000, params=None,
+                    stream=False):
+        """
+        Asynchronously yield the records of an item type page by page. See
+        CommonAPI._iter_items. Pages are always decoded whole, streaming is
+        only offered by the blocking API.
+        """
+        if stream:
+            raise ValueError(
+                "stream is only supported by the blocking API."
+            )
+
+        if not isinstance(page_size, int) or page_size < 1:
+            raise ValueError("page_size must be a positive integer.")
+
+        query_url = f"{self._base_url}/server/odata/{item_type}"
+
+        query_params = {'$orderby': 'id'}
+
+        if params is not None:
+            query_params.update(params)
+
+        # Keep page boundaries stable when sorting on a non-unique column.
+        order_keys = [key.split()[0] for key in
+                      query_params['$orderby'].split(',')]
+        if 'id' not in order_keys:
+            query_params['$orderby'] += ',id'
+
+        query_params['$top'] = page_size
+        query_params['$skip'] = 0
+
+        return self._follow_pages(query_url, query_params, page_size)
+
+    async def _follow_pages(self, query_url, query_params, page_size):
+        """
+        Async generator behind _iter_items, requesting one page per step.
+        """
+        while query_url is not None:
+            page_url = query_url
+
+            if query_params is not None:
+                page_url += "?" + encode_params(query_params)
+
+            query_response = await self._request(
+                "GET",
+                url=page_url
+            )
+            query_response.raise_for_status()
+
+            page = await self._json(query_response)
+            records = page.get('value', [])
+
+            for record in records:
+                yield record
+
+            next_link = page.get('@odata.nextLink')
+
+            if next_link is not None:
+                query_url = next_link
+                query_params = None
+            elif query_params is not None and len(records) == page_size:
+                query_params['$skip'] += page_size
+            else:
+                query_url = None
+
+    async def _request(self, method, url, headers=None, **kwargs):
+        """
+        Send an authorized request through the pooled session. A 401
+        response invalidates the cached token and the request is retried once
+        with a new one.
+
+        The response body is read before the connection is released, so
+        ``await response.json()`` and ``await response.read()`` remain
+        usable on the returned response.
+
+        Parameters
+        ----------
+        method : str
+            HTTP verb, e.g. "GET" or "POST".
+        url : str
+            Fully qualified url of the request.
+        headers : dict or None
+            Extra headers of the request. The dict is sent as it is, with
+            its Authorization header set in place, so a caller sending many
+            requests can build it once and reuse it.
+        **kwargs
+            Passed through to aiohttp.ClientSession.request.
+        """
+        if self._session is None:
+            raise RuntimeError(
+                "The API object is not open. Use 'async with' or await "
+                "open() before making requests."
+            )
+
+        token = await self._get_token()
+
+        response = await self._send(method, url, token, headers, **kwargs)
+
+        if response.status == 401:
+            self._token_store.invalidate(self._token_key, token)
+            token = await self._get_token()
+            response = await self._send(method, url, token, headers, **kwargs)
+
+        return response
+
+    async def _send(self, method, url, token, headers=None, **kwargs):
+        """
+        Send a single request authorized with the given token. The
+        Authorization header is set in headers itself rather than in a copy.
+        """
+        if headers is None:
+            headers = {}
+
+        headers["Authorization"] = f"Bearer {token}"
+
+        async with self._semaphore:
+            # Not a context manager: leaving one releases the response and
+            # aiohttp then refuses read(). Reading the whole body returns
+            # the connection to the pool all the same.
+            response = await self._session.request(
+                method,
+                url,
+                headers=headers,
+                **kwargs
+            )
+            await response.read()
+
+        return response
+
+    @staticmethod
+    async def _json(response):
+        """
+        Decode the body of a response returned by _request.
+        """
+        return await response.json(content_type=None)
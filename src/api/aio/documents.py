@@ -0,0 +1,9 @@
+from .common import AsyncCommonAPI
+from ..documents import _DocumentMethods
+
+
+class AsyncDocumentAPI(_DocumentMethods, AsyncCommonAPI):
+    """
+    Asyncio counterpart of DocumentAPI. Every method is awaited, except
+    iter_documents, which is used with ``async for``.
+    """
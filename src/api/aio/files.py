@@ -0,0 +1,133 @@
+from .common import AsyncCommonAPI
+from ..files import _FileMethods, _escape_url, _upload_options
+from ..transfer import AdaptiveChunkSize, measure, missing_ranges
+import asyncio
+import time
+
+
+class AsyncFilesAPI(_FileMethods, AsyncCommonAPI):
+    """
+    Asyncio counterpart of FilesAPI. Every method is awaited, except
+    iter_files, which is used with ``async for``. Chunks are sent by
+    concurrent tasks and the first failed chunk cancels the others.
+    Downloads and sync_directory are only offered by the blocking API.
+    """
+    def _upload_options(self, workers, chunk_size):
+        """
+        Applies the defaults to and validates the worker count and chunk
+        size of an upload. Workers default to the concurrency limit.
+        """
+        return _upload_options(workers, chunk_size, self._concurrency,
+                               self.CHUNK_SIZE)
+
+    async def _send_source_chunks(self, source, transaction_id, file_id,
+                                  file_name, chunk_size, workers, stats,
+                                  done, on_chunk):
+        """
+        Sends the chunks of an opened UploadSource, see _send_file_chunks.
+        """
+        size = source.size
+
+        if done and not source.random_access:
+            raise ValueError(
+                "Only random access sources can skip acknowledged ranges."
+            )
+
+        upload_url = (
+            f"{self._base_url}/vault/odata/vault."
+            f"UploadFile?fileId={file_id}"
+        )
+
+        upload_headers = {
+            'Content-Disposition': (
+                "attachment; filename*=utf-8''" + _escape_url(file_name)
+            ),
+            'Content-Type': "application/octet-stream",
+            'transactionid': transaction_id
+        }
+
+        adaptive = isinstance(chunk_size, AdaptiveChunkSize)
+        gaps = missing_ranges(done, size)
+
+        async def worker():
+            # one dict per worker, sent as is with every chunk: only
+            # Content-Range and the Authorization set by _send change
+            headers = dict(upload_headers)
+
+            while gaps:
+                start, end = gaps[0]
+
+                if start >= end:
+                    gaps.pop(0)
+                    continue
+
+                length = chunk_size.size if adaptive else chunk_size
+                length = min(length, end - start)
+                gaps[0][0] = start + length
+
+                # nothing is awaited between claiming and reading the range,
+                # so sequential sources are read in order
+                chunk = source.chunk(start, length)
+
+                headers['Content-Range'] = (
+                    f"bytes {start}-{start + length - 1}/{size}"
+                )
+
+                sent = time.perf_counter()
+
+                try:
+                    response = await self._request(
+                        "POST",
+                        url=upload_url,
+                        headers=headers,
+                        data=chunk
+                    )
+                except Exception:
+                    if adaptive:
+                        chunk_size.record_failure()
+
+                    raise
+                finally:
+                    if isinstance(chunk, memoryview):
+                        chunk.release()
+
+                seconds = time.perf_counter() - sent
+
+                if response.status != 200:
+                    if adaptive:
+                        chunk_size.record_failure()
+
+                    raise ValueError(
+                        "Chunk Verification Failed. Data may be corrupted."
+                    )
+
+                if adaptive:
+                    chunk_size.record(length, seconds)
+
+                if stats is not None:
+                    stats.record_chunk(start, length, seconds)
+
+                if on_chunk is not None:
+                    on_chunk(start, length)
+
+        remaining = sum(end - start for start, end in gaps)
+        first_size = chunk_size.size if adaptive else chunk_size
+        worker_count = max(1, min(workers, -(-remaining // first_size)))
+
+        if stats is not None:
+            stats.add_size(size)
+
+        with measure(stats, "chunks"):
+            tasks = [
+                asyncio.ensure_future(worker()) for _ in range(worker_count)
+            ]
+
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                # Fail fast, the transaction will not be committed anyway.
+                for task in tasks:
+                    task.cancel()
+
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
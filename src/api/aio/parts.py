@@ -0,0 +1,10 @@
+from .common import AsyncCommonAPI
+from ..parts import _PartMethods
+
+
+class AsyncPartsAPI(_PartMethods, AsyncCommonAPI):
+    """
+    Asyncio counterpart of PartsAPI. Every method is awaited, except
+    iter_parts, which is used with ``async for``. create_parts and
+    where_used_index are only offered by the blocking API.
+    """
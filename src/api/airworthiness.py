@@ -1,12 +1,14 @@
 from .common import CommonAPI
 import json
-import requests
 
 
-class AirworthinessAPI(CommonAPI):
+class _AirworthinessMethods:
     """
-    Container for methods pertaining to the custom parameters for Airworthiness
-    in the Aras Innovator Space.
+    Airworthiness methods shared by AirworthinessAPI and
+    AsyncAirworthinessAPI. They are built on the request primitives of
+    CommonAPI and AsyncCommonAPI, so each returns its result on the
+    blocking API and a coroutine, or an async iterator for the iter_
+    methods, on the asyncio one.
     """
     def get_aw_parameter_list(self):
         """
@@ -14,12 +16,29 @@ class AirworthinessAPI(CommonAPI):
         """
         query_url = f"{self._base_url}/server/odata/Airworthiness Parameter"
 
-        query_response = requests.get(
-            url=query_url,
-            headers=self._headers_auth
-        )
+        return self._request_json("GET", url=query_url)
 
-        return query_response.json()
+    def iter_aw_parameters(self, page_size=1000, stream=False):
+        """
+        Yield every Airworthiness Parameter as a dict, ordered by id.
+
+        The paged counterpart of get_aw_parameter_list: parameters arrive
+        page_size at a time instead of in one response.
+
+        Parameters
+        ----------
+        page_size: int
+            number of records requested per round trip.
+
+        stream: bool
+            decode each page incrementally while it downloads, yielding
+            records before the whole page has arrived. Blocking API only.
+        """
+        return self._iter_items(
+            "Airworthiness Parameter",
+            page_size=page_size,
+            stream=stream
+        )
 
     def search_aw_parameter_id(self, parameter_id):
         """
@@ -36,13 +55,11 @@ class AirworthinessAPI(CommonAPI):
             f"Airworthiness Parameter('{parameter_id}')"
         )
 
-        query_response = requests.get(
-            url=query_url,
-            headers=self._headers_auth
+        return self._get_json(
+            query_url,
+            tags=[("Airworthiness Parameter", parameter_id)]
         )
 
-        return query_response.json()
-
     def create_aw_parameter(self, metadata):
         """
         Creates a new entry within the Airworthiness Parameter database.
@@ -66,20 +83,18 @@ class AirworthinessAPI(CommonAPI):
                     f"Invalid entry '{key}'. Valid entries are {valid_keys}"
                 )
 
-        self._validate_metadata(metadata)
+        _validate_metadata(metadata)
 
         converted_metadata = json.dumps(metadata)
 
         query_url = f"{self._base_url}/server/odata/Airworthiness Parameter"
 
-        query_response = requests.post(
+        return self._request_json(
+            "POST",
             url=query_url,
-            headers=self._headers_auth,
             data=converted_metadata
         )
 
-        return query_response.json()
-
     def edit_aw_parameter(self, parameter_id, metadata):
         """
         Edits an existing Airworthiness Parameter.
@@ -111,7 +126,7 @@ class AirworthinessAPI(CommonAPI):
                     f"Invalid key '{key}'. Valid entries are {valid_keys}"
                 )
 
-        self._validate_metadata(metadata)
+        _validate_metadata(metadata)
 
         converted_metadata = json.dumps(metadata)
 
@@ -120,14 +135,13 @@ class AirworthinessAPI(CommonAPI):
             f"Parameter('{parameter_id}')"
         )
 
-        query_response = requests.patch(
+        return self._request_json(
+            "PATCH",
             url=query_url,
-            headers=self._headers_auth,
-            data=converted_metadata
+            data=converted_metadata,
+            invalidate=("Airworthiness Parameter", parameter_id)
         )
 
-        return query_response.json()
-
     def delete_aw_parameter(self, parameter_id):
         """
         Deletes an Airworthiness Parameter entry.
@@ -147,13 +161,12 @@ class AirworthinessAPI(CommonAPI):
             f"Airworthiness Parameter('{parameter_id}')"
         )
 
-        query_response = requests.delete(
-            url=query_url,
-            headers=self._headers_auth
+        return self._delete_item(
+            query_url,
+            "Airworthiness Parameter",
+            parameter_id
         )
 
-        return query_response
-
     def get_aw_para_assessment_list(self):
         """
         Returns a list of Airworthiness Parameter Assessment entries.
@@ -162,12 +175,30 @@ class AirworthinessAPI(CommonAPI):
             f"{self._base_url}/server/odata/Airworthiness Para Assessment"
         )
 
-        query_response = requests.get(
-            url=query_url,
-            headers=self._headers_auth
-        )
+        return self._request_json("GET", url=query_url)
+
+    def iter_aw_para_assessments(self, page_size=1000, stream=False):
+        """
+        Yield every Airworthiness Parameter Assessment entry as a dict,
+        ordered by id.
+
+        The paged counterpart of get_aw_para_assessment_list, for walking
+        the assessments without holding all of them in memory.
+
+        Parameters
+        ----------
+        page_size: int
+            number of records requested per round trip.
 
-        return query_response.json()
+        stream: bool
+            decode each page incrementally while it downloads, yielding
+            records before the whole page has arrived. Blocking API only.
+        """
+        return self._iter_items(
+            "Airworthiness Para Assessment",
+            page_size=page_size,
+            stream=stream
+        )
 
     def search_aw_para_assessment_id(self, parameter_id):
         """
@@ -187,13 +218,11 @@ class AirworthinessAPI(CommonAPI):
             f"('{parameter_id}')"
         )
 
-        query_response = requests.get(
-            url=query_url,
-            headers=self._headers_auth
+        return self._get_json(
+            query_url,
+            tags=[("Airworthiness Para Assessment", parameter_id)]
         )
 
-        return query_response.json()
-
     def edit_aw_parameter_assessment(self, parameter_id, metadata):
         """
         Edit the metadata for an Airworthiness Parameter Assessment entry.
@@ -231,7 +260,7 @@ class AirworthinessAPI(CommonAPI):
                     f"Invalid key '{key}'. Valid keys are {VALID_KEYS}"
                 )
 
-        self._validate_metadata(metadata)
+        _validate_metadata(metadata)
 
         query_url = (
             f"{self._base_url}/server/odata/Airworthiness Para"
@@ -240,14 +269,13 @@ class AirworthinessAPI(CommonAPI):
 
         converted_metadata = json.dumps(metadata)
 
-        query_response = requests.patch(
+        return self._request_json(
+            "PATCH",
             url=query_url,
-            headers=self._headers_auth,
-            data=converted_metadata
+            data=converted_metadata,
+            invalidate=("Airworthiness Para Assessment", parameter_id)
         )
 
-        return query_response.json()
-
     def create_aw_parameter_assessment(self, metadata):
         """
         Creates a new Airworthiness Parameter Assessment entry.
@@ -281,7 +309,7 @@ class AirworthinessAPI(CommonAPI):
                     f"Invalid key '{key}'. Valid keys are {VALID_KEYS}"
                 )
 
-        self._validate_metadata(metadata)
+        _validate_metadata(metadata)
 
         query_url = (
             f"{self._base_url}/server/odata/Airworthiness Para Assessment"
@@ -289,14 +317,12 @@ class AirworthinessAPI(CommonAPI):
 
         converted_metadata = json.dumps(metadata)
 
-        query_response = requests.post(
+        return self._request_json(
+            "POST",
             url=query_url,
-            headers=self._headers_auth,
             data=converted_metadata
         )
 
-        return query_response.json()
-
     def delete_aw_assessment_parameter(self, parameter_id):
         """
         Deletes an Airworthiness Assessment Parameter entry.
@@ -314,47 +340,54 @@ class AirworthinessAPI(CommonAPI):
             f" Assessment('{parameter_id}')"
         )
 
-        query_response = requests.delete(
-            url=query_url,
-            headers=self._headers_auth
+        return self._delete_item(
+            query_url,
+            "Airworthiness Para Assessment",
+            parameter_id
         )
 
-        return query_response
 
-    def _validate_metadata(self, metadata):
-        """
-        Validates standard metadata entries for proper formatting.
+class AirworthinessAPI(_AirworthinessMethods, CommonAPI):
+    """
+    Container for methods pertaining to the custom parameters for Airworthiness
+    in the Aras Innovator Space.
+    """
 
-        Parameters
-        ----------
-        metadata: dict
-            dictionary of items being validated
-        """
 
-        if not isinstance(metadata, dict):
-            raise TypeError('metadata must be a key, value formatted dict')
-
-        keys = {
-            'aw_para': str,
-            'na_rationale': str,
-            'non_compliance_rationale': str,
-            'oem': str,
-            'oem_expected_compliance': str,
-            'oem_method_of_compliance': str,
-            'oem_responsible_engineer': str,
-            'oem_standard': str,
-            'friendly_name': str,
-            'compliance': bool,
-            'parameter_number': str,
-            'standard': str,
-            'certification_criteria': str,
-            'method_of_compliance': str
-        }
-
-        for title, entry in metadata.items():
-            for key, value in keys.items():
-                if title == key and type(entry) != value:
-                    raise TypeError(
-                        f"{title} contains invalid data type. Must be "
-                        f"formatted as a {value}."
-                    )
+def _validate_metadata(metadata):
+    """
+    Validates standard metadata entries for proper formatting.
+
+    Parameters
+    ----------
+    metadata: dict
+        dictionary of items being validated
+    """
+
+    if not isinstance(metadata, dict):
+        raise TypeError('metadata must be a key, value formatted dict')
+
+    keys = {
+        'aw_para': str,
+        'na_rationale': str,
+        'non_compliance_rationale': str,
+        'oem': str,
+        'oem_expected_compliance': str,
+        'oem_method_of_compliance': str,
+        'oem_responsible_engineer': str,
+        'oem_standard': str,
+        'friendly_name': str,
+        'compliance': bool,
+        'parameter_number': str,
+        'standard': str,
+        'certification_criteria': str,
+        'method_of_compliance': str
+    }
+
+    for title, entry in metadata.items():
+        for key, value in keys.items():
+            if title == key and type(entry) != value:
+                raise TypeError(
+                    f"{title} contains invalid data type. Must be "
+                    f"formatted as a {value}."
+                )
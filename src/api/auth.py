@@ -0,0 +1,184 @@
+from .jsonfile import load_json, save_json
+import hashlib
+import json
+import threading
+import time
+
+
+class TokenStore:
+    """
+    Cache of OAuth discovery documents and access tokens shared between API
+    objects.
+
+    Entries are keyed by (base_url, database, client_id, username) and a
+    digest of the password hash, so a token is only reused by objects
+    holding the credentials it was issued for. When a path is given the
+    cache is persisted to that JSON file, so a new process can reuse a
+    token obtained by an earlier one without any authorization round trips
+    while the token is still valid.
+
+    Parameters
+    ----------
+    path : str or None
+        Location of the JSON file backing the store. If None the store only
+        lives in memory. The file holds bearer tokens and is written with
+        owner-only permissions.
+    refresh_margin : int or float
+        Number of seconds before expiry at which a token is considered stale
+        and is refreshed. Defaults to 60.
+    """
+    def __init__(self, path=None, refresh_margin=60):
+        if path is not None and not isinstance(path, str):
+            raise ValueError("The path parameter must be a string or None.")
+
+        if (not isinstance(refresh_margin, (int, float))
+                or refresh_margin < 0):
+            raise ValueError(
+                "The refresh_margin parameter must be a non-negative number."
+            )
+
+        self._path = path
+        self._refresh_margin = refresh_margin
+        self._lock = threading.RLock()
+        self._key_locks = {}
+        self._entries = {}
+
+        if self._path is not None:
+            self._entries = self._load()
+
+    @staticmethod
+    def make_key(base_url, database, client_id, username,
+                 password_hash=None):
+        """
+        Return the cache key for a set of connection arguments.
+
+        The key holds a SHA-256 digest of password_hash, never the hash
+        itself. Objects that prompt for their password share the key
+        without a password.
+        """
+        password = None
+
+        if password_hash is not None:
+            password = hashlib.sha256(
+                password_hash.hexdigest().encode()
+            ).hexdigest()
+
+        return json.dumps(
+            [base_url.rstrip('/'), database, client_id, username, password]
+        )
+
+    def lock(self, key):
+        """
+        Return the lock serializing authorization for a key, so concurrent
+        callers sharing credentials log in only once.
+        """
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get_discovery(self, key):
+        """
+        Return the cached OpenID discovery document for a key, or None.
+        """
+        with self._lock:
+            return self._entries.get(key, {}).get('discovery')
+
+    def set_discovery(self, key, discovery):
+        """
+        Cache the OpenID discovery document for a key.
+        """
+        with self._lock:
+            self._entries.setdefault(key, {})['discovery'] = discovery
+            self._save()
+
+    def get_token(self, key):
+        """
+        Return the cached access token for a key if it will not expire within
+        the refresh margin, otherwise None.
+        """
+        with self._lock:
+            entry = self._entries.get(key, {})
+            token = entry.get('access_token')
+            expires_at = entry.get('expires_at')
+
+        if token is None:
+            return None
+
+        if (expires_at is not None
+                and expires_at - self._refresh_margin <= time.time()):
+            return None
+
+        return token
+
+    def get_refresh_token(self, key):
+        """
+        Return the cached refresh token for a key, or None.
+        """
+        with self._lock:
+            return self._entries.get(key, {}).get('refresh_token')
+
+    def set_token(self, key, token_response):
+        """
+        Cache the token endpoint response for a key.
+
+        Parameters
+        ----------
+        key : str
+            Key returned by make_key.
+        token_response : dict
+            Decoded JSON body of the token endpoint. Must contain
+            access_token and may contain expires_in and refresh_token.
+        """
+        expires_in = token_response.get('expires_in')
+
+        with self._lock:
+            entry = self._entries.setdefault(key, {})
+            entry['access_token'] = token_response['access_token']
+            entry['expires_at'] = (
+                time.time() + float(expires_in)
+                if expires_in is not None else None
+            )
+            entry['refresh_token'] = token_response.get('refresh_token')
+            self._save()
+
+    def invalidate(self, key, token=None):
+        """
+        Drop the cached access token for a key.
+
+        Parameters
+        ----------
+        key : str
+            Key returned by make_key.
+        token : str or None
+            If given, the cached token is only dropped when it still equals
+            this value, so a token refreshed by another caller is kept.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return
+
+            if token is not None and entry.get('access_token') != token:
+                return
+
+            entry.pop('access_token', None)
+            entry.pop('expires_at', None)
+            self._save()
+
+    def _load(self):
+        """
+        Read the persisted entries, ignoring a missing or corrupt file.
+        """
+        return load_json(self._path)
+
+    def _save(self):
+        """
+        Atomically persist the entries if the store is backed by a file.
+        """
+        if self._path is not None:
+            save_json(self._path, self._entries)
+
+
+# Process-wide store used when an API object is not given one, so API
+# objects built with the same credentials share a single login.
+default_token_store = TokenStore()
@@ -0,0 +1,466 @@
+from email.parser import BytesHeaderParser
+import json
+import re
+import uuid
+
+
+EOL = "\r\n"
+
+# Matches keyed entity paths such as "Part('<id>')" or "Part('<id>')/Part BOM"
+# so writes can invalidate cached responses about the item.
+KEYED_PATH = re.compile(r"^([^(/]+)\('((?:[^']|'')*)'\)")
+
+
+def encode_request(method, url, body=None, headers=None, content_id=None):
+    """
+    Encode one HTTP request as an application/http part of a multipart
+    batch body.
+
+    Parameters
+    ----------
+    method : str
+        HTTP verb of the operation.
+    url : str
+        Absolute url of the operation.
+    body : dict, str, bytes or None
+        Request body. Dicts are serialized as JSON.
+    headers : dict or None
+        Headers of the inner request.
+    content_id : str or None
+        Content-ID of the part, required inside change sets.
+    """
+    part = "Content-Type: application/http" + EOL
+
+    if content_id is not None:
+        part += f"Content-ID: {content_id}" + EOL
+
+    part += EOL
+    part += f"{method} {url} HTTP/1.1" + EOL
+
+    request_headers = dict(headers or {})
+
+    if body is not None:
+        request_headers.setdefault("Content-Type", "application/json")
+
+    for name, value in request_headers.items():
+        part += f"{name}: {value}" + EOL
+
+    part += EOL
+
+    part = part.encode('utf-8')
+
+    if isinstance(body, dict):
+        body = json.dumps(body)
+
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+
+    if body is not None:
+        part += body
+
+    return part
+
+
+def encode_multipart(boundary, parts):
+    """
+    Join encoded parts into a multipart/mixed body.
+
+    Parameters
+    ----------
+    boundary : str
+        Boundary string, without the leading dashes.
+    parts : list of bytes
+        Each part including its own part headers.
+    """
+    delimiter = f"--{boundary}{EOL}".encode()
+
+    return (
+        EOL.encode().join(delimiter + part for part in parts)
+        + f"{EOL}--{boundary}--".encode()
+    )
+
+
+def _split_multipart(body, content_type):
+    """
+    Split a multipart body into (headers, payload) pairs.
+    """
+    headers = BytesHeaderParser().parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode()
+    )
+    boundary = headers.get_param('boundary')
+
+    if boundary is None:
+        raise ValueError("multipart response without a boundary.")
+
+    delimiter = b"--" + boundary.encode()
+    parts = []
+
+    for chunk in body.split(delimiter)[1:]:
+        if chunk.startswith(b"--"):
+            break
+
+        chunk = chunk.strip(b"\r\n")
+        head, _, payload = chunk.partition(b"\r\n\r\n")
+        parts.append((BytesHeaderParser().parsebytes(head + b"\r\n\r\n"),
+                      payload))
+
+    return parts
+
+
+class BatchResult:
+    """
+    Result of one operation in a batch. Mirrors the parts of
+    requests.Response used by the API classes.
+
+    Attributes
+    ----------
+    status_code : int or None
+        None if the batch request raised before it was answered or its
+        reply holds no response for the operation.
+    reason : str
+    headers : dict
+    content : bytes
+    error : Exception or None
+        Why the batch request carrying the operation failed to complete.
+    """
+    def __init__(self, status_code, reason, headers, content, error=None):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+        self.error = error
+
+    def __repr__(self):
+        if self.error is not None:
+            return f"<BatchResult error={self.error!r}>"
+
+        return f"<BatchResult [{self.status_code}]>"
+
+    @property
+    def ok(self):
+        return (self.error is None and self.status_code is not None
+                and self.status_code < 400)
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    @classmethod
+    def _from_http(cls, payload):
+        """
+        Parse an application/http response part.
+        """
+        head, _, content = payload.partition(b"\r\n\r\n")
+        status_line, _, header_block = head.partition(b"\r\n")
+
+        _, status_code, reason = (
+            status_line.decode('latin-1').split(" ", 2) + [""]
+        )[:3]
+
+        headers = dict(
+            BytesHeaderParser().parsebytes(header_block + b"\r\n\r\n")
+        )
+
+        return cls(int(status_code), reason, headers, content.rstrip(b"\r\n"))
+
+
+class _ChangeSet:
+    """
+    Context manager returned by Batch.changeset.
+    """
+    def __init__(self, batch):
+        self._batch = batch
+
+    def __enter__(self):
+        if self._batch._changeset is not None:
+            raise RuntimeError("Change sets cannot be nested.")
+
+        self._batch._changeset = []
+
+        return self._batch
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._batch._changeset:
+            self._batch._groups.append((self._batch._changeset, True))
+
+        self._batch._changeset = None
+
+
+class Batch:
+    """
+    Collects create, update and delete operations and sends them as OData
+    $batch requests.
+
+    Operations are sent in add order, packed into as few batch requests as
+    the max_operations and max_bytes bounds allow. Operations added inside
+    ``with batch.changeset():`` form an atomic change set that is never
+    split across requests. Obtain one with api.batch().
+
+    Example::
+
+        batch = parts_api.batch(max_operations=200)
+        for metadata in rows:
+            batch.post("Part", metadata)
+        with batch.changeset():
+            batch.patch(f"Part('{part_id}')", {'state': 'Released'})
+            batch.delete(f"Part('{old_id}')")
+        results = batch.execute()
+
+    Parameters
+    ----------
+    api : CommonAPI
+        Authorized API object used to send the batches.
+    max_operations : int
+        Maximum number of operations per batch request. Defaults to 100.
+    max_bytes : int or None
+        Maximum encoded size of one batch request. A single operation larger
+        than this is still sent, alone. Defaults to 4 MB.
+    """
+    def __init__(self, api, max_operations=100, max_bytes=4 * 1024 * 1024):
+        if not isinstance(max_operations, int) or max_operations < 1:
+            raise ValueError("max_operations must be a positive integer.")
+
+        if max_bytes is not None and (not isinstance(max_bytes, int)
+                                      or max_bytes < 1):
+            raise ValueError("max_bytes must be a positive integer or None.")
+
+        self._api = api
+        self._max_operations = max_operations
+        self._max_bytes = max_bytes
+        self._operations = []
+        self._paths = []
+        self._groups = []
+        self._changeset = None
+        self.results = None
+
+    def __len__(self):
+        return len(self._operations)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None and self._operations:
+            self.execute()
+
+    def changeset(self):
+        """
+        Group the operations added inside the with block into one atomic
+        change set.
+        """
+        return _ChangeSet(self)
+
+    def add(self, method, path, body=None, headers=None):
+        """
+        Queue an operation and return its index in the results list.
+
+        Parameters
+        ----------
+        method : str
+            HTTP verb, e.g. "POST".
+        path : str
+            Entity path below the OData service root, e.g. "Part" or
+            "Part('<id>')".
+        body : dict, str or None
+            Request body; dicts are serialized as JSON.
+        headers : dict or None
+            Extra headers for this operation.
+        """
+        index = len(self._operations)
+
+        url = f"{self._api._base_url}/server/odata/{path}"
+        self._operations.append((method, url, body, headers))
+        self._paths.append((method.upper(), path))
+
+        if self._changeset is not None:
+            self._changeset.append(index)
+        else:
+            self._groups.append(([index], False))
+
+        return index
+
+    def post(self, path, body):
+        """
+        Queue a create operation.
+        """
+        return self.add("POST", path, body)
+
+    def patch(self, path, body):
+        """
+        Queue an update operation.
+        """
+        return self.add("PATCH", path, body)
+
+    def delete(self, path):
+        """
+        Queue a delete operation.
+        """
+        return self.add("DELETE", path)
+
+    def execute(self):
+        """
+        Send every queued operation and return one BatchResult per operation,
+        in the order the operations were added. A failure of a whole batch
+        request, including a connection error, is reported on each of its
+        operations rather than raised, so one bad request does not abort
+        the rest. The queue is emptied once sending starts, even if it is
+        interrupted, so operations are never sent twice.
+        """
+        results = [None] * len(self._operations)
+
+        # encoding errors are raised before anything is sent
+        packed = self._pack()
+
+        try:
+            for groups in packed:
+                try:
+                    sent = self._send(groups)
+                except Exception as error:
+                    failure = BatchResult(None, str(error), {}, b"", error)
+                    sent = [
+                        (index, failure)
+                        for group, _, _ in groups for index in group
+                    ]
+
+                for index, result in sent:
+                    results[index] = result
+        finally:
+            for method, path in self._paths:
+                match = KEYED_PATH.match(path)
+
+                if method != "GET" and match is not None:
+                    self._api._invalidate(
+                        match.group(1), match.group(2).replace("''", "'")
+                    )
+
+            self._operations = []
+            self._paths = []
+            self._groups = []
+
+        self.results = results
+
+        return results
+
+    def _encode_group(self, group, is_changeset):
+        """
+        Encode the operations of one top-level group.
+        """
+        parts = [
+            encode_request(
+                *self._operations[index],
+                content_id=str(index + 1) if is_changeset else None
+            )
+            for index in group
+        ]
+
+        if not is_changeset:
+            return parts[0]
+
+        boundary = f"changeset_{uuid.uuid4().hex}"
+
+        return (
+            f"Content-Type: multipart/mixed; boundary={boundary}{EOL}{EOL}"
+            .encode() + encode_multipart(boundary, parts)
+        )
+
+    def _pack(self):
+        """
+        Split the queued groups into size-bounded batch requests.
+        """
+        requests = []
+        current = []
+        operations = 0
+        size = 0
+
+        for group, is_changeset in self._groups:
+            encoded = self._encode_group(group, is_changeset)
+
+            if current and (
+                operations + len(group) > self._max_operations
+                or (self._max_bytes is not None
+                    and size + len(encoded) > self._max_bytes)
+            ):
+                requests.append(current)
+                current = []
+                operations = 0
+                size = 0
+
+            current.append((group, is_changeset, encoded))
+            operations += len(group)
+            size += len(encoded)
+
+        if current:
+            requests.append(current)
+
+        return requests
+
+    def _send(self, groups):
+        """
+        Send one batch request and pair each operation with its result.
+        """
+        boundary = f"batch_{uuid.uuid4().hex}"
+
+        body = encode_multipart(
+            boundary, [encoded for _, _, encoded in groups]
+        )
+
+        response = self._api._request(
+            "POST",
+            url=f"{self._api._base_url}/server/odata/$batch",
+            headers={
+                "Content-Type": f"multipart/mixed; boundary={boundary}",
+                # answer every operation even after one of them fails
+                "Prefer": "odata.continue-on-error"
+            },
+            data=body
+        )
+
+        indices = [index for group, _, _ in groups for index in group]
+
+        content_type = response.headers.get('Content-Type', '')
+
+        if not content_type.startswith('multipart/'):
+            failure = BatchResult(
+                response.status_code,
+                response.reason,
+                dict(response.headers),
+                response.content
+            )
+            return [(index, failure) for index in indices]
+
+        paired = {}
+        parts = _split_multipart(response.content, content_type)
+
+        for (group, _, _), (headers, payload) in zip(groups, parts):
+            if headers.get_content_type() == 'multipart/mixed':
+                inner_parts = _split_multipart(
+                    payload, headers['Content-Type']
+                )
+
+                for position, (inner_headers, inner_payload) in enumerate(
+                        inner_parts):
+                    content_id = inner_headers.get('Content-ID')
+
+                    if content_id is not None and content_id.isdigit():
+                        index = int(content_id) - 1
+                    else:
+                        index = group[position]
+
+                    paired[index] = BatchResult._from_http(inner_payload)
+            else:
+                # A failed change set is answered with a single response.
+                result = BatchResult._from_http(payload)
+                paired.update((index, result) for index in group)
+
+        # the outer status says nothing about an unanswered operation
+        missing = BatchResult(
+            None,
+            "No response for operation in batch",
+            {},
+            b""
+        )
+
+        return [(index, paired.get(index, missing)) for index in indices]
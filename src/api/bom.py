@@ -0,0 +1,278 @@
+import numpy as np
+
+
+class BOMGraph:
+    """
+    Array-backed graph of Part BOM lines.
+
+    Part ids are interned to consecutive integers; edges are kept as three
+    parallel arrays (parent index, child index, quantity) sorted by parent,
+    so a 100k line BOM takes a few megabytes and rollups run as NumPy
+    operations over whole BOM levels instead of Python walks.
+
+    Build one with from_structure, from_assemblies or from_lines.
+
+    Parameters
+    ----------
+    ids : list of str
+        Part ids, position i is node i.
+    parents, children : array of int
+        Node indices of the assembly and component of every BOM line.
+    quantities : array of float
+        Quantity of every BOM line.
+
+    Attributes
+    ----------
+    ids : list of str
+        Part id of every node index.
+    parents, children : numpy.ndarray of int32
+        BOM lines sorted by parent.
+    quantities : numpy.ndarray of float64
+        Quantity per BOM line, aligned with parents and children.
+    """
+    def __init__(self, ids, parents, children, quantities):
+        parents = np.asarray(parents, dtype=np.int32)
+        children = np.asarray(children, dtype=np.int32)
+        quantities = np.asarray(quantities, dtype=np.float64)
+
+        if not parents.shape == children.shape == quantities.shape:
+            raise ValueError(
+                "parents, children and quantities must have the same length."
+            )
+
+        if parents.size and (
+                min(parents.min(), children.min()) < 0
+                or max(parents.max(), children.max()) >= len(ids)):
+            raise ValueError("BOM lines must refer to nodes in ids.")
+
+        order = np.argsort(parents, kind='stable')
+
+        self.ids = list(ids)
+        self.parents = parents[order]
+        self.children = children[order]
+        self.quantities = quantities[order]
+
+        self._index = {part_id: n for n, part_id in enumerate(self.ids)}
+
+        # CSR offsets: the lines of node n are offsets[n]:offsets[n + 1]
+        self._offsets = np.zeros(len(self.ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.parents, minlength=len(self.ids)),
+                  out=self._offsets[1:])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __repr__(self):
+        return f"<BOMGraph parts={len(self.ids)} lines={self.parents.size}>"
+
+    @classmethod
+    def from_lines(cls, lines, default_quantity=1.0):
+        """
+        Build a graph from (parent id, child id, quantity) triples. A
+        quantity of None or '' counts as default_quantity.
+        """
+        index = {}
+        parents = []
+        children = []
+        quantities = []
+
+        for parent_id, child_id, quantity in lines:
+            parents.append(index.setdefault(parent_id, len(index)))
+            children.append(index.setdefault(child_id, len(index)))
+            quantities.append(_quantity(quantity, default_quantity))
+
+        return cls(list(index), parents, children, quantities)
+
+    @classmethod
+    def from_assemblies(cls, assemblies, default_quantity=1.0):
+        """
+        Build a graph from (part id, get_assembly response) pairs.
+        """
+        index = {}
+        lines = []
+
+        for part_id, assembly in assemblies:
+            # parts without children are still nodes of the graph
+            index.setdefault(part_id, len(index))
+
+            for row in assembly.get('value', []):
+                child = row.get('related_id')
+
+                if isinstance(child, dict) and 'id' in child:
+                    lines.append((part_id, child['id'], row.get('quantity')))
+
+        for _, child_id, _ in lines:
+            index.setdefault(child_id, len(index))
+
+        return cls(
+            list(index),
+            [index[parent_id] for parent_id, _, _ in lines],
+            [index[child_id] for _, child_id, _ in lines],
+            [_quantity(quantity, default_quantity)
+             for _, _, quantity in lines]
+        )
+
+    @classmethod
+    def from_structure(cls, structure, default_quantity=1.0):
+        """
+        Build a graph from the result of PartsAPI.get_product_structure.
+        Parts below its max_depth become leaves.
+        """
+        return cls.from_assemblies(
+            ((part_id, {'value': node['bom'] or []})
+             for part_id, node in structure.items()),
+            default_quantity
+        )
+
+    def index(self, part_id):
+        """
+        Return the node index of a part id.
+        """
+        try:
+            return self._index[part_id]
+        except KeyError:
+            raise ValueError(f"Part {part_id} is not in the BOM.") from None
+
+    def children_of(self, part_id):
+        """
+        Return the (child id, quantity) BOM lines of a part.
+        """
+        node = self.index(part_id)
+        lines = slice(self._offsets[node], self._offsets[node + 1])
+
+        return [
+            (self.ids[child], float(quantity))
+            for child, quantity in zip(self.children[lines],
+                                       self.quantities[lines])
+        ]
+
+    def levels(self, root=None):
+        """
+        Return the low level code of every node: the deepest level at
+        which it is used below root, or below all top level parts if root
+        is None. Nodes not below root get -1.
+
+        Raises ValueError if the BOM contains a cycle.
+        """
+        level = np.full(len(self.ids), -1, dtype=np.int32)
+
+        for frontier, lines in self._layers(root):
+            # the first layer is root, or the parts without a parent
+            level[frontier[level[frontier] < 0]] = 0
+
+            np.maximum.at(level, self.children[lines],
+                          level[self.parents[lines]] + 1)
+
+        return level
+
+    def rollup(self, root, quantity=1.0):
+        """
+        Return the total quantity of every node needed to build quantity
+        units of root, summed over all paths, as an array indexed like
+        ids. Nodes not used by root are 0.
+
+        Raises ValueError if the BOM contains a cycle.
+        """
+        total = np.zeros(len(self.ids), dtype=np.float64)
+        total[self.index(root)] = quantity
+
+        for _, lines in self._layers(root):
+            np.add.at(total, self.children[lines],
+                      total[self.parents[lines]] * self.quantities[lines])
+
+        return total
+
+    def flatten(self, root, quantity=1.0):
+        """
+        Return the flattened BOM of root: (part id, low level code, total
+        quantity) for every part below it, ordered by level and then by
+        first appearance.
+        """
+        total = self.rollup(root, quantity)
+        level = self.levels(root)
+
+        nodes = np.flatnonzero(level > 0)
+        nodes = nodes[np.argsort(level[nodes], kind='stable')]
+
+        return [
+            (self.ids[node], int(level[node]), float(total[node]))
+            for node in nodes
+        ]
+
+    def _lines_of(self, nodes):
+        """
+        Return the indices of the BOM lines of the given nodes.
+        """
+        starts = self._offsets[nodes]
+        counts = self._offsets[nodes + 1] - starts
+        size = counts.sum()
+
+        if not size:
+            return np.zeros(0, dtype=np.int64)
+
+        # consecutive runs starts[i]:starts[i] + counts[i] without a loop
+        shifts = np.repeat(starts - np.cumsum(counts) + counts, counts)
+
+        return shifts + np.arange(size)
+
+    def _layers(self, root=None):
+        """
+        Yield (nodes, their BOM lines) in topological layers: a node is
+        yielded once all of its parents below root have been. Raises
+        ValueError if a cycle prevents that.
+        """
+        if root is None:
+            lines = np.arange(self.parents.size)
+            frontier = np.setdiff1d(np.arange(len(self.ids)), self.children)
+        else:
+            lines = self._reachable_lines(self.index(root))
+            frontier = np.array([self.index(root)], dtype=np.int64)
+
+        pending = np.bincount(self.children[lines], minlength=len(self.ids))
+        remaining = lines.size
+
+        if root is not None and pending[frontier[0]]:
+            raise ValueError("The BOM contains a cycle.")
+
+        while frontier.size:
+            frontier_lines = self._lines_of(frontier)
+            yield frontier, frontier_lines
+
+            remaining -= frontier_lines.size
+
+            targets = self.children[frontier_lines]
+            np.subtract.at(pending, targets, 1)
+
+            frontier = np.unique(targets[pending[targets] == 0])
+
+        if remaining:
+            raise ValueError("The BOM contains a cycle.")
+
+    def _reachable_lines(self, root):
+        """
+        Return the indices of the BOM lines below root.
+        """
+        seen = np.zeros(len(self.ids), dtype=bool)
+        seen[root] = True
+        frontier = np.array([root], dtype=np.int64)
+        lines = []
+
+        while frontier.size:
+            frontier_lines = self._lines_of(frontier)
+            lines.append(frontier_lines)
+
+            targets = np.unique(self.children[frontier_lines])
+            frontier = targets[~seen[targets]]
+            seen[frontier] = True
+
+        return np.sort(np.concatenate(lines))
+
+
+def _quantity(value, default):
+    """
+    Convert a Part BOM quantity to a float.
+    """
+    if value is None or value == '':
+        return default
+
+    return float(value)
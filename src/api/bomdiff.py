@@ -0,0 +1,364 @@
+import json
+import math
+
+
+class BOMSnapshot:
+    """
+    Product structure reduced to what a BOM comparison needs.
+
+    Parts are keyed by item number and BOM lines by (parent, child) item
+    numbers, so structures read from Aras, from a spreadsheet or from a
+    saved snapshot can be compared with diff_boms. Where the structure came
+    from Aras the Part and Part BOM ids are kept, so the changes of a diff
+    can be applied to the existing items.
+
+    Parameters
+    ----------
+    root : str
+        Item number of the top level assembly.
+
+    Attributes
+    ----------
+    parts : dict
+        Item number to a dict of compared attributes, e.g. {'name': ...}.
+    lines : dict
+        (parent, child) item numbers to the quantity of the BOM line.
+    part_ids, line_ids : dict
+        Aras ids of parts and BOM lines, keyed like parts and lines.
+    """
+    def __init__(self, root):
+        self.root = _key(root)
+        self.parts = {}
+        self.lines = {}
+        self.part_ids = {}
+        self.line_ids = {}
+
+        self.add_part(root)
+
+    def __repr__(self):
+        return (
+            f"<BOMSnapshot {self.root} parts={len(self.parts)} "
+            f"lines={len(self.lines)}>"
+        )
+
+    def add_part(self, key, attributes=None, aras_id=None):
+        """
+        Add a part, merging attributes into those already recorded.
+        """
+        key = _key(key)
+        self.parts.setdefault(key, {}).update(attributes or {})
+
+        if aras_id is not None:
+            self.part_ids[key] = aras_id
+
+    def add_line(self, parent, child, quantity=None, aras_id=None):
+        """
+        Add a BOM line. Repeated lines between the same parts add up.
+        """
+        parent, child = _key(parent), _key(child)
+        line = (parent, child)
+
+        for key in line:
+            self.parts.setdefault(key, {})
+
+        self.lines[line] = self.lines.get(line, 0.0) + _quantity(quantity)
+
+        if aras_id is not None:
+            self.line_ids[line] = aras_id
+
+    @classmethod
+    def from_structure(cls, structure, root, attributes=('name',)):
+        """
+        Build a snapshot from the result of PartsAPI.get_product_structure
+        for the part with item number root.
+
+        Parameters
+        ----------
+        structure : dict
+            get_product_structure result.
+        root : str
+            item number of the part the structure was read for.
+        attributes : sequence of str
+            Part properties to compare.
+        """
+        root_id = next(
+            part_id for part_id, node in structure.items()
+            if node['depth'] == 0
+        )
+        snapshot = cls(root)
+        snapshot.part_ids[snapshot.root] = root_id
+        numbers = {root_id: snapshot.root}
+
+        # children are numbered from the expanded rows of their parents
+        for node in structure.values():
+            for row in node['bom'] or []:
+                child = row['related_id']
+                numbers[child['id']] = _key(child['item_number'])
+                snapshot.add_part(
+                    child['item_number'],
+                    {name: child.get(name) for name in attributes},
+                    child['id']
+                )
+
+        for part_id, node in structure.items():
+            for row in node['bom'] or []:
+                snapshot.add_line(numbers[part_id],
+                                  row['related_id']['item_number'],
+                                  row.get('quantity'), row.get('id'))
+
+        return snapshot
+
+    @classmethod
+    def from_assembly(cls, root, assembly, attributes=('name',)):
+        """
+        Build a single level snapshot from a PartsAPI.get_assembly
+        response for the part with item number root.
+        """
+        snapshot = cls(root)
+
+        for row in assembly.get('value', []):
+            child = row['related_id']
+            snapshot.add_part(
+                child['item_number'],
+                {name: child.get(name) for name in attributes},
+                child['id']
+            )
+            snapshot.add_line(root, child['item_number'], row.get('quantity'),
+                              row.get('id'))
+
+        return snapshot
+
+    @classmethod
+    def from_dataframe(cls, frame, root, item_column='ITEM NO.',
+                       quantity_column='QTY.',
+                       attributes=(('name', 'PART NUMBER'),)):
+        """
+        Build a snapshot from an indented BOM spreadsheet, e.g. the result
+        of pandas.read_excel on the BOM read by TransferPipeline.
+
+        Item numbers are hierarchical: the parent of "2.1.3" is "2.1" and
+        top level items such as "2" belong to root. Read the item column as
+        text, e.g. with pandas.read_excel(path, dtype={'ITEM NO.': str}):
+        as numbers "1.1" and "1.10" are the same value, so a non-integral
+        numeric item number raises ValueError.
+
+        Parameters
+        ----------
+        frame : pandas.DataFrame or dict of sequences
+            The spreadsheet columns.
+        root : str
+            item number of the assembly the spreadsheet describes.
+        item_column, quantity_column : str
+            Columns holding the item number and quantity of every row.
+        attributes : sequence of (str, str)
+            (Part property, column) pairs to compare.
+        """
+        snapshot = cls(root)
+        items = list(frame[item_column])
+        quantities = list(frame[quantity_column])
+        columns = [(name, list(frame[column])) for name, column in attributes]
+
+        for row, item in enumerate(items):
+            key = _item_number(item)
+            parent = key.rpartition('.')[0] or snapshot.root
+
+            snapshot.add_part(key, {
+                name: _cell(values[row]) for name, values in columns
+            })
+            snapshot.add_line(parent, key, quantities[row])
+
+        return snapshot
+
+    def to_dict(self):
+        """
+        Return the snapshot as a JSON serialisable dict.
+        """
+        return {
+            'root': self.root,
+            'parts': self.parts,
+            'lines': [
+                [parent, child, quantity, self.line_ids.get((parent, child))]
+                for (parent, child), quantity in self.lines.items()
+            ],
+            'part_ids': self.part_ids
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Rebuild a snapshot from to_dict output.
+        """
+        snapshot = cls(data['root'])
+
+        for key, attributes in data['parts'].items():
+            snapshot.add_part(key, attributes, data['part_ids'].get(key))
+
+        for parent, child, quantity, aras_id in data['lines']:
+            snapshot.add_line(parent, child, quantity, aras_id)
+
+        return snapshot
+
+    def save(self, path):
+        """
+        Write the snapshot to a JSON file.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a snapshot written by save.
+        """
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+
+class BOMChange:
+    """
+    One operation turning the old side of a BOM diff into the new one.
+
+    kind is one of
+
+    - "create": part key is new, with attributes,
+    - "update": the attributes of part key changed,
+    - "link": a BOM line parent -> child with quantity is new,
+    - "quantity": the quantity of a line changed from previous,
+    - "unlink": the line parent -> child is gone,
+    - "delete": part key is no longer used by the new structure.
+
+    aras_id is the id of the existing Part or Part BOM item, if known.
+    """
+    def __init__(self, kind, key=None, parent=None, child=None,
+                 quantity=None, previous=None, attributes=None, aras_id=None):
+        self.kind = kind
+        self.key = key
+        self.parent = parent
+        self.child = child
+        self.quantity = quantity
+        self.previous = previous
+        self.attributes = attributes
+        self.aras_id = aras_id
+
+    def __repr__(self):
+        if self.key is not None:
+            return f"<BOMChange {self.kind} {self.key}>"
+
+        return f"<BOMChange {self.kind} {self.parent} -> {self.child}>"
+
+    def __eq__(self, other):
+        return isinstance(other, BOMChange) and vars(self) == vars(other)
+
+
+def diff_boms(old, new, tolerance=1e-9):
+    """
+    Return the changes that turn BOMSnapshot old into new.
+
+    Parts and lines are compared through their hashed keys, so the diff
+    takes time linear in the size of both structures. Attributes are only
+    compared where the new side has a value. Changes come in the order
+    they can be applied: creates, updates, links, quantity changes,
+    unlinks and deletes, each in the order of the snapshot they come from.
+
+    Parameters
+    ----------
+    old, new : BOMSnapshot
+        The structure as it is and as it should be.
+    tolerance : float
+        Quantities closer than this count as equal.
+    """
+    creates = []
+    updates = []
+
+    for key, attributes in new.parts.items():
+        if key not in old.parts:
+            creates.append(BOMChange('create', key, attributes=attributes))
+            continue
+
+        old_attributes = old.parts[key]
+
+        if attributes == old_attributes:
+            continue
+
+        changed = {
+            name: value for name, value in attributes.items()
+            if value is not None and old_attributes.get(name) != value
+        }
+
+        if changed:
+            updates.append(BOMChange('update', key, attributes=changed,
+                                     aras_id=old.part_ids.get(key)))
+
+    links = []
+    quantities = []
+
+    for line, quantity in new.lines.items():
+        previous = old.lines.get(line)
+
+        if previous is None:
+            links.append(BOMChange('link', parent=line[0], child=line[1],
+                                   quantity=quantity))
+        elif abs(previous - quantity) > tolerance:
+            quantities.append(BOMChange(
+                'quantity', parent=line[0], child=line[1], quantity=quantity,
+                previous=previous, aras_id=old.line_ids.get(line)
+            ))
+
+    unlinks = [
+        BOMChange('unlink', parent=line[0], child=line[1],
+                  quantity=quantity, aras_id=old.line_ids.get(line))
+        for line, quantity in old.lines.items() if line not in new.lines
+    ]
+
+    deletes = [
+        BOMChange('delete', key, aras_id=old.part_ids.get(key))
+        for key in old.parts if key not in new.parts
+    ]
+
+    return creates + updates + links + quantities + unlinks + deletes
+
+
+def _key(value):
+    """
+    Normalise an item number read from Aras, JSON or a spreadsheet cell.
+    """
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+
+    return str(value).strip()
+
+
+def _item_number(value):
+    """
+    Normalise a hierarchical item number read from a spreadsheet, refusing
+    one that was read as a fraction and may have lost trailing zeros.
+    """
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError(
+            f"Item number {value!r} was read as a number; read the item "
+            "column as text."
+        )
+
+    return _key(value)
+
+
+def _cell(value):
+    """
+    Return a spreadsheet cell value, with empty (NaN) cells as None.
+    """
+    if isinstance(value, float) and math.isnan(value):
+        return None
+
+    return value
+
+
+def _quantity(value):
+    """
+    Convert a BOM quantity to a float, counting a missing one as 1.
+    """
+    value = _cell(value)
+
+    if value is None or value == '':
+        return 1.0
+
+    return float(value)
@@ -0,0 +1,179 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class _Entry:
+    """
+    One cached response body.
+    """
+    __slots__ = ('content', 'etag', 'stored_at', 'tags')
+
+    def __init__(self, content, etag, stored_at, tags):
+        self.content = content
+        self.etag = etag
+        self.stored_at = stored_at
+        self.tags = tags
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of GET responses with a time to live.
+
+    Entries are keyed on the fully resolved request url and tagged with the
+    items they describe, e.g. ("Part", "<id>"), so writes to an item drop
+    every cached response about it. Once an entry is older than ttl it is
+    revalidated with If-None-Match when the server supplied an ETag, and
+    refetched otherwise. Bodies are stored undecoded, so callers always get
+    their own copy.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of cached responses. Defaults to 1024.
+    ttl : float
+        Seconds an entry is served without contacting the server. Defaults
+        to 300. Use 0 to always revalidate.
+    """
+    def __init__(self, maxsize=1024, ttl=300):
+        if not isinstance(maxsize, int) or maxsize < 1:
+            raise ValueError("maxsize must be a positive integer.")
+
+        if ttl < 0:
+            raise ValueError("ttl must be non-negative.")
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, key):
+        """
+        Return (content, etag, fresh) for a key, or None if not cached.
+        Only a fresh entry, served without contacting the server, counts as
+        a hit; stale and absent entries count as misses.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+
+            fresh = time.monotonic() - entry.stored_at < self.ttl
+
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+            return entry.content, entry.etag, fresh
+
+    def revalidated(self, key):
+        """
+        Mark an entry confirmed unchanged by a 304 response and return its
+        content, or None if it was invalidated meanwhile.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            entry.stored_at = time.monotonic()
+            self.revalidations += 1
+
+            return entry.content
+
+    def store(self, key, content, etag=None, tags=()):
+        """
+        Cache a response body.
+
+        Parameters
+        ----------
+        key : str
+            Resolved request url.
+        content : bytes
+            Undecoded response body.
+        etag : str or None
+            ETag header of the response.
+        tags : iterable of tuple
+            (item_type, item_id) pairs the response describes.
+        """
+        tags = frozenset(tags)
+
+        with self._lock:
+            self._remove(key)
+
+            self._entries[key] = _Entry(
+                content, etag, time.monotonic(), tags
+            )
+
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, item_type, item_id):
+        """
+        Drop every cached response tagged with an item.
+        """
+        with self._lock:
+            for key in self._tags.pop((item_type, item_id), set()):
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        """
+        Drop every entry. Statistics are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self):
+        """
+        Return hit/miss statistics as a dict.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'revalidations': self.revalidations,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'size': len(self._entries),
+                'maxsize': self.maxsize
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+
+        if entry is None:
+            return
+
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+
+            if keys is not None:
+                keys.discard(key)
+
+                if not keys:
+                    del self._tags[tag]
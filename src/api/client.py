@@ -0,0 +1,39 @@
+from .airworthiness import AirworthinessAPI
+from .common import CommonAPI
+from .documents import DocumentAPI
+from .files import FilesAPI
+from .parts import PartsAPI
+
+
+class ArasClient(CommonAPI):
+    """
+    Single entry point to every item API.
+
+    The client logs in once and exposes views for each item type. All views
+    share the client's connection pool, access token, cache, request
+    metrics and any other connection state, so a pipeline touching several
+    item types uses one set of sockets and one login. Accepts the same
+    parameters as CommonAPI.
+
+    Example::
+
+        with ArasClient(base_url, client_id, database, username) as client:
+            part = client.parts.search_part_id(part_id)
+            client.files.upload_file(file_path, file_number)
+
+    Attributes
+    ----------
+    parts : PartsAPI
+    files : FilesAPI
+    documents : DocumentAPI
+    airworthiness : AirworthinessAPI
+    metrics : src.api.metrics.RequestMetrics
+        Counts the requests of the client and all of its views.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.parts = PartsAPI._from_shared(self)
+        self.files = FilesAPI._from_shared(self)
+        self.documents = DocumentAPI._from_shared(self)
+        self.airworthiness = AirworthinessAPI._from_shared(self)
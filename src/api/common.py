@@ -1,12 +1,86 @@
+from requests.adapters import HTTPAdapter
+from .auth import default_token_store
+from .batch import Batch
+from .metrics import RequestMetrics
+from .policy import RetryPolicy
+from .query import Query, encode_params
+from .stream import JSONArrayStream
+from concurrent.futures import ThreadPoolExecutor
+import functools
 import getpass
 import hashlib
+import json
 import requests
+import time
+
+
+# Bytes read from the socket per step when decoding a streamed response.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class _Connection:
+    """
+    Connection state of an API object: credentials, session, token store,
+    request policies, cache and metrics. The views of an ArasClient hold
+    the same instance, so state set through one view, such as the password
+    entered at a getpass prompt, is seen by all of them.
+    """
+    def __init__(self, base_url, client_id, database, username,
+                 password_hash, session, token_store, retry, rate_limiter,
+                 circuit_breaker, cache):
+        self.base_url = base_url
+        self.client_id = client_id
+        self.database = database
+        self.username = username
+        self.password_hash = password_hash
+        self.password_hash_str = None
+        self.session = session
+        self.token_store = token_store
+        self.token_key = token_store.make_key(
+            base_url, database, client_id, username, password_hash
+        )
+        self.retry = retry
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        self.cache = cache
+        self.metrics = RequestMetrics()
+
+
+def _shared(name):
+    """
+    Property reading and writing attribute name of the object's _Connection.
+    """
+    return property(
+        lambda self: getattr(self._connection, name),
+        lambda self, value: setattr(self._connection, name, value)
+    )
+
+
+def _steps(method):
+    """
+    Decorator for a generator method shared by the blocking and asyncio API
+    classes. The generator yields the result of every request primitive it
+    calls and gets the value back, so calling the decorated method returns
+    the generator's return value on CommonAPI and a coroutine on
+    AsyncCommonAPI.
+    """
+    @functools.wraps(method)
+    def run(self, *args, **kwargs):
+        return self._run(method(self, *args, **kwargs))
+
+    return run
 
 
 class CommonAPI:
     """
     Construct the Aras API handler by obtaining an access token.
 
+    Access tokens are cached in a TokenStore shared by every API object
+    built with the same credentials. A cached token that is still valid is
+    reused without contacting the server; a token close to expiry is
+    refreshed, and a request rejected with 401 is retried once after
+    logging in again.
+
     Parameters
     ----------
     base_url : str
@@ -23,81 +97,732 @@ class CommonAPI:
     password_hash : hashlib._hashlib.HASH or None
         An md5 hash of the user's password. If this is None or the arg is
         omitted, the user will be prompted for the password via getpass.
+    pool_connections : int
+        Number of per-host connection pools kept by the shared session.
+        Defaults to 10.
+    pool_maxsize : int
+        Maximum number of keep-alive connections kept open to a single host.
+        Defaults to 10. Raise this when issuing requests from many threads.
+    pool_block : bool
+        If True, requests wait for a free connection once pool_maxsize
+        connections to a host are in use instead of opening extra,
+        non-pooled connections. Defaults to False.
+    token_store : src.api.auth.TokenStore or None
+        Cache for discovery documents and access tokens. Pass
+        TokenStore(path) to persist tokens between processes. If omitted, a
+        process-wide in-memory store is used.
+    retry : src.api.policy.RetryPolicy or None
+        Retry and backoff policy for failed requests. Defaults to
+        RetryPolicy(); pass RetryPolicy(total=0) to disable retries.
+    rate_limiter : src.api.policy.RateLimiter or None
+        Token bucket pacing every request sent by this object. Defaults to
+        None, no limit.
+    circuit_breaker : src.api.policy.CircuitBreaker or None
+        Breaker that pauses requests after repeated server failures.
+        Defaults to None.
+    cache : src.api.cache.ResponseCache or None
+        Read-through cache for single item lookups such as search_part_id
+        and get_assembly. Writes made through this object invalidate the
+        affected entries. Defaults to None, no caching.
     """
     def __init__(self, base_url, client_id, database, username,
-                 password_hash=None):
+                 password_hash=None, pool_connections=10, pool_maxsize=10,
+                 pool_block=False, token_store=None, retry=None,
+                 rate_limiter=None, circuit_breaker=None, cache=None):
 
-        # Validate inputs.
-        if not isinstance(base_url, str):
-            raise ValueError(
-                "The base_url parameter must be string."
-            )
+        _validate_credentials(
+            base_url, client_id, database, username, password_hash
+        )
 
-        if not isinstance(client_id, str):
+        if not isinstance(pool_connections, int) or pool_connections < 1:
             raise ValueError(
-                "The client_id parameter must be string."
+                "The pool_connections parameter must be a positive integer."
             )
 
-        if not isinstance(database, str):
+        if not isinstance(pool_maxsize, int) or pool_maxsize < 1:
             raise ValueError(
-                "The database parameter must be string."
+                "The pool_maxsize parameter must be a positive integer."
             )
 
-        if not isinstance(username, str):
-            raise ValueError(
-                "The username parameter must be string."
-            )
+        # TODO: get the base_url and verify that it is a valid InnovatorServer
+        if token_store is None:
+            token_store = default_token_store
 
-        if (password_hash is not None and
-            not isinstance(password_hash, hashlib._hashlib.HASH)):
-            raise ValueError(
-                "The password_hash parameter must be an md5 hash object. ",
-                "e.g. hashlib.md5( 'PASSWORD'.encode() )"
+        # Every request made by this object goes through one keep-alive
+        # session so TCP/TLS connections are reused between calls. The
+        # password is only needed, and only prompted for, when no valid
+        # cached token exists.
+        self._connection = _Connection(
+            base_url, client_id, database, username, password_hash,
+            self._build_session(
+                pool_connections=pool_connections,
+                pool_maxsize=pool_maxsize,
+                pool_block=pool_block
+            ),
+            token_store,
+            retry if retry is not None else RetryPolicy(),
+            rate_limiter,
+            circuit_breaker,
+            cache
+        )
+
+        # Obtain a token up front so invalid credentials fail immediately.
+        self._get_token()
+
+    _base_url = _shared('base_url')
+    _client_id = _shared('client_id')
+    _database = _shared('database')
+    _username = _shared('username')
+    _password_hash = _shared('password_hash')
+    _password_hash_str = _shared('password_hash_str')
+    _session = _shared('session')
+    _token_store = _shared('token_store')
+    _token_key = _shared('token_key')
+    _retry = _shared('retry')
+    _rate_limiter = _shared('rate_limiter')
+    _circuit_breaker = _shared('circuit_breaker')
+    _cache = _shared('cache')
+
+    @property
+    def metrics(self):
+        """
+        RequestMetrics counting every request sent through this object's
+        connection, shared with the other views of an ArasClient.
+        """
+        return self._connection.metrics
+
+    @property
+    def _authorization(self):
+        """
+        The current access token, refreshed if it is about to expire.
+        """
+        return self._get_token()
+
+    @property
+    def _headers_auth(self):
+        """
+        Shortcut for the _authorization request header.
+        """
+        return {
+            "Authorization": f"Bearer {self._authorization}",
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Close every pooled connection held by this object's session.
+        """
+        self._session.close()
+
+    @classmethod
+    def _from_shared(cls, api):
+        """
+        Build an instance of cls that shares the session, token store and
+        every other piece of connection state of an authenticated API object
+        instead of opening its own. The state is shared, not copied, so
+        later changes are seen by both objects.
+        """
+        view = cls.__new__(cls)
+        view._connection = api._connection
+
+        return view
+
+    @staticmethod
+    def _build_session(pool_connections, pool_maxsize, pool_block):
+        """
+        Create a requests session backed by a keep-alive connection pool.
+        """
+        session = requests.Session()
+
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block
+        )
+
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        return session
+
+    def _get_token(self):
+        """
+        Return a valid access token, authenticating only when the token store
+        holds no usable token for these credentials.
+        """
+        token = self._token_store.get_token(self._token_key)
+
+        if token is not None:
+            return token
+
+        with self._token_store.lock(self._token_key):
+            # Another thread may have logged in while we waited.
+            token = self._token_store.get_token(self._token_key)
+
+            if token is None:
+                token = self._authenticate()
+
+        return token
+
+    def _authenticate(self):
+        """
+        Obtain a new access token, preferring the refresh token grant and
+        falling back to the password grant.
+        """
+        discovery = self._token_store.get_discovery(self._token_key)
+
+        if discovery is None:
+            # Perform initial request.
+            oauth_query_url = (
+                f"{self._base_url}/OAuthServer/.well-known/"
+                "openid-configuration"
             )
+            oauth_query_response = self._session.get(oauth_query_url)
+            oauth_query_response.raise_for_status()
+            discovery = oauth_query_response.json()
+            self._token_store.set_discovery(self._token_key, discovery)
 
-        if password_hash is not None and password_hash.name != "md5":
-            raise RuntimeError(
-                "Expected md5 hash for password, but a different hashing ",
-                "algorithm was used."
+        token_endpoint_url = discovery['token_endpoint']
+
+        refresh_token = self._token_store.get_refresh_token(self._token_key)
+
+        if refresh_token is not None:
+            token_response = self._session.post(
+                url=token_endpoint_url,
+                data={
+                    "grant_type": "refresh_token",
+                    "client_id": self._client_id,
+                    "refresh_token": refresh_token
+                }
             )
 
-        # Interactively get the password if it was not provided.
-        if password_hash is None:
-            password_hash_str = hashlib.md5(
-                getpass.getpass("Password: ").encode()
-            ).hexdigest()
-        else:
-            password_hash_str = password_hash.hexdigest()
+            if token_response.ok:
+                token = token_response.json()
+                self._token_store.set_token(self._token_key, token)
 
-        # TODO: get the base_url and verify that it is a valid InnovatorServer
-        self._base_url = base_url
+                return token["access_token"]
 
-        # Perform initial request.
-        oauth_query_url = '{0}/OAuthServer/.well-known/openid-configuration'\
-            .format(self._base_url)
-        oauth_query_response = requests.get(oauth_query_url)
-        token_endpoint_url = oauth_query_response.json()['token_endpoint']
+        if self._password_hash_str is None:
+            self._password_hash_str = _password_hash_str(self._password_hash)
 
         # Prepare authorization request.
         request_body = {
             "grant_type": "password",
             "scope": "Innovator",
-            "client_id": client_id,
-            "username": username,
-            "password": password_hash_str,
-            "database": database
+            "client_id": self._client_id,
+            "username": self._username,
+            "password": self._password_hash_str,
+            "database": self._database
         }
 
         # Perform authorization request.
-        token_response = requests.post(
+        token_response = self._session.post(
             url=token_endpoint_url,
             data=request_body
         )
+        token_response.raise_for_status()
+
+        token = token_response.json()
+        self._token_store.set_token(self._token_key, token)
 
         # This access token will be used to perform all other requests.
-        self._authorization = token_response.json()["access_token"]
+        return token["access_token"]
 
-    # Shortcut for _authorization request header
-        self._headers_auth = {
-            "Authorization": f"Bearer {self._authorization}",
-        }
+    def query(self, item_type):
+        """
+        Start a composable OData query against an entity set. See
+        src.api.query.Query.
+
+        Parameters
+        ----------
+        item_type : str
+            Entity set or navigation path, e.g. "Part".
+        """
+        return Query(self, item_type)
+
+    def batch(self, max_operations=100, max_bytes=4 * 1024 * 1024):
+        """
+        Start an OData $batch of create, update and delete operations. See
+        src.api.batch.Batch.
+
+        Parameters
+        ----------
+        max_operations : int
+            Maximum number of operations per batch request.
+        max_bytes : int or None
+            Maximum encoded size of one batch request.
+        """
+        return Batch(self, max_operations=max_operations, max_bytes=max_bytes)
+
+    def _execute_query(self, query):
+        """
+        Run a Query and return the decoded response.
+        """
+        query_response = self._request(
+            "GET",
+            url=query.url(self._base_url)
+        )
+
+        return query_response.json()
+
+    def _count_query(self, query):
+        """
+        Run a Query with $count and return the number of matching rows.
+        """
+        count_query = query.top(0)
+        query_url = count_query.url(self._base_url)
+        query_url += ("&" if "?" in query_url else "?") + "$count=true"
+
+        query_response = self._request(
+            "GET",
+            url=query_url
+        )
+        query_response.raise_for_status()
+
+        return query_response.json()['@odata.count']
+
+    def _get_json(self, url, tags=(), tags_from=None):
+        """
+        GET a url and return the decoded body, reading through the response
+        cache when one is configured.
+
+        Parameters
+        ----------
+        url : str
+            Fully resolved request url, used as the cache key.
+        tags : iterable of tuple
+            (item_type, item_id) pairs the response describes, used to
+            invalidate it when one of those items is written.
+        tags_from : callable or None
+            Called with the decoded body to add tags for items that are only
+            known once the response arrives, e.g. expanded children.
+        """
+        if self._cache is None:
+            return self._request("GET", url=url).json()
+
+        cached = self._cache.lookup(url)
+        headers = None
+
+        if cached is not None:
+            content, etag, fresh = cached
+
+            if fresh:
+                return json.loads(content)
+
+            if etag is not None:
+                headers = {"If-None-Match": etag}
+
+        query_response = self._request("GET", url=url, headers=headers)
+
+        if query_response.status_code == 304 and cached is not None:
+            content = self._cache.revalidated(url)
+
+            if content is not None:
+                return json.loads(content)
+
+            query_response = self._request("GET", url=url)
+
+        body = query_response.json()
+
+        if query_response.status_code == 200:
+            tags = list(tags)
+
+            if tags_from is not None:
+                tags.extend(tags_from(body))
+
+            self._cache.store(
+                url,
+                query_response.content,
+                query_response.headers.get('ETag'),
+                tags
+            )
+
+        return body
+
+    def _invalidate(self, item_type, item_id):
+        """
+        Drop cached responses about an item after it was written.
+        """
+        if self._cache is not None:
+            self._cache.invalidate(item_type, item_id)
+
+    def _request_json(self, method, url, data=None, invalidate=None):
+        """
+        Send a request and return the decoded body.
+
+        Parameters
+        ----------
+        method : str
+            HTTP verb, e.g. "GET" or "POST".
+        url : str
+            Fully qualified url of the request.
+        data : str or None
+            Body of the request.
+        invalidate : tuple or None
+            (item_type, item_id) of the item the request writes, whose
+            cached responses are dropped once it has been sent.
+        """
+        query_response = self._request(method, url=url, data=data)
+
+        if invalidate is not None:
+            self._invalidate(*invalidate)
+
+        return query_response.json()
+
+    def _delete_item(self, url, item_type, item_id):
+        """
+        Send a DELETE request for an item and return the response.
+        """
+        query_response = self._request("DELETE", url=url)
+
+        self._invalidate(item_type, item_id)
+
+        return query_response
+
+    @staticmethod
+    def _run(steps):
+        """
+        Run the generator of a method decorated with _steps. The values it
+        yields are already computed, so each is sent straight back.
+        """
+        value = None
+
+        while True:
+            try:
+                value = steps.send(value)
+            except StopIteration as stop:
+                return stop.value
+
+    @staticmethod
+    def _map(function, items, workers):
+        """
+        Return [function(item) for item in items], calling function from up
+        to workers threads at once.
+        """
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(function, items))
+
+    @staticmethod
+    def _collect(records):
+        """
+        Return the records of an iterator, e.g. Query.iter(), as a list.
+        """
+        return list(records)
+
+    @staticmethod
+    def _run_blocking(function, *args):
+        """
+        Call a function that blocks on disk or CPU, e.g. a hash of a file.
+        """
+        return function(*args)
+
+    @staticmethod
+    def _status_code(response):
+        """
+        Return the HTTP status of a response returned by _request.
+        """
+        return response.status_code
+
+    @staticmethod
+    def _content(response):
+        """
+        Return the body of a response returned by _request as bytes.
+        """
+        return response.content
+
+    def _iter_items(self, item_type, page_size=1000, params=None,
+                    stream=False):
+        """
+        Yield the records of an item type page by page.
+
+        Pages are requested with $top/$skip, ordered by id so rows are not
+        skipped or repeated between pages. If the server answers with an
+        @odata.nextLink it is followed instead. Only one page is held in
+        memory at a time.
+
+        Parameters
+        ----------
+        item_type : str
+            OData entity set, e.g. "Part" or "Airworthiness Parameter".
+        page_size : int or None
+            Number of records requested per page. Defaults to 1000. None
+            sends a single request without $top/$skip, which is only
+            sensible together with stream=True.
+        params : dict or None
+            Additional OData query options, e.g. {"$select": "id,name"}.
+        stream : bool
+            Decode each page incrementally from the socket and yield records
+            as they are parsed instead of after the whole page has been
+            downloaded and decoded. Lowers peak memory and time to first
+            record for large pages and $expand queries.
+        """
+        if page_size is not None and (not isinstance(page_size, int)
+                                      or page_size < 1):
+            raise ValueError("page_size must be a positive integer or None.")
+
+        query_url = f"{self._base_url}/server/odata/{item_type}"
+
+        query_params = {'$orderby': 'id'}
+
+        if params is not None:
+            query_params.update(params)
+
+        # Keep page boundaries stable when sorting on a non-unique column.
+        order_keys = [key.split()[0] for key in
+                      query_params['$orderby'].split(',')]
+        if 'id' not in order_keys:
+            query_params['$orderby'] += ',id'
+
+        if page_size is not None:
+            query_params['$top'] = page_size
+            query_params['$skip'] = 0
+
+        return self._follow_pages(query_url, query_params, page_size, stream)
+
+    def _follow_pages(self, query_url, query_params, page_size, stream):
+        """
+        Generator behind _iter_items, requesting one page per step.
+        """
+        while query_url is not None:
+            page_url = query_url
+
+            if query_params is not None:
+                page_url += "?" + encode_params(query_params)
+
+            if stream:
+                query_response = self._request(
+                    "GET",
+                    url=page_url,
+                    stream=True
+                )
+
+                try:
+                    query_response.raise_for_status()
+
+                    page = JSONArrayStream(
+                        query_response.iter_content(STREAM_CHUNK_SIZE)
+                    )
+                    record_count = 0
+
+                    for record in page:
+                        record_count += 1
+                        yield record
+
+                    metadata = page.metadata
+                finally:
+                    query_response.close()
+            else:
+                query_response = self._request(
+                    "GET",
+                    url=page_url
+                )
+                query_response.raise_for_status()
+
+                metadata = query_response.json()
+                records = metadata.get('value', [])
+                record_count = len(records)
+
+                yield from records
+
+            next_link = metadata.get('@odata.nextLink')
+
+            if next_link is not None:
+                # Server driven paging, the link carries every option.
+                query_url = next_link
+                query_params = None
+            elif (query_params is not None and page_size is not None
+                    and record_count == page_size):
+                query_params['$skip'] += page_size
+            else:
+                query_url = None
+
+    def _request(self, method, url, headers=None, idempotent=None,
+                 on_retry=None, **kwargs):
+        """
+        Send an authorized request through the pooled session.
+
+        A 401 response invalidates the cached token and the request is
+        retried once with a new one. Connection errors and retryable
+        statuses are retried according to the retry policy, and every
+        attempt passes through the rate limiter and circuit breaker.
+
+        Parameters
+        ----------
+        method : str
+            HTTP verb, e.g. "GET" or "POST".
+        url : str
+            Fully qualified url of the request.
+        headers : dict or None
+            Extra headers of the request. The dict is sent as it is, with
+            its Authorization header set in place, so a caller sending many
+            requests can build it once and reuse it.
+        idempotent : bool or None
+            Marks a request as safe to repeat regardless of its verb, e.g.
+            a vault chunk upload. Defaults to the retry policy's verb check.
+        on_retry : callable or None
+            Called without arguments before every retry, e.g. to count
+            them in transfer statistics.
+        **kwargs
+            Passed through to requests.Session.request.
+        """
+        token = self._get_token()
+        reauthenticated = False
+        attempt = 0
+
+        while True:
+            try:
+                response = self._attempt(method, url, token, headers,
+                                         **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if not self._retry.should_retry(method, attempt,
+                                                idempotent=idempotent):
+                    raise
+
+                self.metrics.record_retry()
+
+                if on_retry is not None:
+                    on_retry()
+
+                time.sleep(self._retry.backoff(attempt))
+                attempt += 1
+                continue
+
+            if response.status_code == 401 and not reauthenticated:
+                # release the connection of a streamed response
+                response.close()
+                self.metrics.record_reauthentication()
+                self._token_store.invalidate(self._token_key, token)
+                token = self._get_token()
+                reauthenticated = True
+                continue
+
+            if self._retry.should_retry(method, attempt,
+                                        response.status_code, idempotent):
+                response.close()
+                self.metrics.record_retry()
+
+                if on_retry is not None:
+                    on_retry()
+
+                time.sleep(self._retry.backoff(
+                    attempt, response.headers.get('Retry-After')
+                ))
+                attempt += 1
+                continue
+
+            return response
+
+    def _attempt(self, method, url, token, headers=None, **kwargs):
+        """
+        Send one attempt of a request through the rate limiter and circuit
+        breaker.
+        """
+        # wait for the rate limiter first, so a half-open circuit's trial
+        # request is not held while other requests are throttled
+        if self._rate_limiter is not None:
+            self._rate_limiter.acquire()
+
+        if self._circuit_breaker is not None:
+            self._circuit_breaker.before_request()
+
+        try:
+            response = self._send(method, url, token, headers, **kwargs)
+        except requests.RequestException:
+            # connection errors and broken or undecodable responses alike
+            self.metrics.record_error()
+
+            if self._circuit_breaker is not None:
+                self._circuit_breaker.record_failure()
+            raise
+        except BaseException:
+            if self._circuit_breaker is not None:
+                self._circuit_breaker.release()
+            raise
+
+        self.metrics.record_response(response.status_code)
+
+        if self._circuit_breaker is not None:
+            if response.status_code >= 500:
+                self._circuit_breaker.record_failure()
+            else:
+                self._circuit_breaker.record_success()
+
+        return response
+
+    def _send(self, method, url, token, headers=None, **kwargs):
+        """
+        Send a single request authorized with the given token. The
+        Authorization header is set in headers itself rather than in a copy.
+        """
+        if headers is None:
+            headers = {}
+
+        headers["Authorization"] = f"Bearer {token}"
+
+        return self._session.request(
+            method,
+            url,
+            headers=headers,
+            **kwargs
+        )
+
+
+def _validate_credentials(base_url, client_id, database, username,
+                          password_hash):
+    """
+    Validate the connection arguments shared by the API handlers.
+    """
+    # Validate inputs.
+    if not isinstance(base_url, str):
+        raise ValueError(
+            "The base_url parameter must be string."
+        )
+
+    if not isinstance(client_id, str):
+        raise ValueError(
+            "The client_id parameter must be string."
+        )
+
+    if not isinstance(database, str):
+        raise ValueError(
+            "The database parameter must be string."
+        )
+
+    if not isinstance(username, str):
+        raise ValueError(
+            "The username parameter must be string."
+        )
+
+    if (password_hash is not None and
+        not isinstance(password_hash, hashlib._hashlib.HASH)):
+        raise ValueError(
+            "The password_hash parameter must be an md5 hash object. ",
+            "e.g. hashlib.md5( 'PASSWORD'.encode() )"
+        )
+
+    if password_hash is not None and password_hash.name != "md5":
+        raise RuntimeError(
+            "Expected md5 hash for password, but a different hashing ",
+            "algorithm was used."
+        )
+
+
+def _password_hash_str(password_hash):
+    """
+    Return the hex digest of the user's password, prompting for it if no
+    hash was provided.
+    """
+    # Interactively get the password if it was not provided.
+    if password_hash is None:
+        password_hash_str = hashlib.md5(
+            getpass.getpass("Password: ").encode()
+        ).hexdigest()
+    else:
+        password_hash_str = password_hash.hexdigest()
+
+    return password_hash_str
@@ -1,11 +1,11 @@
-from .common import CommonAPI
+from .common import CommonAPI, _steps
 import json
-import requests
 
 
-class DocumentAPI(CommonAPI):
+class _DocumentMethods:
     """
-    Class to handle methods for documents in the Aras API.
+    Document methods shared by DocumentAPI and AsyncDocumentAPI, see
+    airworthiness._AirworthinessMethods.
     """
 
     def get_document_list(self):
@@ -14,12 +14,30 @@ class DocumentAPI(CommonAPI):
         """
         query_url = f"{self._base_url}/server/odata/Document"
 
-        query_response = requests.get(
-            url=query_url,
-            headers=self._headers_auth
-        )
+        return self._request_json("GET", url=query_url)
+
+    def iter_documents(self, page_size=1000, stream=False):
+        """
+        Yield every Document item in Aras as a dict, ordered by id.
+
+        The next page is only requested once the previous one has been
+        consumed, so a loop that stops early does not download the rest of
+        the Document table.
 
-        return query_response.json()
+        Parameters
+        ----------
+        page_size: int
+            number of records requested per round trip.
+
+        stream: bool
+            decode each page incrementally while it downloads, yielding
+            records before the whole page has arrived. Blocking API only.
+        """
+        return self._iter_items(
+            "Document",
+            page_size=page_size,
+            stream=stream
+        )
 
     def search_document_name(self, document_name):
         """
@@ -36,17 +54,7 @@ class DocumentAPI(CommonAPI):
                 "document_name must be a string."
             )
 
-        # constructs the query
-        query_url = (f"{self._base_url}/server/odata/Document"
-                     f"?$filter=name eq '{document_name}'"
-                     )
-
-        query_response = requests.get(
-            url=query_url,
-            headers=self._headers_auth
-        )
-
-        return query_response.json()
+        return self.query("Document").filter(name=document_name).get()
 
     def search_document_id(self, document_id):
         """
@@ -67,12 +75,7 @@ class DocumentAPI(CommonAPI):
         # constructs the query
         query_url = f"{self._base_url}/server/odata/Document('{document_id}')"
 
-        query_response = requests.get(
-            url=query_url,
-            headers=self._headers_auth
-        )
-
-        return query_response.json()
+        return self._get_json(query_url, tags=[("Document", document_id)])
 
     def delete_document(self, document_id):
         """
@@ -92,12 +95,7 @@ class DocumentAPI(CommonAPI):
         # constructs the query
         query_url = f"{self._base_url}/server/odata/Document('{document_id}')"
 
-        query_response = requests.delete(
-            url=query_url,
-            headers=self._headers_auth
-        )
-
-        return query_response
+        return self._delete_item(query_url, "Document", document_id)
 
     def create_document(self, document_name, document_number):
         """
@@ -133,14 +131,13 @@ class DocumentAPI(CommonAPI):
 
         converted_metadata = json.dumps(metadata)
 
-        query_response = requests.post(
+        return self._request_json(
+            "POST",
             url=query_url,
-            data=converted_metadata,
-            headers=self._headers_auth
+            data=converted_metadata
         )
 
-        return query_response.json()
-
+    @_steps
     def get_document_id(self, file_name):
         """
         Searches documents for a specific id number based on the name of the
@@ -152,11 +149,17 @@ class DocumentAPI(CommonAPI):
                 "file_name must be a string."
             )
 
-        # creates list of all documents in the space, checking for file name
-        # match
-        document_id = [document['id'] for document in
-                       self.get_document_list()['value']
-                       if document['name'] == file_name
-                       ]
+        # filters on the server and only transfers the id column of the
+        # matching documents
+        query = self.query("Document").filter(name=file_name).select("id")
+
+        documents = yield self._collect(query.iter())
+        document_id = [document['id'] for document in documents]
 
         return document_id
+
+
+class DocumentAPI(_DocumentMethods, CommonAPI):
+    """
+    Class to handle methods for documents in the Aras API.
+    """
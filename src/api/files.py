@@ -1,13 +1,199 @@
-from .common import CommonAPI
+from .batch import (
+    BatchResult, _split_multipart, encode_multipart, encode_request
+)
+from .common import CommonAPI, _steps
+from .transfer import (
+    AdaptiveChunkSize, ContentIndex, DownloadResult, SyncManifest,
+    SyncResult, UploadResult, file_digests, file_fingerprint, measure,
+    missing_ranges, scan_tree, upload_source
+)
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import os
-import requests
+import threading
+import time
 import uuid
 
 
-class FilesAPI(CommonAPI):
+# Characters percent encoded in the filename of an upload.
+_URL_ESCAPES = str.maketrans({
+    '%': '%25', ' ': '%20', "'": '%27', '!': '%21', '"': '%22', '#': '%23',
+    '$': '%24', '&': '%26', '(': '%28', ')': '%29', '*': '%2A', '+': '%2B',
+    '?': '%3F'
+})
+
+
+def _same_file(record, file_name, size, md5):
     """
-    Class to handle methods pertaining to files.
+    True if a File record matches a local file's name, size and, when the
+    server reports one, MD5 checksum.
+    """
+    try:
+        same_size = int(record.get('file_size')) == size
+    except (TypeError, ValueError):
+        return False
+
+    checksum = record.get('checksum')
+
+    return (record.get('filename') == file_name and same_size
+            and (not checksum or checksum.lower() == md5))
+
+
+def _record_commit(status_code, headers, content, results):
+    """
+    Store the outcome of a multi-file commit on each result. A multipart
+    response is matched to the files part by part; otherwise the overall
+    status applies to every file. If the parts cannot be matched to the
+    files, the outcome of every file is unknown and reported as failed.
+    """
+    statuses = [status_code] * len(results)
+
+    content_type = headers.get('Content-Type', '')
+
+    if content_type.startswith('multipart/'):
+        parts = _split_multipart(content, content_type)
+
+        if len(parts) != len(results):
+            for result in results:
+                result.error = ValueError(
+                    f"The commit answered {len(parts)} of "
+                    f"{len(results)} files."
+                )
+
+            return
+
+        statuses = [
+            BatchResult._from_http(payload).status_code
+            for _, payload in parts
+        ]
+
+    for result, status in zip(results, statuses):
+        result.commit_status = status
+
+        if status >= 400:
+            result.error = ValueError(
+                f"Commit failed with status {status}."
+            )
+
+
+def _upload_options(workers, chunk_size, default_workers,
+                    default_chunk_size):
+    """
+    Apply the defaults to and validate the worker count and chunk size of
+    an upload, for FilesAPI and AsyncFilesAPI alike.
+    """
+    if workers is None:
+        workers = default_workers
+
+    if chunk_size is None:
+        chunk_size = default_chunk_size
+
+    if not isinstance(workers, int) or workers < 1:
+        raise ValueError(
+            "workers must be a positive integer."
+        )
+
+    if not isinstance(chunk_size, AdaptiveChunkSize) and (
+            not isinstance(chunk_size, int) or chunk_size < 1):
+        raise ValueError(
+            "chunk_size must be a positive integer or an "
+            "AdaptiveChunkSize."
+        )
+
+    return workers, chunk_size
+
+
+def _commit_body(base_url, boundary, files):
+    """
+    Build the multipart body of a vault commit that registers each
+    (file_id, file_name, size) triple as a File item.
+    """
+    parts = []
+
+    for file_id, file_name, size in files:
+        file_item = {
+            "id": file_id,
+            "filename": file_name,
+            "file_size": size,
+            "Located": [{
+                "file_version": 1,
+                "related_id": "67BBB9204FE84A8981ED8313049BA06C"
+            }]
+        }
+
+        parts.append(encode_request(
+            "POST",
+            base_url + "/Server/odata/File",
+            body=file_item
+        ))
+
+    return encode_multipart(boundary, parts)
+
+
+def _escape_url(url):
+    """
+    Percent encode the characters of a filename that the vault rejects.
+    """
+    return url.translate(_URL_ESCAPES)
+
+
+def _verify_download(file_id, size, written, checksum, md5):
+    """
+    Raise ValueError if downloaded content does not match its File item.
+    """
+    if written != size:
+        raise ValueError(
+            f"File {file_id} downloaded {written} bytes, expected {size}."
+        )
+
+    if checksum and md5 is not None and checksum.lower() != md5:
+        raise ValueError(
+            f"File {file_id} failed checksum verification."
+        )
+
+
+def _local_name(record):
+    """
+    Return the filename of a File record reduced to a bare name, so a
+    server supplied name cannot point outside the download directory.
+    """
+    name = os.path.basename(str(record.get('filename') or '').replace(
+        '\\', '/'
+    ))
+
+    if name in ('', '.', '..'):
+        raise ValueError(
+            f"File {record.get('id')} has no usable filename."
+        )
+
+    return name
+
+
+def _unique_name(name, taken):
+    """
+    Return name, numbered like "name (2).ext" if it is already in taken,
+    and add the result to taken.
+    """
+    stem, extension = os.path.splitext(name)
+    candidate = name
+    number = 1
+
+    while os.path.normcase(candidate) in taken:
+        number += 1
+        candidate = f"{stem} ({number}){extension}"
+
+    taken.add(os.path.normcase(candidate))
+
+    return candidate
+
+
+class _FileMethods:
+    """
+    File methods shared by FilesAPI and AsyncFilesAPI, see
+    airworthiness._AirworthinessMethods. Uploads use _send_source_chunks
+    and _upload_options of the concrete class.
     """
+    CHUNK_SIZE = 10000
 
     def get_file_list(self):
         """
@@ -15,11 +201,27 @@ class FilesAPI(CommonAPI):
         """
         query_url = f"{self._base_url}/server/odata/File"
 
-        query_response = requests.get(
-            url=query_url,
-            headers=self._headers_auth)
+        return self._request_json("GET", url=query_url)
+
+    def iter_files(self, page_size=1000, stream=False):
+        """
+        Yield the metadata of every File item in Aras as a dict, ordered by
+        id. The vault content itself is not fetched; see download_file.
+
+        Parameters
+        ----------
+        page_size: int
+            number of records requested per round trip.
 
-        return query_response.json()
+        stream: bool
+            decode each page incrementally while it downloads, yielding
+            records before the whole page has arrived. Blocking API only.
+        """
+        return self._iter_items(
+            "File",
+            page_size=page_size,
+            stream=stream
+        )
 
     def search_file_id(self, file_id):
         """
@@ -40,12 +242,7 @@ class FilesAPI(CommonAPI):
         # constructs the query
         query_url = f"{self._base_url}/server/odata/File('{file_id}')"
 
-        query_response = requests.get(
-            url=query_url,
-            headers=self._headers_auth
-        )
-
-        return query_response.json()
+        return self._get_json(query_url, tags=[("File", file_id)])
 
     def search_file_name(self, file_name):
         """
@@ -60,17 +257,7 @@ class FilesAPI(CommonAPI):
         if not isinstance(file_name, str):
             raise ValueError("Part Number must be formatted as a string.")
 
-        query_url = (
-            f"{self._base_url}/server/odata/File?$"
-            f"filter=filename eq '{file_name}'"
-        )
-
-        query_response = requests.get(
-            url=query_url,
-            headers=self._headers_auth
-        )
-
-        return query_response.json()
+        return self.query("File").filter(filename=file_name).get()
 
     def delete_file(self, file_id):
         """
@@ -91,16 +278,82 @@ class FilesAPI(CommonAPI):
         # create the query structure
         query_url = f"{self._base_url}/server/odata/File('{file_id}')"
 
-        query_response = requests.delete(
-            url=query_url,
-            headers=self._headers_auth
+        return self._delete_item(query_url, "File", file_id)
+
+    @_steps
+    def upload_file(self, file_path, file_number, workers=None,
+                    chunk_size=None, stats=None, journal=None,
+                    file_name=None, size=None):
+        """
+        Uploads a document to the Aras API Space.
+
+        Chunks are sent concurrently within one vault transaction. The first
+        failed chunk stops the upload; chunks not yet started are abandoned
+        and the transaction is never committed.
+
+        Besides a local path the content can be a bytes-like object, a
+        binary file object such as a streamed HTTP response, or an iterable
+        of byte blocks, so data can be piped into the vault without touching
+        disk. File objects and iterables are read sequentially, one chunk
+        per worker at a time.
+
+        Parameters
+        ----------
+        file_path: str, bytes-like, file object or iterable of bytes
+            local directory to the file to be uploaded, or its content
+
+        file_number: str
+            client side generated identification number of a document
+
+        workers: int
+            number of chunks in flight at once, defaults to UPLOAD_WORKERS,
+            or to the concurrency limit on the asyncio API. Values above the
+            session's pool_maxsize open connections that are not kept for
+            reuse.
+
+        chunk_size: int or AdaptiveChunkSize
+            bytes sent per chunk request, defaults to CHUNK_SIZE. An
+            AdaptiveChunkSize adjusts the size to the measured throughput.
+
+        stats: TransferStats
+            optional object filled with the duration of every chunk, the
+            retries and the transaction, chunks and commit phases.
+
+        journal: UploadJournal
+            optional journal recording the transaction and acknowledged
+            byte ranges. If an earlier upload of the unchanged file was
+            interrupted, only the missing ranges are sent in its transaction.
+            A fresh upload is started if the vault rejects the resumed one.
+            Only available for local paths.
+
+        file_name: str
+            filename of the File item, defaults to the basename of
+            file_path. Required when uploading content.
+
+        size: int
+            number of bytes the content provides. Required for iterables
+            and file objects that cannot seek.
+        """
+        document_id, commit_response = yield self._upload(
+            file_path, file_number, workers, chunk_size, stats, journal,
+            file_name, size
         )
 
-        return query_response
+        return commit_response
 
-    def upload_file(self, file_path, file_number):
+    @_steps
+    def upload_file_dedup(self, file_path, file_number, index, workers=None,
+                          chunk_size=None, stats=None, journal=None):
         """
-        Uploads a document to the Aras API Space.
+        Uploads a file unless identical content is already in the vault and
+        returns the id of the File item either way.
+
+        The file is hashed in one streaming pass. A File recorded in the
+        content index for the same SHA-256 and filename is reused if the
+        server still reports the same filename and file_size. Otherwise a
+        File returned by search_file_name with the same file_size and MD5
+        checksum is reused and added to the index. Only if neither exists is
+        the file uploaded. The asyncio API hashes in the default executor.
 
         Parameters
         ----------
@@ -109,43 +362,309 @@ class FilesAPI(CommonAPI):
 
         file_number: str
             client side generated identification number of a document
+
+        index: ContentIndex
+            local index of content hashes already in the vault. It is
+            updated in memory; call index.save() to persist it, e.g. once
+            after a run of uploads.
+
+        workers, chunk_size, stats, journal:
+            passed to upload_file when the file has to be uploaded.
         """
-        # checks variables are valid
+        if not isinstance(index, ContentIndex):
+            raise ValueError(
+                "index must be a ContentIndex."
+            )
+
         if not isinstance(file_path, str):
             raise ValueError(
                 "file_path must be a string."
             )
 
+        file_name = os.path.basename(file_path)
+        size = os.path.getsize(file_path)
+
+        sha256, md5 = yield self._run_blocking(index.digests, file_path)
+        key = index.make_key(self._base_url, self._database, sha256,
+                             file_name)
+
+        file_id = index.get(key)
+
+        if file_id is not None:
+            record = yield self.search_file_id(file_id)
+
+            if (record.get('id') == file_id
+                    and _same_file(record, file_name, size, md5)):
+                return file_id
+
+            index.discard(key)
+
+        records = yield self.search_file_name(file_name)
+
+        for record in records.get('value', []):
+            # name and size alone do not prove identical content
+            if (record.get('checksum')
+                    and _same_file(record, file_name, size, md5)):
+                index.set(key, record['id'])
+
+                return record['id']
+
+        file_id, commit_response = yield self._upload(
+            file_path, file_number, workers, chunk_size, stats, journal
+        )
+
+        if not commit_response.ok:
+            raise ValueError(
+                f"Commit of {file_name} failed with status "
+                f"{self._status_code(commit_response)}."
+            )
+
+        index.set(key, file_id)
+
+        return file_id
+
+    @_steps
+    def upload_files(self, files, workers=None, chunk_size=None,
+                     stats=None):
+        """
+        Uploads many files in a single vault transaction.
+
+        Files are sent concurrently and registered by one commit whose
+        multipart body holds a File part per uploaded file. A file whose
+        chunks fail is left out of the commit without affecting the others.
+
+        Parameters
+        ----------
+        files: iterable of (str, str)
+            (file_path, file_number) pairs.
+
+        workers: int
+            number of chunk requests in flight at once across all files,
+            defaults to UPLOAD_WORKERS. When there are fewer files than
+            workers the spare workers split the files into parallel chunks.
+
+        chunk_size: int or AdaptiveChunkSize
+            bytes sent per chunk request, defaults to CHUNK_SIZE.
+
+        stats: TransferStats
+            optional object filled with the size and chunks of all files,
+            the retries and the transaction, chunks and commit phases.
+
+        Returns
+        -------
+        list of UploadResult
+            one result per file, in the order given.
+        """
+        results = []
+
+        for file_path, file_number in files:
+            if not isinstance(file_path, str):
+                raise ValueError(
+                    "file_path must be a string."
+                )
+
+            if not isinstance(file_number, str):
+                raise ValueError(
+                    "document_number must be a string."
+                )
+
+            results.append(UploadResult(file_path, file_number))
+
+        workers, chunk_size = self._upload_options(workers, chunk_size)
+
+        if not results:
+            return results
+
+        if stats is not None:
+            stats.start()
+
+        try:
+            yield self._upload_batch(results, workers, chunk_size, stats)
+        finally:
+            if stats is not None:
+                stats.finish()
+
+        return results
+
+    @_steps
+    def _upload_batch(self, results, workers, chunk_size, stats):
+        """
+        Uploads the files of results in one transaction with validated
+        options, see upload_files. The outcome is stored on each result.
+        """
+        with measure(stats, "transaction"):
+            transaction_id = yield self._get_transaction_id()
+
+        chunk_workers = max(1, workers // len(results))
+
+        # run by _run like the method itself, once per file
+        def send(result):
+            file_id = uuid.uuid1().hex.upper()
+
+            try:
+                result.size = yield self._send_file_chunks(
+                    result.file_path, transaction_id, file_id,
+                    result.file_number, chunk_size, chunk_workers, stats
+                )
+            except Exception as error:
+                # reported per file, the other files are still committed
+                result.error = error
+            else:
+                result.file_id = file_id
+
+        yield self._map(lambda result: self._run(send(result)), results,
+                        min(workers, len(results)))
+
+        sent = [result for result in results if result.ok]
+
+        if not sent:
+            return
+
+        try:
+            with measure(stats, "commit"):
+                commit_response = yield self._commit_files(transaction_id,
+                                                           sent)
+                content = yield self._content(commit_response)
+        except Exception as error:
+            # the files were sent but their commit is unknown
+            for result in sent:
+                result.error = error
+        else:
+            _record_commit(self._status_code(commit_response),
+                           commit_response.headers, content, sent)
+
+    @_steps
+    def _upload(self, file_path, file_number, workers, chunk_size, stats,
+                journal, file_name=None, size=None):
+        """
+        Validates the upload arguments, uploads a file and returns the new
+        File id with the commit response.
+        """
+        # checks variables are valid
         if not isinstance(file_number, str):
             raise ValueError(
                 "document_number must be a string."
             )
 
-        file_name = os.path.basename(file_path)
+        workers, chunk_size = self._upload_options(workers, chunk_size)
 
-        document_id = uuid.uuid1().hex.upper()
+        if file_name is None and isinstance(file_path, str):
+            file_name = os.path.basename(file_path)
 
-        # retrieve a transaction id for the upload process
-        transaction_id = self._get_transaction_id()
+        if not isinstance(file_name, str):
+            raise ValueError(
+                "file_name must be a string when uploading content."
+            )
 
-        # chunk the file and send it to the innovator instance
-        upload_results = self._send_file_chunks(file_path, transaction_id,
-                                                document_id, file_number)
+        if journal is not None and not isinstance(file_path, str):
+            raise ValueError(
+                "A journal can only resume uploads of local paths."
+            )
 
-        # verifies the chunking process worked correctly
-        for result in upload_results:
-            if result.status_code != 200:
-                raise ValueError(
-                    "Chunk Verification Failed. Data may be corrupted."
+        if stats is not None:
+            stats.start()
+
+        try:
+            if journal is not None:
+                return (yield self._upload_journaled(
+                    file_path, file_name, file_number, chunk_size, workers,
+                    stats, journal
+                ))
+
+            document_id = uuid.uuid1().hex.upper()
+
+            # retrieve a transaction id for the upload process
+            with measure(stats, "transaction"):
+                transaction_id = yield self._get_transaction_id()
+
+            # chunk the file and send it to the innovator instance, raises
+            # on the first chunk the vault does not accept
+            size = yield self._send_file_chunks(
+                file_path, transaction_id, document_id, file_number,
+                chunk_size, workers, stats, size=size
+            )
+
+            # commits the file chunks to Aras, completing the process
+            with measure(stats, "commit"):
+                commit_response = yield self._commit_file_transaction(
+                    size, transaction_id, document_id, file_name
                 )
 
-        # commits the file chunks to Aras, completing the process
-        commit_response = self._commit_file_transaction(file_path,
-                                                        transaction_id,
-                                                        document_id, file_name)
+            return document_id, commit_response
+        finally:
+            if stats is not None:
+                stats.finish()
 
-        return commit_response
+    @_steps
+    def _upload_journaled(self, file_path, file_name, file_number,
+                          chunk_size, workers, stats, journal):
+        """
+        Upload a file recording progress in the journal, first trying to
+        finish the journaled transaction of an interrupted upload.
+        """
+        key = journal.make_key(self._base_url, self._database, file_path)
+        fingerprint = file_fingerprint(file_path)
+        entry = journal.get(key)
+
+        def acknowledge(start, length):
+            journal.acknowledge(key, start, start + length)
+
+        if (entry is not None and entry['fingerprint'] == fingerprint
+                and entry['file_number'] == file_number):
+            commit_response = None
+
+            try:
+                yield self._send_file_chunks(
+                    file_path, entry['transaction_id'], entry['file_id'],
+                    file_number, chunk_size, workers, stats,
+                    done=entry['ranges'], on_chunk=acknowledge
+                )
+            except ValueError:
+                # the vault most likely dropped the transaction; the new
+                # upload below adds the file size to stats again
+                if stats is not None:
+                    stats.add_size(-fingerprint['size'])
+            else:
+                with measure(stats, "commit"):
+                    commit_response = yield self._commit_file_transaction(
+                        fingerprint['size'], entry['transaction_id'],
+                        entry['file_id'], file_name
+                    )
+            finally:
+                journal.flush()
+
+            if commit_response is not None and commit_response.ok:
+                journal.discard(key)
+
+                return entry['file_id'], commit_response
+
+        document_id = uuid.uuid1().hex.upper()
+
+        with measure(stats, "transaction"):
+            transaction_id = yield self._get_transaction_id()
+
+        journal.begin(key, fingerprint, transaction_id, document_id,
+                      file_number)
 
+        try:
+            yield self._send_file_chunks(
+                file_path, transaction_id, document_id, file_number,
+                chunk_size, workers, stats, on_chunk=acknowledge
+            )
+        finally:
+            journal.flush()
+
+        with measure(stats, "commit"):
+            commit_response = yield self._commit_file_transaction(
+                fingerprint['size'], transaction_id, document_id, file_name
+            )
+
+        if commit_response.ok:
+            journal.discard(key)
+
+        return document_id, commit_response
+
+    @_steps
     def _get_transaction_id(self):
         """
         The first step in uploading a file to Aras. Sends a request to the
@@ -155,127 +674,803 @@ class FilesAPI(CommonAPI):
         # construct the query
         query_url = f"{self._base_url}/vault/odata/vault.BeginTransaction"
 
-        query_response = requests.post(
-            url=query_url,
-            headers=self._headers_auth
-        )
+        query_body = yield self._request_json("POST", url=query_url)
 
-        transaction_id = query_response.json()['transactionId']
+        transaction_id = query_body['transactionId']
 
         return transaction_id
 
-    def _send_file_chunks(self, file_path, transaction_id, file_id, file_name):
+    @_steps
+    def _send_file_chunks(self, file_path, transaction_id, file_id,
+                          file_name, chunk_size, workers, stats=None,
+                          done=(), on_chunk=None, size=None):
         """
-        Chunks a file and sends chunks to the Aras environment.
+        Chunks a file and sends chunks to the Aras environment. Returns the
+        size of the content.
+
+        Local files are memory mapped and each chunk is a memoryview slice
+        of the mapping, so chunk bodies are never copied into bytes objects.
+        Other sources are opened with transfer.upload_source. Each worker
+        claims the next unsent byte range and reuses one header dict in
+        which only Content-Range changes. Responses are checked and dropped
+        as they arrive, so the upload holds no chunk in memory.
+
+        Byte ranges listed in done are skipped. on_chunk(start, length) is
+        called after every acknowledged chunk.
         """
+        if isinstance(file_path, str):
+            file_path = os.path.abspath(file_path)
 
-        CHUNK_SIZE = 10000
+        with upload_source(file_path, size) as source:
+            yield self._send_source_chunks(source, transaction_id, file_id,
+                                           file_name, chunk_size, workers,
+                                           stats, done, on_chunk)
 
-        file_path = os.path.abspath(file_path)
+        return source.size
 
-        with open(file_path, 'rb') as f:
+    def _commit_file_transaction(self, size, transaction_id, file_id,
+                                 file_name):
+        """
+        Commits the final transaction after all of the file chunks have been
+        uploaded, registering size bytes as File file_name.
+        """
+        commit_url = f"{self._base_url}/vault/odata/vault.CommitTransaction"
 
-            results = []
-            size = os.path.getsize(file_path)
-            start = 0
-            end = 0
+        commit_headers = {
+            "Content-Type": f"multipart/mixed; boundary=batch_{file_id}",
+            "transactionid": f"{transaction_id}"
+        }
 
-            while end < size - 1:
-                end = start + CHUNK_SIZE
+        commit_body = _commit_body(self._base_url, f"batch_{file_id}",
+                                   [(file_id, file_name, size)])
 
-                if size - end < 0:
-                    end = size
+        commit_res = self._request(
+            "POST",
+            url=commit_url,
+            headers=commit_headers,
+            data=commit_body
+        )
 
-                headers = dict(self._headers_auth)
-                headers['Content-Disposition'] = (
-                    "attachment; filename*=utf-8''" +
-                    self._escapeURL(file_name)
+        return commit_res
+
+    def _commit_files(self, transaction_id, results):
+        """
+        Commits a transaction holding several uploaded files.
+        """
+        commit_url = f"{self._base_url}/vault/odata/vault.CommitTransaction"
+
+        boundary = f"batch_{uuid.uuid4().hex}"
+
+        commit_headers = {
+            "Content-Type": f"multipart/mixed; boundary={boundary}",
+            "transactionid": f"{transaction_id}"
+        }
+
+        commit_body = _commit_body(self._base_url, boundary, [
+            (result.file_id, os.path.basename(result.file_path), result.size)
+            for result in results
+        ])
+
+        return self._request(
+            "POST",
+            url=commit_url,
+            headers=commit_headers,
+            data=commit_body
+        )
+
+
+class FilesAPI(_FileMethods, CommonAPI):
+    """
+    Class to handle methods pertaining to files.
+    """
+    UPLOAD_WORKERS = 4
+    DOWNLOAD_WORKERS = 4
+    RANGE_SIZE = 8 * 1024 * 1024
+    # bytes handed from the socket to the destination per write
+    BLOCK_SIZE = 64 * 1024
+    # files committed per vault transaction by sync_directory
+    SYNC_BATCH = 100
+
+    def sync_directory(self, directory, manifest, workers=None,
+                       chunk_size=None, batch_size=None, stats=None):
+        """
+        Mirrors a local directory tree into the vault, uploading only files
+        that are new or changed since the last sync.
+
+        The tree is scanned once. Files whose size and modification time
+        match the manifest are skipped without being read; the others are
+        hashed in parallel and uploaded unless their digest matches. Changed
+        files are sent with upload_files in batches of batch_size files per
+        transaction, and the manifest is saved after every batch so an
+        interrupted sync does not repeat finished batches.
+
+        Parameters
+        ----------
+        directory: str
+            root of the tree to mirror.
+
+        manifest: SyncManifest
+            record of the previous syncs of this directory, updated in
+            place.
+
+        workers: int
+            number of files hashed and chunk requests in flight at once,
+            defaults to UPLOAD_WORKERS.
+
+        chunk_size: int or AdaptiveChunkSize
+            bytes sent per chunk request, defaults to CHUNK_SIZE.
+
+        batch_size: int
+            files per vault transaction, defaults to SYNC_BATCH.
+
+        stats: TransferStats
+            optional object filled with the size and chunks of the uploaded
+            files, the retries and the hash, transaction, chunks and commit
+            phases of the whole sync.
+
+        Returns
+        -------
+        SyncResult
+            the uploaded, unchanged and removed files. Each upload uses the
+            file's path relative to directory as its file number.
+        """
+        if not isinstance(directory, str) or not os.path.isdir(directory):
+            raise ValueError(
+                "directory must be the path of an existing directory."
+            )
+
+        if not isinstance(manifest, SyncManifest):
+            raise ValueError(
+                "manifest must be a SyncManifest."
+            )
+
+        if batch_size is None:
+            batch_size = self.SYNC_BATCH
+
+        if not isinstance(batch_size, int) or batch_size < 1:
+            raise ValueError(
+                "batch_size must be a positive integer."
+            )
+
+        workers, chunk_size = self._upload_options(workers, chunk_size)
+
+        if stats is not None:
+            stats.start()
+
+        try:
+            return self._sync(directory, manifest, workers, chunk_size,
+                              batch_size, stats)
+        finally:
+            if stats is not None:
+                stats.finish()
+
+    def _sync(self, directory, manifest, workers, chunk_size, batch_size,
+              stats):
+        """
+        Mirrors a directory with validated options, see sync_directory.
+        """
+        exclude = [manifest.path] if manifest.path is not None else []
+        files = scan_tree(directory, exclude)
+        result = SyncResult()
+
+        for relative_path in manifest.paths():
+            if relative_path not in files:
+                manifest.discard(relative_path)
+                result.removed.append(relative_path)
+
+        changed = []
+
+        for relative_path, (size, mtime_ns) in sorted(files.items()):
+            entry = manifest.get(relative_path)
+
+            if (entry is not None and entry['size'] == size
+                    and entry['mtime_ns'] == mtime_ns):
+                result.unchanged.append(relative_path)
+            else:
+                changed.append(relative_path)
+
+        def local_path(relative_path):
+            return os.path.join(directory, *relative_path.split('/'))
+
+        with measure(stats, "hash"):
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                digests = list(pool.map(
+                    lambda relative_path: file_digests(
+                        local_path(relative_path)
+                    )[0],
+                    changed
+                ))
+
+        pending = []
+
+        for relative_path, sha256 in zip(changed, digests):
+            entry = manifest.get(relative_path)
+            size, mtime_ns = files[relative_path]
+
+            if entry is not None and entry['sha256'] == sha256:
+                # touched but identical, only the timestamp is new
+                manifest.set(relative_path, size, mtime_ns, sha256,
+                             entry['file_id'])
+                result.unchanged.append(relative_path)
+            else:
+                pending.append((relative_path, sha256))
+
+        for first in range(0, len(pending), batch_size):
+            batch = pending[first:first + batch_size]
+
+            uploads = [
+                UploadResult(local_path(relative_path), relative_path)
+                for relative_path, _ in batch
+            ]
+            self._upload_batch(uploads, workers, chunk_size, stats)
+
+            for upload, (relative_path, sha256) in zip(uploads, batch):
+                if upload.ok:
+                    size, mtime_ns = files[relative_path]
+                    manifest.set(relative_path, size, mtime_ns, sha256,
+                                 upload.file_id)
+
+            result.uploaded.extend(uploads)
+
+            manifest.save()
+
+        if not pending:
+            manifest.save()
+
+        return result
+
+    def download_file(self, file_id, destination, workers=None,
+                      range_size=None, verify=True, stats=None):
+        """
+        Downloads the content of a File from the vault.
+
+        Content is streamed in blocks, so memory use does not depend on the
+        file size. Files larger than range_size that are written to a path
+        are fetched as parallel byte ranges. The result is checked against
+        the file_size of the File item and, when verify is set and the
+        server reports one, its MD5 checksum. A path destination is written
+        to a private .part file that is renamed once the content is
+        verified. In a directory the File is saved under the last component
+        of its filename, never outside the directory.
+
+        Parameters
+        ----------
+        file_id: str
+            ID number of the file in Aras.
+
+        destination: str or file-like
+            a directory, in which case the File's filename is used, a file
+            path, or a writable binary file object.
+
+        workers: int
+            number of ranges fetched at once, defaults to DOWNLOAD_WORKERS.
+
+        range_size: int
+            bytes per range request, defaults to RANGE_SIZE.
+
+        verify: bool
+            compare the MD5 checksum of the content with the File item.
+
+        stats: TransferStats
+            optional object filled with the duration of every range, the
+            retries and the metadata, content and verify phases.
+
+        Returns
+        -------
+        str or file-like
+            the path written to, or the given file object.
+        """
+        if not isinstance(file_id, str):
+            raise ValueError(
+                "file_id must be a string."
+            )
+
+        workers, range_size = self._download_options(workers, range_size)
+
+        if stats is not None:
+            stats.start()
+
+        try:
+            return self._download(file_id, destination, workers, range_size,
+                                  verify, stats)
+        finally:
+            if stats is not None:
+                stats.finish()
+
+    def download_files(self, file_ids, directory, workers=None,
+                       range_size=None, verify=True, stats=None):
+        """
+        Downloads many Files into a directory with a pool of workers.
+
+        Parameters
+        ----------
+        file_ids: iterable of str
+            ids of the files to download.
+
+        directory: str
+            existing directory, each File is saved under its filename.
+            Files sharing a filename are numbered like "name (2).ext" in
+            the order given; a repeated id is downloaded once.
+
+        workers: int
+            number of requests in flight at once across all files, defaults
+            to DOWNLOAD_WORKERS. Spare workers fetch ranges of large files
+            in parallel.
+
+        range_size, verify:
+            passed to download_file.
+
+        stats: TransferStats
+            optional object filled with the size and ranges of all files,
+            the retries and the metadata, content and verify phases.
+
+        Returns
+        -------
+        list of DownloadResult
+            one result per id, in the order given.
+        """
+        if not isinstance(directory, str) or not os.path.isdir(directory):
+            raise ValueError(
+                "directory must be the path of an existing directory."
+            )
+
+        results = []
+        downloads = {}
+
+        for file_id in file_ids:
+            if not isinstance(file_id, str):
+                raise ValueError(
+                    "file_id must be a string."
                 )
-                headers['Content-Range'] = (
-                    "bytes " + str(start) + "-" + str((end - 1)) + "/"
-                    + str(size)
+
+            # a repeated id is downloaded once and shares its result
+            if file_id not in downloads:
+                downloads[file_id] = DownloadResult(file_id)
+
+            results.append(downloads[file_id])
+
+        workers, range_size = self._download_options(workers, range_size)
+
+        if not results:
+            return results
+
+        if stats is not None:
+            stats.start()
+
+        try:
+            self._download_batch(list(downloads.values()), directory,
+                                 workers, range_size, verify, stats)
+        finally:
+            if stats is not None:
+                stats.finish()
+
+        return results
+
+    def _download_batch(self, pending, directory, workers, range_size,
+                        verify, stats):
+        """
+        Downloads the Files of the DownloadResults in pending with
+        validated options, see download_files. The outcome is stored on
+        each result.
+        """
+        records = {}
+        paths = {}
+        range_workers = max(1, workers // len(pending))
+
+        def lookup(result):
+            try:
+                records[result.file_id] = self._file_record(result.file_id)
+            except Exception as error:
+                # reported per file, the other downloads continue
+                result.error = error
+
+        def fetch(result):
+            if result.error is not None:
+                return
+
+            try:
+                result.path = self._download(
+                    result.file_id, paths[result.file_id], range_workers,
+                    range_size, verify, stats, records[result.file_id]
                 )
-                headers['Content-Type'] = "application/octet-stream"
-                headers['transactionid'] = transaction_id
+            except Exception as error:
+                result.error = error
+
+        with ThreadPoolExecutor(
+                max_workers=min(workers, len(pending))) as pool:
+            with measure(stats, "metadata"):
+                list(pool.map(lookup, pending))
+
+            # Files sharing a filename are saved under numbered names, in
+            # the order of their ids, instead of overwriting each other.
+            taken = set()
+
+            for result in pending:
+                if result.error is not None:
+                    continue
+
+                try:
+                    name = _local_name(records[result.file_id])
+                except ValueError as error:
+                    result.error = error
+                    continue
+
+                paths[result.file_id] = os.path.join(
+                    directory, _unique_name(name, taken)
+                )
+
+            list(pool.map(fetch, pending))
+
+    def _file_record(self, file_id):
+        """
+        Returns the File item of a download, raising ValueError if it does
+        not exist.
+        """
+        record = self.search_file_id(file_id)
+
+        if record.get('id') != file_id:
+            raise ValueError(
+                f"File {file_id} was not found."
+            )
+
+        return record
+
+    def _download(self, file_id, destination, workers, range_size, verify,
+                  stats, record=None):
+        """
+        Downloads a File with validated options, see download_file. The
+        File item is looked up unless given as record.
+        """
+        if record is None:
+            with measure(stats, "metadata"):
+                record = self._file_record(file_id)
+
+        size = int(record['file_size'])
+        checksum = record.get('checksum') if verify else None
+
+        if stats is not None:
+            stats.add_size(size)
 
-                upload_url = (
-                    f"{self._base_url}/vault/odata/vault."
-                    f"UploadFile?fileId={file_id}"
+        if not isinstance(destination, str):
+            with measure(stats, "content"):
+                written, md5 = self._download_content(
+                    file_id, destination, size, 1, range_size, None,
+                    checksum is not None, stats
                 )
-                chunk = f.read(CHUNK_SIZE)
-                response = requests.post(
-                    url=upload_url,
-                    headers=headers,
-                    data=chunk
+            _verify_download(file_id, size, written, checksum, md5)
+
+            return destination
+
+        if os.path.isdir(destination):
+            destination = os.path.join(destination, _local_name(record))
+
+        # a private partial file per download, so concurrent downloads to
+        # the same destination never write into each other's content
+        part_path = f"{destination}.{uuid.uuid4().hex}.part"
+        part = open(part_path, 'xb')
+
+        try:
+            with part, measure(stats, "content"):
+                written, md5 = self._download_content(
+                    file_id, part, size, workers, range_size, part_path,
+                    checksum is not None, stats
                 )
 
-                results.append(response)
-                start += CHUNK_SIZE
+            with measure(stats, "verify"):
+                if checksum is not None and md5 is None:
+                    md5 = file_digests(part_path)[1]
 
-        return results
+                _verify_download(file_id, size, written, checksum, md5)
+
+            os.replace(part_path, destination)
+        except BaseException:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+            raise
 
-    def _commit_file_transaction(self, file_path, transaction_id,
-                                 file_id, file_name):
+        return destination
+
+    def _download_options(self, workers, range_size):
         """
-        Commits the final transaction after all of the file chunks have been
-        uploaded.
+        Applies the defaults to and validates the worker count and range
+        size of a download.
         """
-        commit_url = f"{self._base_url}/vault/odata/vault.CommitTransaction"
+        if workers is None:
+            workers = self.DOWNLOAD_WORKERS
 
-        commit_headers = {
-            "Authorization": self._headers_auth['Authorization'],
-            "Content-Type": f"multipart/mixed; boundary=batch_{file_id}",
-            "transactionid": f"{transaction_id}"
+        if range_size is None:
+            range_size = self.RANGE_SIZE
+
+        if not isinstance(workers, int) or workers < 1:
+            raise ValueError(
+                "workers must be a positive integer."
+            )
+
+        if not isinstance(range_size, int) or range_size < 1:
+            raise ValueError(
+                "range_size must be a positive integer."
+            )
+
+        return workers, range_size
+
+    def _upload_options(self, workers, chunk_size):
+        """
+        Applies the defaults to and validates the worker count and chunk
+        size of an upload.
+        """
+        return _upload_options(workers, chunk_size, self.UPLOAD_WORKERS,
+                               self.CHUNK_SIZE)
+
+    def _send_source_chunks(self, source, transaction_id, file_id,
+                            file_name, chunk_size, workers, stats, done,
+                            on_chunk):
+        """
+        Sends the chunks of an opened UploadSource, see _send_file_chunks.
+        """
+        size = source.size
+
+        if done and not source.random_access:
+            raise ValueError(
+                "Only random access sources can skip acknowledged ranges."
+            )
+
+        upload_url = (
+            f"{self._base_url}/vault/odata/vault."
+            f"UploadFile?fileId={file_id}"
+        )
+
+        upload_headers = {
+            'Content-Disposition': (
+                "attachment; filename*=utf-8''" + self._escapeURL(file_name)
+            ),
+            'Content-Type': "application/octet-stream",
+            'transactionid': transaction_id
         }
 
-        EOL = "\r\n"
+        adaptive = isinstance(chunk_size, AdaptiveChunkSize)
+        gaps = missing_ranges(done, size)
+        on_retry = stats.record_retry if stats is not None else None
+        claim_lock = threading.Lock()
+        failed = threading.Event()
 
-        size = os.path.getsize(file_path)
+        def next_range():
+            with claim_lock:
+                while gaps and gaps[0][0] >= gaps[0][1]:
+                    gaps.pop(0)
 
-        commit_body = "--"
-        commit_body += f"batch_{file_id}"
-        commit_body += EOL
-        commit_body += "Content-Type: application/http"
-        commit_body += EOL
-        commit_body += EOL
-        commit_body += "POST " + self._base_url + "/Server/odata/File HTTP/1.1"
-        commit_body += EOL
-        commit_body += "Content-Type: application/json"
-        commit_body += EOL
-        commit_body += EOL
-        commit_body += '{"id":"' + file_id + '",'
-        commit_body += '"filename":"' + file_name + '",'
-        commit_body += '"file_size":' + str(size) + ','
-        commit_body += ('"Located":[{"file_version":1,'
-                        '"related_id":"67BBB9204FE84A8981ED8313049BA06C"}]}'
-                        )
-        commit_body += EOL
-        commit_body += "--" + f"batch_{file_id}" + "--"
-
-        commit_res = requests.post(
-            url=commit_url,
-            headers=commit_headers,
-            data=commit_body
+                if not gaps:
+                    return None
+
+                start, end = gaps[0]
+
+                length = chunk_size.size if adaptive else chunk_size
+                length = min(length, end - start)
+                gaps[0][0] = start + length
+
+                # sequential sources are read while holding the claim, so
+                # chunks leave the source in order
+                return start, length, source.chunk(start, length)
+
+        def worker():
+            # one dict per worker, sent as is with every chunk: only
+            # Content-Range and the Authorization set by _send change
+            headers = dict(upload_headers)
+
+            while not failed.is_set():
+                try:
+                    claim = next_range()
+                except BaseException:
+                    failed.set()
+                    raise
+
+                if claim is None:
+                    return
+
+                start, length, chunk = claim
+
+                headers['Content-Range'] = (
+                    f"bytes {start}-{start + length - 1}/{size}"
+                )
+
+                sent = time.perf_counter()
+
+                try:
+                    response = self._request(
+                        "POST",
+                        url=upload_url,
+                        headers=headers,
+                        data=chunk,
+                        idempotent=True,
+                        on_retry=on_retry
+                    )
+                except BaseException:
+                    failed.set()
+
+                    if adaptive:
+                        chunk_size.record_failure()
+
+                    raise
+                finally:
+                    # Lets the mapping close even if the response keeps a
+                    # reference to its request body.
+                    if isinstance(chunk, memoryview):
+                        chunk.release()
+
+                seconds = time.perf_counter() - sent
+
+                if response.status_code != 200:
+                    failed.set()
+
+                    if adaptive:
+                        chunk_size.record_failure()
+
+                    raise ValueError(
+                        "Chunk Verification Failed. Data may be corrupted."
+                    )
+
+                if adaptive:
+                    chunk_size.record(length, seconds)
+
+                if stats is not None:
+                    stats.record_chunk(start, length, seconds)
+
+                if on_chunk is not None:
+                    on_chunk(start, length)
+
+        remaining = sum(end - start for start, end in gaps)
+        first_size = chunk_size.size if adaptive else chunk_size
+        worker_count = max(1, min(workers, -(-remaining // first_size)))
+
+        if stats is not None:
+            stats.add_size(size)
+
+        with measure(stats, "chunks"):
+            if worker_count == 1:
+                worker()
+            else:
+                with ThreadPoolExecutor(max_workers=worker_count) as pool:
+                    futures = [
+                        pool.submit(worker) for _ in range(worker_count)
+                    ]
+
+                for future in futures:
+                    future.result()
+
+    def _download_content(self, file_id, f, size, workers, range_size,
+                          path, want_md5, stats=None):
+        """
+        Streams the content of a File into f and returns the number of
+        bytes written with the MD5 hex digest, or None for the digest when
+        it was not computed on the fly.
+
+        The first range is requested on its own. A server that ignores
+        Range answers it with the whole file, which is then simply streamed.
+        Otherwise the remaining ranges follow in order, or in parallel
+        through separate handles on path when one is given.
+        """
+        url = f"{self._base_url}/server/odata/File('{file_id}')/$value"
+
+        md5 = hashlib.md5() if want_md5 else None
+
+        headers = None
+
+        if size:
+            headers = {"Range": f"bytes=0-{min(size, range_size) - 1}"}
+
+        written, partial = self._download_range(url, headers, f, md5,
+                                                stats=stats)
+
+        if not partial:
+            return written, md5.hexdigest() if md5 is not None else None
+
+        ranges = [
+            (start, min(start + range_size, size))
+            for start in range(written, size, range_size)
+        ]
+
+        if path is None or workers == 1 or len(ranges) < 2:
+            for start, end in ranges:
+                written += self._download_range(
+                    url, {"Range": f"bytes={start}-{end - 1}"}, f, md5,
+                    end - start, stats, start
+                )[0]
+
+            return written, md5.hexdigest() if md5 is not None else None
+
+        # the workers write through their own handles
+        f.truncate(size)
+        f.flush()
+
+        claimed = iter(ranges)
+        claim_lock = threading.Lock()
+        failed = threading.Event()
+        counts = []
+
+        def worker():
+            with open(path, 'r+b') as handle:
+                while not failed.is_set():
+                    with claim_lock:
+                        claim = next(claimed, None)
+
+                    if claim is None:
+                        return
+
+                    start, end = claim
+                    handle.seek(start)
+
+                    try:
+                        counts.append(self._download_range(
+                            url, {"Range": f"bytes={start}-{end - 1}"},
+                            handle, None, end - start, stats, start
+                        )[0])
+                    except BaseException:
+                        failed.set()
+                        raise
+
+        with ThreadPoolExecutor(
+                max_workers=min(workers, len(ranges))) as pool:
+            futures = [
+                pool.submit(worker) for _ in range(min(workers, len(ranges)))
+            ]
+
+        for future in futures:
+            future.result()
+
+        return written + sum(counts), None
+
+    def _download_range(self, url, headers, f, md5, expected=None,
+                        stats=None, start=0):
+        """
+        GETs url with the given headers and streams the body into f. Returns
+        the bytes written and whether the server answered with a partial
+        response. expected is the length a range response must have; the
+        range is recorded on stats at offset start.
+        """
+        began = time.perf_counter()
+
+        response = self._request(
+            "GET",
+            url=url,
+            headers=headers,
+            stream=True,
+            on_retry=stats.record_retry if stats is not None else None
         )
 
-        return commit_res
+        try:
+            if response.status_code not in (200, 206):
+                raise ValueError(
+                    f"Download failed with status {response.status_code}."
+                )
+
+            if expected is not None and response.status_code != 206:
+                raise ValueError(
+                    "The vault stopped honoring range requests."
+                )
+
+            written = 0
+
+            for block in response.iter_content(self.BLOCK_SIZE):
+                f.write(block)
+                written += len(block)
+
+                if md5 is not None:
+                    md5.update(block)
+        finally:
+            response.close()
+
+        if expected is not None and written != expected:
+            raise ValueError(
+                f"Range returned {written} bytes instead of {expected}."
+            )
+
+        if stats is not None:
+            stats.record_chunk(start, written, time.perf_counter() - began)
+
+        return written, response.status_code == 206
 
     def _escapeURL(self, url):
         """
         Parses a url for request functionality.
         """
-        url = '%25'.join(url.split('%'))
-        url = '%20'.join(url.split(' '))
-        url = '%27'.join(url.split("'"))
-        url = '%21'.join(url.split('!'))
-        url = '%22'.join(url.split('"'))
-        url = '%23'.join(url.split('#'))
-        url = '%24'.join(url.split('$'))
-        url = '%26'.join(url.split('&'))
-        url = '%28'.join(url.split('('))
-        url = '%29'.join(url.split(')'))
-        url = '%2A'.join(url.split('*'))
-        url = '%2B'.join(url.split('+'))
-        url = '%3F'.join(url.split('?'))
-
-        return url
+        return _escape_url(url)
@@ -0,0 +1,49 @@
+import json
+import os
+import tempfile
+
+
+def load_json(path):
+    """
+    Read a JSON object from path, ignoring a missing or corrupt file.
+
+    Returns
+    -------
+    dict
+        The object, or an empty dict if the file holds none.
+    """
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    return data if isinstance(data, dict) else {}
+
+
+def save_json(path, data):
+    """
+    Atomically write a JSON object to path with owner-only permissions.
+
+    The object is written to a uniquely named file next to path, which then
+    replaces path, so readers never see a partial file and concurrent
+    writers never share a temporary file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    # mkstemp creates the file readable by the owner only
+    fd, temp_path = tempfile.mkstemp(
+        prefix=f"{os.path.basename(path)}.", suffix='.tmp', dir=directory
+    )
+
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+        raise
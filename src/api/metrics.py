@@ -0,0 +1,78 @@
+import threading
+
+
+class RequestMetrics:
+    """
+    Counts the requests sent through one connection. An ArasClient and all
+    of its views share a single instance.
+
+    Attributes
+    ----------
+    requests : int
+        Attempts sent to the server, retries included.
+    retries : int
+        Attempts repeated after a connection error or retryable status.
+    reauthentications : int
+        Requests repeated with a new token after a 401.
+    errors : int
+        Attempts that raised instead of receiving a response.
+    statuses : dict
+        Number of responses per status code.
+    """
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.reauthentications = 0
+        self.errors = 0
+        self.statuses = {}
+
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return (
+            f"<RequestMetrics requests={self.requests} "
+            f"retries={self.retries} errors={self.errors}>"
+        )
+
+    def record_response(self, status_code):
+        """
+        Record an attempt answered with status_code.
+        """
+        with self._lock:
+            self.requests += 1
+            self.statuses[status_code] = self.statuses.get(status_code, 0) + 1
+
+    def record_error(self):
+        """
+        Record an attempt that raised, e.g. on a connection error.
+        """
+        with self._lock:
+            self.requests += 1
+            self.errors += 1
+
+    def record_retry(self):
+        """
+        Record that a request is about to be repeated.
+        """
+        with self._lock:
+            self.retries += 1
+
+    def record_reauthentication(self):
+        """
+        Record that a request is repeated after a 401.
+        """
+        with self._lock:
+            self.reauthentications += 1
+
+    def snapshot(self):
+        """
+        Return a consistent copy of the counters as a dict.
+        """
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'reauthentications': self.reauthentications,
+                'errors': self.errors,
+                'statuses': dict(self.statuses)
+            }
@@ -1,12 +1,79 @@
-from .common import CommonAPI
+from .common import CommonAPI, _steps
+from .whereused import WhereUsedIndex
+from concurrent.futures import ThreadPoolExecutor
+import collections
+import itertools
 import json
-import requests
+import re
+
+
+# Part properties accepted by create_part and update_part, built once
+PART_UPDATE_KEYS = frozenset([
+    'classification',
+    'created_on',
+    'description',
+    'external_owner',
+    'generation',
+    'keyed_name',
+    'name',
+    'state',
+    'unit',
+    'item_number',
+    'itemtype',
+    'quantity'
+])
+PART_CREATE_KEYS = PART_UPDATE_KEYS | {'related_id'}
+
+# Key of the entity url in an OData-EntityId or Location header
+_ENTITY_KEY = re.compile(r"\('((?:[^']|'')*)'\)$")
+
+
+class PartResult:
+    """
+    Outcome of one record of PartsAPI.create_parts.
+
+    Attributes
+    ----------
+    index : int
+        Position of the record in the input.
+    metadata : dict
+        The record.
+    id : str or None
+        Id of the created Part, None unless the part was created.
+    status_code : int or None
+        Status of the create operation, None if no answer was received.
+    error : Exception or None
+        Why the part was not created, or why its outcome is unknown.
+    """
+    def __init__(self, index, metadata):
+        self.index = index
+        self.metadata = metadata
+        self.id = None
+        self.status_code = None
+        self.error = None
+
+    def __repr__(self):
+        state = self.id if self.ok else f"error={self.error!r}"
 
+        return f"<PartResult {self.index} {state}>"
+
+    @property
+    def ok(self):
+        """
+        True if the server answered that the part was created and named
+        its id.
+        """
+        return (self.error is None and self.status_code is not None
+                and self.id is not None)
 
-class PartsAPI(CommonAPI):
+
+class _PartMethods:
     """
-    Class to handle functions pertaining to parts located in Aras.
+    Part methods shared by PartsAPI and AsyncPartsAPI, see
+    airworthiness._AirworthinessMethods.
     """
+    # get_assembly requests in flight at once in get_product_structure
+    STRUCTURE_WORKERS = 8
 
     def get_parts_list(self):
         """
@@ -14,12 +81,31 @@ class PartsAPI(CommonAPI):
         """
         query_url = f"{self._base_url}/server/odata/Part"
 
-        query_response = requests.get(
-            url=query_url,
-            headers=self._headers_auth
-        )
+        return self._request_json("GET", url=query_url)
 
-        return query_response.json()
+    def iter_parts(self, page_size=1000, stream=False):
+        """
+        Yield every Part item in Aras as a dict, ordered by id.
+
+        Unlike get_parts_list, which returns the whole Part table in one
+        response, parts are fetched page_size at a time and yielded as each
+        page arrives, so catalogues of any size are walked in constant
+        memory.
+
+        Parameters
+        ----------
+        page_size: int
+            number of records requested per round trip.
+
+        stream: bool
+            decode each page incrementally while it downloads, yielding
+            records before the whole page has arrived. Blocking API only.
+        """
+        return self._iter_items(
+            "Part",
+            page_size=page_size,
+            stream=stream
+        )
 
     def search_part_number(self, part_number):
         """
@@ -34,17 +120,7 @@ class PartsAPI(CommonAPI):
         if not isinstance(part_number, str):
             raise ValueError("Part Number must be formatted as a string.")
 
-        query_url = (
-            f"{self._base_url}/server/odata/Part?$"
-            f"filter=item_number eq {part_number}"
-        )
-
-        query_response = requests.get(
-            url=query_url,
-            headers=self._headers_auth
-        )
-
-        return query_response.json()
+        return self.query("Part").filter(item_number=part_number).get()
 
     def search_part_name(self, part_name):
         """
@@ -52,24 +128,14 @@ class PartsAPI(CommonAPI):
 
         Parameters
         ----------
-        part_number: str
-            manufacturer's part number
+        part_name: str
+            name of the part
         """
         # checks if part number is valid
         if not isinstance(part_name, str):
             raise ValueError("Part Name must be formatted as a string.")
 
-        query_url = (
-            f"{self._base_url}/server/odata/Part?$"
-            f"filter=name eq {part_name}"
-        )
-
-        query_response = requests.get(
-            url=query_url,
-            headers=self._headers_auth
-        )
-
-        return query_response.json()
+        return self.query("Part").filter(name=part_name).get()
 
     def search_part_type(self, part_type):
         """
@@ -87,17 +153,7 @@ class PartsAPI(CommonAPI):
                 "Part must be structured as a string."
             )
 
-        query_url = (
-            f"{self._base_url}/server/odata/Part?"
-            f"$filter=description eq {part_type}"
-        )
-
-        query_response = requests.get(
-            url=query_url,
-            headers=self._headers_auth
-        )
-
-        return query_response.json()
+        return self.query("Part").filter(description=part_type).get()
 
     def search_part_id(self, part_id):
         """
@@ -116,12 +172,7 @@ class PartsAPI(CommonAPI):
 
         query_url = f"{self._base_url}/server/odata/Part('{part_id}')"
 
-        query_response = requests.get(
-            url=query_url,
-            headers=self._headers_auth
-        )
-
-        return query_response.json()
+        return self._get_json(query_url, tags=[("Part", part_id)])
 
     def create_part(self, metadata):
         """
@@ -139,41 +190,18 @@ class PartsAPI(CommonAPI):
                 "Metadata must be structured as a key:value pair dictionary."
             )
 
-        valid_keys = [
-            'classification',
-            'created_on',
-            'description',
-            'external_owner',
-            'generation',
-            'keyed_name',
-            'name',
-            'state',
-            'unit',
-            'item_number',
-            'itemtype',
-            'quantity',
-            'related_id'
-        ]
-
-        for key in metadata:
-            if key not in valid_keys:
-                raise RuntimeError(
-                    "Invalid Metadata entry. Valid keys are 'description,"
-                    "'name, 'keyed_name', 'state', 'unit', 'item_number'"
-                )
+        _check_part_keys(metadata, PART_CREATE_KEYS)
 
         query_url = f"{self._base_url}/server/odata/Part"
 
         converted_metadata = json.dumps(metadata)
 
-        query_response = requests.post(
+        return self._request_json(
+            "POST",
             url=query_url,
-            headers=self._headers_auth,
             data=converted_metadata
         )
 
-        return query_response.json()
-
     def update_part(self, part_id, metadata):
         """
         Updates metadata for an existing part in the database.
@@ -199,40 +227,19 @@ class PartsAPI(CommonAPI):
                 'metadata must be structured as a key:value pair dictionary'
             )
 
-        valid_keys = [
-            'classification',
-            'created_on',
-            'description',
-            'external_owner',
-            'generation',
-            'keyed_name',
-            'name',
-            'state',
-            'unit',
-            'item_number',
-            'itemtype',
-            'quantity'
-        ]
-
-        for key in metadata:
-            if key not in valid_keys:
-                raise RuntimeError(
-                    "Invalid Metadata entry. Valid keys are 'description,"
-                    "'name, 'keyed_name', 'state', 'unit', 'item_number'"
-                )
+        _check_part_keys(metadata, PART_UPDATE_KEYS)
 
         query_url = f"{self._base_url}/server/odata/Part('{part_id}')"
 
         converted_metadata = json.dumps(metadata)
 
-        query_response = requests.patch(
+        return self._request_json(
+            "PATCH",
             url=query_url,
-            headers=self._headers_auth,
-            data=converted_metadata
+            data=converted_metadata,
+            invalidate=("Part", part_id)
         )
 
-        return query_response.json()
-
     def delete_part(self, part_id):
         """
         Deletes a part from the database.
@@ -253,12 +260,7 @@ class PartsAPI(CommonAPI):
         # create the query structure
         query_url = f"{self._base_url}/server/odata/Part('{part_id}')"
 
-        query_response = requests.delete(
-            url=query_url,
-            headers=self._headers_auth
-        )
-
-        return query_response
+        return self._delete_item(query_url, "Part", part_id)
 
     def get_assembly(self, part_id):
         """
@@ -277,47 +279,91 @@ class PartsAPI(CommonAPI):
                 "part_id must be a string"
             )
 
-        # constructs the query
-        query_url = (
-            f"{self._base_url}/server/odata/Part('{part_id}')"
-            "/Part BOM?$expand=related_id"
-        )
+        query = self.query(f"Part('{part_id}')/Part BOM").expand("related_id")
 
-        query_response = requests.get(
-            url=query_url,
-            headers=self._headers_auth
+        # the expanded children are tagged as well, so editing a child also
+        # drops the cached assembly
+        return self._get_json(
+            query.url(self._base_url),
+            tags=[("Part", part_id)],
+            tags_from=_bom_child_tags
         )
 
-        return query_response.json()
+    @_steps
+    def get_product_structure(self, part_id, max_depth=None, workers=None):
+        """
+        Return the product structure below a part.
 
-    def _recurse_product_structure(self, parent_id, assembly_dict):
-        """Recursively use get_assembly to get a product structure."""
-        children = assembly_dict['value']
+        The BOM is read level by level: all parts first seen on one level
+        have their get_assembly requests sent concurrently before the next
+        level starts. Every part is fetched once, however many assemblies
+        use it, and the walk is iterative, so deep or cyclic structures are
+        safe.
 
-        for child in children:
-            child_id = child['related_id']['id']
-            self.product_structure[parent_id]['children'].append(child_id)
+        Parameters
+        ----------
+        part_id: str
+            id of the top level part.
+
+        max_depth: int or None
+            number of BOM levels to read below the part, all levels if None.
+
+        workers: int
+            number of get_assembly requests in flight at once, defaults to
+            STRUCTURE_WORKERS.
+
+        Returns
+        -------
+        dict
+            maps the id of every part in the structure to a dict with
+
+            - 'depth': shallowest level of the part, 0 for part_id,
+            - 'parents': ids of the assemblies using the part,
+            - 'children': ids of its BOM children, in BOM order,
+            - 'bom': its Part BOM rows with the child Part expanded as
+              related_id, or None if the part is below max_depth.
+        """
+        if not isinstance(part_id, str):
+            raise ValueError(
+                "part_id must be a string"
+            )
 
-            self.product_structure[child_id] = {
-                'parent': parent_id,
-                'children': []
-            }
-            child_assembly_level = self.get_assembly(
-                part_id=child_id,
-                authorization=self._authorization
+        if max_depth is not None and (
+                not isinstance(max_depth, int) or max_depth < 0):
+            raise ValueError(
+                "max_depth must be a non-negative integer or None."
             )
-            self._recurse_product_structure(
-                parent_id=child_id,
-                assembly_dict=child_assembly_level
+
+        if workers is None:
+            workers = self.STRUCTURE_WORKERS
+
+        if not isinstance(workers, int) or workers < 1:
+            raise ValueError(
+                "workers must be a positive integer."
             )
 
+        structure = {part_id: _structure_node(0)}
+        level = [part_id]
+        depth = 0
+
+        while level and (max_depth is None or depth < max_depth):
+            assemblies = yield self._map(self.get_assembly, level, workers)
+            level = _add_structure_level(structure, zip(level, assemblies),
+                                         depth)
+            depth += 1
+
+        return structure
+
     def create_assembly(self, item_number, assembly_name, metadata):
         """
         Creates an assembly, including the parent assembly and child parts.
 
         Parameters
         ----------
-        parent_part: str
+        item_number: str
+            the item number of the parent part.
+
+        assembly_name: str
             the name of the parent part.
 
         metadata: list
@@ -353,14 +399,12 @@ class PartsAPI(CommonAPI):
 
         converted_metadata = json.dumps(query_body)
 
-        query_response = requests.post(
+        return self._request_json(
+            "POST",
             url=query_url,
-            headers=self._headers_auth,
             data=converted_metadata
         )
 
-        return query_response.json()
-
     def link_child_part(self, assembly_id, child_part):
         """
         Adds children parts onto an existing assembly.
@@ -370,7 +414,7 @@ class PartsAPI(CommonAPI):
         assembly_id: str
             The ID number of the assembly being updated.
 
-        child_parts: list
+        child_part: str
             ID Number of the existing part being attached to the parent.
         """
         if not isinstance(assembly_id, str):
@@ -388,14 +432,13 @@ class PartsAPI(CommonAPI):
 
         converted_metadata = json.dumps(child_request)
 
-        query_response = requests.post(
+        return self._request_json(
+            "POST",
             url=query_url,
-            headers=self._headers_auth,
-            data=converted_metadata
+            data=converted_metadata,
+            invalidate=("Part", assembly_id)
         )
 
-        return query_response.json()
-
     def search_linked_CAD_files(self, part_id):
         """
         Searches a part for CAD documents attached to the part.
@@ -410,17 +453,9 @@ class PartsAPI(CommonAPI):
                 "part_id must be formatted as a string"
             )
 
-        query_url = (
-            f"{self._base_url}/server/odata/Part('{part_id}')"
-            "/Part CAD?$expand=related_id"
-        )
-
-        query_response = requests.get(
-            url=query_url,
-            headers=self._headers_auth
-        )
+        query = self.query(f"Part('{part_id}')/Part CAD")
 
-        return query_response.json()
+        return query.expand("related_id").get()
 
     def link_CAD_document(self, part_id, CAD_id):
         """
@@ -431,8 +466,8 @@ class PartsAPI(CommonAPI):
         part_id: str
             the ID number of the parent part CAD is being attached to.
 
-        CAD_number: str
-            the filename of the CAD file being linked.
+        CAD_id: str
+            the ID number of the CAD document being linked.
         """
         if not isinstance(part_id, str):
             raise ValueError(
@@ -449,15 +484,280 @@ class PartsAPI(CommonAPI):
         )
 
         metadata = {
-            'related_id@odata.bind': f"CAD('{CAD_id})"
+            'related_id@odata.bind': f"CAD('{CAD_id}')"
         }
 
         converted_metadata = json.dumps(metadata)
 
-        query_response = requests.post(
+        return self._request_json(
+            "POST",
             url=query_url,
-            headers=self._headers_auth,
-            data=converted_metadata
+            data=converted_metadata,
+            invalidate=("Part", part_id)
         )
 
-        return query_response.json()
+
+class PartsAPI(_PartMethods, CommonAPI):
+    """
+    Class to handle functions pertaining to parts located in Aras.
+    """
+    # parts per $batch request and batches in flight in create_parts
+    CREATE_BATCH = 100
+    CREATE_WORKERS = 4
+
+    def create_parts(self, records, batch_size=None, workers=None):
+        """
+        Creates many parts, yielding one PartResult per record as the
+        parts are created.
+
+        Records are validated up front; invalid ones are reported without
+        being sent. Valid records are posted in OData $batch requests of
+        batch_size parts, with up to workers batches in flight at once.
+        Results are yielded in input order and the records are consumed
+        lazily, so large catalogs can be streamed in. A failed part or
+        batch is reported on its records and the load continues. Records
+        of a batch that lost its connection are reported with the error,
+        although the server may have created them.
+
+        Parameters
+        ----------
+        records: iterable of dict
+            metadata of every part, see create_part.
+
+        batch_size: int
+            parts per $batch request, defaults to CREATE_BATCH.
+
+        workers: int
+            $batch requests in flight at once, defaults to CREATE_WORKERS.
+        """
+        if batch_size is None:
+            batch_size = self.CREATE_BATCH
+
+        if workers is None:
+            workers = self.CREATE_WORKERS
+
+        if not isinstance(batch_size, int) or batch_size < 1:
+            raise ValueError(
+                "batch_size must be a positive integer."
+            )
+
+        if not isinstance(workers, int) or workers < 1:
+            raise ValueError(
+                "workers must be a positive integer."
+            )
+
+        return self._create_parts(records, batch_size, workers)
+
+    def _create_parts(self, records, batch_size, workers):
+        """
+        Generator behind create_parts.
+        """
+        results = (
+            PartResult(index, metadata)
+            for index, metadata in enumerate(records)
+        )
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = collections.deque()
+
+            for chunk in iter(
+                    lambda: list(itertools.islice(results, batch_size)), []):
+                pending.append((chunk, pool.submit(self._post_parts, chunk)))
+
+                # keep workers batches in flight, yielding the oldest
+                while len(pending) > workers:
+                    yield from _finished_chunk(*pending.popleft())
+
+            while pending:
+                yield from _finished_chunk(*pending.popleft())
+
+    def _post_parts(self, results):
+        """
+        Validates a chunk of PartResults and creates the valid parts in one
+        $batch request, recording the outcome on each result.
+        """
+        # one request per chunk, however large its records are
+        batch = self.batch(max_operations=len(results), max_bytes=None)
+        queued = []
+
+        for result in results:
+            try:
+                if not isinstance(result.metadata, dict):
+                    raise ValueError(
+                        "Metadata must be structured as a key:value pair "
+                        "dictionary."
+                    )
+
+                _check_part_keys(result.metadata, PART_CREATE_KEYS)
+
+                # encoded here, so a record that is not JSON fails alone
+                body = json.dumps(result.metadata)
+            except (TypeError, ValueError, RuntimeError) as error:
+                result.error = error
+                continue
+
+            batch.post("Part", body)
+            queued.append(result)
+
+        if not queued:
+            return
+
+        try:
+            responses = batch.execute()
+        except Exception as error:
+            # the whole request failed, the other batches carry on
+            for result in queued:
+                result.error = error
+            return
+
+        for result, response in zip(queued, responses):
+            result.status_code = response.status_code
+
+            if response.error is not None:
+                result.error = response.error
+            elif response.status_code is None:
+                result.error = ValueError(
+                    "The batch reply holds no response for the part."
+                )
+            elif not 200 <= response.status_code < 300:
+                result.error = ValueError(
+                    f"Part creation failed with status "
+                    f"{response.status_code}: {response.text}"
+                )
+            else:
+                result.id = _created_id(response)
+
+                if result.id is None:
+                    result.error = ValueError(
+                        "The server did not report the id of the part."
+                    )
+
+    def where_used_index(self, page_size=1000):
+        """
+        Load a reverse index of all Part BOM rows to answer where-used and
+        impact questions locally. See WhereUsedIndex; call its refresh()
+        to pick up later BOM changes.
+
+        Parameters
+        ----------
+        page_size: int
+            number of Part BOM rows requested per round trip.
+        """
+        index = WhereUsedIndex(self, page_size)
+        index.load()
+
+        return index
+
+def _bom_child_tags(assembly):
+    """
+    Return cache tags for the BOM rows and expanded children of a
+    get_assembly response.
+    """
+    tags = []
+
+    for row in assembly.get('value', []):
+        if 'id' in row:
+            tags.append(("Part BOM", row['id']))
+
+        child = row.get('related_id')
+
+        if isinstance(child, dict) and 'id' in child:
+            tags.append(("Part", child['id']))
+
+    return tags
+
+
+def _structure_node(depth):
+    """
+    Return an empty node of a get_product_structure result.
+    """
+    return {'depth': depth, 'parents': [], 'children': [], 'bom': None}
+
+
+def _add_structure_level(structure, assemblies, depth):
+    """
+    Add the BOMs of one level of parts to a product structure and return
+    the ids of the children seen for the first time, in BOM order.
+    assemblies holds (part id, get_assembly response) pairs.
+    """
+    next_level = []
+
+    for part_id, assembly in assemblies:
+        if 'value' not in assembly:
+            raise ValueError(
+                f"The BOM of Part {part_id} could not be read: "
+                f"{assembly.get('error', assembly)}"
+            )
+
+        node = structure[part_id]
+        node['bom'] = assembly['value']
+
+        for row in node['bom']:
+            child = row.get('related_id')
+
+            if not isinstance(child, dict) or 'id' not in child:
+                continue
+
+            child_id = child['id']
+            node['children'].append(child_id)
+
+            child_node = structure.get(child_id)
+
+            if child_node is None:
+                child_node = structure[child_id] = _structure_node(depth + 1)
+                next_level.append(child_id)
+
+            if part_id not in child_node['parents']:
+                child_node['parents'].append(part_id)
+
+    return next_level
+
+
+def _finished_chunk(chunk, future):
+    """
+    Wait for the $batch request of a create_parts chunk and return its
+    PartResults, marking them failed if the request raised.
+    """
+    try:
+        future.result()
+    except Exception as error:
+        for result in chunk:
+            if result.error is None and result.status_code is None:
+                result.error = error
+
+    return chunk
+
+
+def _created_id(response):
+    """
+    Return the id of an item created by a $batch operation, read from the
+    JSON body or else the OData-EntityId or Location header, or None if
+    the response names no id.
+    """
+    try:
+        part_id = response.json().get('id')
+    except (ValueError, AttributeError):
+        part_id = None
+
+    if part_id is not None:
+        return part_id
+
+    for name, value in response.headers.items():
+        if name.lower() in ('odata-entityid', 'location'):
+            match = _ENTITY_KEY.search(value)
+
+            if match is not None:
+                return match.group(1).replace("''", "'")
+
+    return None
+
+
+def _check_part_keys(metadata, valid_keys):
+    """
+    Raise if metadata has a key that is not in the frozenset valid_keys.
+    """
+    if not valid_keys.issuperset(metadata):
+        raise RuntimeError(
+            "Invalid Metadata entry. Valid keys are 'description,"
+            "'name, 'keyed_name', 'state', 'unit', 'item_number'"
+        )
@@ -0,0 +1,267 @@
+from email.utils import parsedate_to_datetime
+import datetime
+import random
+import threading
+import time
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of sending a request while the circuit breaker is open.
+    """
+
+
+class RetryPolicy:
+    """
+    Decides which failed requests are retried and how long to wait.
+
+    Idempotent verbs are retried after connection errors and on every status
+    in retry_statuses. Any verb is retried on 429, since the server rejected
+    the request without processing it. Waits grow exponentially with full
+    jitter and honor a Retry-After header when the server sends one.
+
+    Parameters
+    ----------
+    total : int
+        Maximum number of retries per request. Defaults to 3.
+    backoff_factor : float
+        Base wait in seconds; attempt n waits up to
+        backoff_factor * 2 ** n. Defaults to 0.5.
+    max_backoff : float
+        Upper bound of a single wait in seconds, including Retry-After.
+        Defaults to 30.
+    retry_statuses : iterable of int
+        Statuses retried for idempotent verbs. Defaults to 429, 500, 502,
+        503 and 504.
+    idempotent_methods : iterable of str
+        Verbs that are safe to repeat. Defaults to GET, HEAD, OPTIONS, PUT
+        and DELETE.
+    jitter : bool
+        Randomize waits so many clients do not retry in lockstep. Defaults
+        to True.
+    """
+    def __init__(self, total=3, backoff_factor=0.5, max_backoff=30,
+                 retry_statuses=(429, 500, 502, 503, 504),
+                 idempotent_methods=('GET', 'HEAD', 'OPTIONS', 'PUT',
+                                     'DELETE'),
+                 jitter=True):
+        if not isinstance(total, int) or total < 0:
+            raise ValueError("total must be a non-negative integer.")
+
+        if backoff_factor < 0 or max_backoff < 0:
+            raise ValueError(
+                "backoff_factor and max_backoff must be non-negative."
+            )
+
+        self.total = total
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.retry_statuses = frozenset(retry_statuses)
+        self.idempotent_methods = frozenset(
+            method.upper() for method in idempotent_methods
+        )
+        self.jitter = jitter
+
+    def should_retry(self, method, attempt, status_code=None,
+                     idempotent=None):
+        """
+        Return True if a request that failed on the given attempt (counting
+        from 0) should be sent again.
+
+        Parameters
+        ----------
+        method : str
+            HTTP verb of the request.
+        attempt : int
+            Number of retries already made.
+        status_code : int or None
+            Status of the response, or None after a connection error.
+        idempotent : bool or None
+            Overrides the verb based idempotency check.
+        """
+        if attempt >= self.total:
+            return False
+
+        if idempotent is None:
+            idempotent = method.upper() in self.idempotent_methods
+
+        if status_code == 429:
+            return True
+
+        if not idempotent:
+            return False
+
+        return status_code is None or status_code in self.retry_statuses
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        Return the number of seconds to wait before retry number attempt.
+        """
+        delay = _parse_retry_after(retry_after)
+
+        if delay is None:
+            delay = self.backoff_factor * (2 ** attempt)
+
+            if self.jitter:
+                delay = random.uniform(0, delay)
+
+        return min(delay, self.max_backoff)
+
+
+def _parse_retry_after(value):
+    """
+    Return the delay in seconds given by a Retry-After header, or None.
+    """
+    if value is None:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    now = datetime.datetime.now(tz=retry_at.tzinfo)
+
+    return max(0.0, (retry_at - now).total_seconds())
+
+
+class RateLimiter:
+    """
+    Token bucket limiting the rate of requests sent by a client.
+
+    Thread safe; callers block in acquire() until a token is available.
+
+    Parameters
+    ----------
+    rate : float
+        Sustained requests per second.
+    burst : int or None
+        Number of requests that may be sent back to back after an idle
+        period. Defaults to max(1, rate).
+    """
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError("rate must be a positive number.")
+
+        if burst is None:
+            burst = max(1, int(rate))
+
+        if not isinstance(burst, int) or burst < 1:
+            raise ValueError("burst must be a positive integer.")
+
+        self.rate = float(rate)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take one token, waiting for it if the bucket is empty.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst,
+                    self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a failing server.
+
+    After failure_threshold consecutive failures (connection errors or 5xx
+    responses) the circuit opens and requests fail immediately with
+    CircuitOpenError. Once recovery_timeout seconds have passed, one trial
+    request is let through; its success closes the circuit, its failure
+    opens it again. A trial that ends without an outcome, e.g. because it
+    was interrupted, is released to the next request.
+
+    Parameters
+    ----------
+    failure_threshold : int
+        Consecutive failures that open the circuit. Defaults to 5.
+    recovery_timeout : float
+        Seconds the circuit stays open before a trial request. Defaults to
+        30.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30):
+        if not isinstance(failure_threshold, int) or failure_threshold < 1:
+            raise ValueError("failure_threshold must be a positive integer.")
+
+        if recovery_timeout < 0:
+            raise ValueError("recovery_timeout must be non-negative.")
+
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        return self._state
+
+    def before_request(self):
+        """
+        Raise CircuitOpenError if requests may not be sent right now.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+
+            if (self._state == self.OPEN and time.monotonic()
+                    - self._opened_at >= self.recovery_timeout):
+                self._state = self.HALF_OPEN
+                return
+
+            raise CircuitOpenError(
+                "Circuit breaker is open after repeated server failures; "
+                "requests are paused."
+            )
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def release(self):
+        """
+        Give up a request let through by before_request that ended without
+        a response or connection failure. A trial of the half-open circuit
+        is handed to the next request.
+        """
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic() - self.recovery_timeout
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+
+            if (self._state == self.HALF_OPEN
+                    or self._failures >= self.failure_threshold):
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
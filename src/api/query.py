@@ -0,0 +1,274 @@
+from urllib.parse import quote, urlencode
+import datetime
+
+
+# Comparison operators understood by where(), and the string functions that
+# are written as function calls rather than infix operators.
+OPERATORS = frozenset(['eq', 'ne', 'gt', 'ge', 'lt', 'le'])
+FUNCTIONS = frozenset(['contains', 'startswith', 'endswith'])
+
+
+def literal(value):
+    """
+    Format a Python value as an OData literal.
+
+    Strings are single quoted with embedded quotes doubled, so values such
+    as "O'Ring" cannot break out of the filter expression.
+
+    Parameters
+    ----------
+    value : str, bool, int, float, datetime.datetime or None
+        The value to format.
+    """
+    if value is None:
+        return 'null'
+
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+
+    if isinstance(value, (int, float)):
+        return repr(value)
+
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+
+    raise TypeError(
+        f"Cannot format value of type {type(value).__name__} as an OData "
+        "literal."
+    )
+
+
+def encode_params(params):
+    """
+    Encode OData query options for a url. Spaces become %20 rather than '+',
+    and the characters OData uses as syntax are left readable.
+    """
+    return urlencode(params, quote_via=quote, safe="$,'()/:")
+
+
+class Query:
+    """
+    Composable OData query against one entity set.
+
+    Every builder method returns a new Query, so a base query can be shared
+    and refined without side effects. Filters, projections and ordering are
+    pushed to the server; only matching rows and selected columns are
+    transferred. Obtain one with api.query(item_type).
+
+    Example::
+
+        parts_api.query("Part") \\
+            .filter(classification="Assembly") \\
+            .where("modified_on", "gt", since) \\
+            .select("id", "item_number") \\
+            .orderby("item_number") \\
+            .get()
+
+    Parameters
+    ----------
+    api : CommonAPI or AsyncCommonAPI
+        The API object used to execute the query.
+    item_type : str
+        Entity set or navigation path, e.g. "Part" or
+        "Part('<id>')/Part BOM".
+    """
+    def __init__(self, api, item_type):
+        if not isinstance(item_type, str):
+            raise ValueError("item_type must be a string.")
+
+        self._api = api
+        self._item_type = item_type
+        self._filters = ()
+        self._select = ()
+        self._orderby = ()
+        self._expand = ()
+        self._top = None
+        self._skip = None
+
+    def _copy(self, **changes):
+        query = Query.__new__(Query)
+        query.__dict__.update(self.__dict__)
+        query.__dict__.update(changes)
+
+        return query
+
+    @property
+    def item_type(self):
+        return self._item_type
+
+    def filter(self, **equals):
+        """
+        Add equality conditions, combined with 'and'.
+
+        Example: filter(item_number='0403', state='Released')
+        """
+        expressions = tuple(
+            f"{field} eq {literal(value)}" for field, value in equals.items()
+        )
+
+        return self._copy(_filters=self._filters + expressions)
+
+    def where(self, field, operator, value):
+        """
+        Add one condition, combined with 'and'.
+
+        Parameters
+        ----------
+        field : str
+            Property name, e.g. "name" or "related_id/item_number".
+        operator : str
+            One of eq, ne, gt, ge, lt, le, contains, startswith, endswith.
+        value
+            Value compared against; formatted with literal().
+        """
+        if operator in OPERATORS:
+            expression = f"{field} {operator} {literal(value)}"
+        elif operator in FUNCTIONS:
+            expression = f"{operator}({field},{literal(value)})"
+        else:
+            raise ValueError(
+                f"Invalid operator '{operator}'. Valid operators are "
+                f"{sorted(OPERATORS | FUNCTIONS)}"
+            )
+
+        return self._copy(_filters=self._filters + (expression,))
+
+    def where_in(self, field, values):
+        """
+        Add a condition matching any of several values, combined with 'and'.
+        """
+        values = list(values)
+
+        if not values:
+            raise ValueError("values must not be empty.")
+
+        expression = "(" + " or ".join(
+            f"{field} eq {literal(value)}" for value in values
+        ) + ")"
+
+        return self._copy(_filters=self._filters + (expression,))
+
+    def select(self, *fields):
+        """
+        Restrict the returned columns.
+        """
+        return self._copy(_select=self._select + fields)
+
+    def orderby(self, field, descending=False):
+        """
+        Add a sort key.
+        """
+        key = f"{field} desc" if descending else field
+
+        return self._copy(_orderby=self._orderby + (key,))
+
+    def expand(self, *relations):
+        """
+        Inline related items, e.g. expand("related_id").
+        """
+        return self._copy(_expand=self._expand + relations)
+
+    def top(self, count):
+        """
+        Return at most count rows.
+        """
+        if not isinstance(count, int) or count < 0:
+            raise ValueError("top must be a non-negative integer.")
+
+        return self._copy(_top=count)
+
+    def skip(self, count):
+        """
+        Skip the first count rows.
+        """
+        if not isinstance(count, int) or count < 0:
+            raise ValueError("skip must be a non-negative integer.")
+
+        return self._copy(_skip=count)
+
+    def params(self, paging=True):
+        """
+        Return the OData query options as a dict.
+
+        Parameters
+        ----------
+        paging : bool
+            Whether to include $top and $skip.
+        """
+        params = {}
+
+        if self._filters:
+            params['$filter'] = " and ".join(self._filters)
+
+        if self._select:
+            params['$select'] = ",".join(self._select)
+
+        if self._orderby:
+            params['$orderby'] = ",".join(self._orderby)
+
+        if self._expand:
+            params['$expand'] = ",".join(self._expand)
+
+        if paging and self._top is not None:
+            params['$top'] = self._top
+
+        if paging and self._skip is not None:
+            params['$skip'] = self._skip
+
+        return params
+
+    def url(self, base_url):
+        """
+        Return the full request url for the query.
+        """
+        query_url = f"{base_url}/server/odata/{self._item_type}"
+
+        params = self.params()
+
+        if params:
+            query_url += "?" + encode_params(params)
+
+        return query_url
+
+    def get(self):
+        """
+        Execute the query and return the decoded OData response.
+        """
+        return self._api._execute_query(self)
+
+    def iter(self, page_size=1000, stream=False):
+        """
+        Execute the query page by page, yielding records as they arrive.
+        $top and $skip set on the query are ignored.
+
+        Parameters
+        ----------
+        page_size : int or None
+            Records per request; None sends one unpaged request.
+        stream : bool
+            Decode responses incrementally. Not supported by the asyncio
+            API classes.
+        """
+        if stream:
+            return self._api._iter_items(
+                self._item_type,
+                page_size=page_size,
+                params=self.params(paging=False),
+                stream=True
+            )
+
+        return self._api._iter_items(
+            self._item_type,
+            page_size=page_size,
+            params=self.params(paging=False)
+        )
+
+    def count(self):
+        """
+        Return the number of matching rows using $count, without
+        transferring them.
+        """
+        return self._api._count_query(self)
@@ -0,0 +1,163 @@
+import codecs
+import json
+
+
+_WHITESPACE = ' \t\n\r'
+
+
+class JSONArrayStream:
+    """
+    Incrementally decode the records of one array inside a JSON object.
+
+    The response body is consumed chunk by chunk, and each element of the
+    array under key is yielded as soon as it has been received. Only the
+    element being decoded is buffered, so peak memory does not depend on the
+    length of the array and the first record is available before the body
+    has finished downloading. Other top level members, e.g.
+    "@odata.nextLink", are collected in metadata as they are encountered;
+    metadata is complete once iteration has finished.
+
+    Example::
+
+        stream = JSONArrayStream(response.iter_content(65536))
+        for record in stream:
+            ...
+        next_link = stream.metadata.get('@odata.nextLink')
+
+    Parameters
+    ----------
+    chunks : iterable of bytes
+        The UTF-8 encoded JSON document, split arbitrarily.
+    key : str
+        Name of the top level member holding the array. Defaults to
+        "value", as used by OData collections.
+    """
+    def __init__(self, chunks, key='value'):
+        self._chunks = iter(chunks)
+        self._key = key
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self.metadata = {}
+
+    def __iter__(self):
+        return self._records()
+
+    def _fill(self):
+        """
+        Append the next chunk to the buffer. Returns False at end of input.
+        """
+        if self._eof:
+            return False
+
+        # Drop the consumed prefix so the buffer only holds unread text.
+        if self._pos:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+
+        for chunk in self._chunks:
+            if not chunk:
+                continue
+
+            self._buffer += self._text_decoder.decode(chunk)
+            return True
+
+        self._buffer += self._text_decoder.decode(b'', final=True)
+        self._eof = True
+
+        return False
+
+    def _peek(self):
+        """
+        Skip whitespace and return the next character, or '' at the end.
+        """
+        while True:
+            while (self._pos < len(self._buffer)
+                   and self._buffer[self._pos] in _WHITESPACE):
+                self._pos += 1
+
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+
+            if not self._fill():
+                return ''
+
+    def _expect(self, characters):
+        character = self._peek()
+
+        if character == '' or character not in characters:
+            raise ValueError(
+                f"Malformed JSON: expected one of {characters!r} but found "
+                f"{character!r}."
+            )
+
+        self._pos += 1
+
+        return character
+
+    def _value(self):
+        """
+        Decode the next complete JSON value, reading more input as needed.
+        """
+        self._peek()
+
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                # Grow the unread text geometrically so a value spanning
+                # many chunks is not re-parsed once per chunk.
+                target = 2 * (len(self._buffer) - self._pos)
+
+                if not self._fill():
+                    raise
+
+                while (len(self._buffer) - self._pos < target
+                       and self._fill()):
+                    pass
+                continue
+
+            # A number at the end of the buffer may continue in the next
+            # chunk.
+            if (end == len(self._buffer) and not self._eof
+                    and not isinstance(value, (dict, list, str))):
+                self._fill()
+                continue
+
+            self._pos = end
+
+            return value
+
+    def _records(self):
+        self._expect('{')
+
+        if self._peek() == '}':
+            self._pos += 1
+            return
+
+        while True:
+            member = self._value()
+
+            if not isinstance(member, str):
+                raise ValueError("Malformed JSON: object key is not a string.")
+
+            self._expect(':')
+
+            if member == self._key and self._peek() == '[':
+                self._pos += 1
+
+                if self._peek() == ']':
+                    self._pos += 1
+                else:
+                    while True:
+                        yield self._value()
+
+                        if self._expect(',]') == ']':
+                            break
+            else:
+                self.metadata[member] = self._value()
+
+            if self._expect(',}') == '}':
+                return
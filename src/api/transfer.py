@@ -0,0 +1,968 @@
+from .jsonfile import load_json, save_json
+import bisect
+import contextlib
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+
+
+class AdaptiveChunkSize:
+    """
+    Chooses vault upload chunk sizes from measured throughput.
+
+    After every full chunk the size is moved towards the number of bytes
+    the link delivered in target_seconds, growing or shrinking by at most
+    a factor of growth per step. A failed chunk halves the size. The
+    learned size is kept, so reusing one instance across uploads starts
+    each upload where the previous one left off. Pass an instance as the
+    chunk_size argument of FilesAPI.upload_file.
+
+    Parameters
+    ----------
+    initial : int
+        First chunk size in bytes. Defaults to 1 MiB.
+    minimum : int
+        Smallest chunk size in bytes. Defaults to 64 KiB.
+    maximum : int
+        Largest chunk size in bytes. Defaults to 32 MiB.
+    target_seconds : float
+        Desired duration of a single chunk request. Defaults to 1.
+    growth : float
+        Largest factor the size changes by after one chunk. Defaults to 2.
+    """
+    def __init__(self, initial=1024 * 1024, minimum=64 * 1024,
+                 maximum=32 * 1024 * 1024, target_seconds=1.0, growth=2.0):
+        for name, value in (('initial', initial), ('minimum', minimum),
+                            ('maximum', maximum)):
+            if not isinstance(value, int) or value < 1:
+                raise ValueError(f"{name} must be a positive integer.")
+
+        if not minimum <= initial <= maximum:
+            raise ValueError("initial must lie between minimum and maximum.")
+
+        if target_seconds <= 0:
+            raise ValueError("target_seconds must be positive.")
+
+        if growth <= 1:
+            raise ValueError("growth must be greater than 1.")
+
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self.growth = growth
+
+        self._size = initial
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        """
+        Chunk size in bytes for the next chunk.
+        """
+        return self._size
+
+    def record(self, size, seconds):
+        """
+        Adapt the size after a chunk of size bytes took seconds to send.
+
+        Chunks shorter than half the current size, usually the tail of a
+        file, are dominated by latency and are ignored.
+        """
+        with self._lock:
+            if size < self._size / 2:
+                return
+
+            ideal = size / max(seconds, 1e-6) * self.target_seconds
+
+            ideal = min(max(ideal, self._size / self.growth),
+                        self._size * self.growth)
+
+            self._size = int(min(max(ideal, self.minimum), self.maximum))
+
+    def record_failure(self):
+        """
+        Halve the size after a chunk failed.
+        """
+        with self._lock:
+            self._size = max(self.minimum, self._size // 2)
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, float('inf'))
+
+
+class TransferStats:
+    """
+    Collects the measurements of one upload or download.
+
+    Pass an instance as the stats argument of FilesAPI.upload_file,
+    upload_files, sync_directory, download_file or download_files; it is
+    filled in while the transfer runs and can be read afterwards, or
+    followed live through callback. The sizes and chunks of the files of a
+    multi-file transfer add up.
+
+    callback(event, stats, detail) is called on every event, from the
+    thread that caused it:
+
+    - "start" and "finish" with detail None,
+    - "phase" with (name, seconds) when a phase such as "transaction",
+      "chunks" or "commit" ends,
+    - "chunk" with (start, size, seconds) for every acknowledged chunk or
+      downloaded range,
+    - "retry" with None when a request is repeated.
+
+    Parameters
+    ----------
+    callback : callable or None
+        Receives the events listed above.
+    """
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.file_size = None
+        self.chunks = []
+        self.phases = {}
+        self.retries = 0
+        self.started = None
+        self.finished = None
+
+        self._lock = threading.Lock()
+
+    def start(self, file_size=None):
+        """
+        Mark the beginning of a transfer of file_size bytes, clearing the
+        measurements of any earlier transfer. The size may be left out and
+        added later with add_size when it is not known up front.
+        """
+        with self._lock:
+            self.file_size = file_size
+            self.chunks = []
+            self.phases = {}
+            self.retries = 0
+            self.started = time.perf_counter()
+            self.finished = None
+
+        self._emit("start", None)
+
+    def add_size(self, size):
+        """
+        Add size bytes to the size of the transfer.
+        """
+        with self._lock:
+            self.file_size = (self.file_size or 0) + size
+
+    def finish(self):
+        """
+        Mark the end of the transfer.
+        """
+        with self._lock:
+            self.finished = time.perf_counter()
+
+        self._emit("finish", None)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Time the enclosed block as phase name. Repeated phases add up.
+        """
+        began = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - began
+
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+            self._emit("phase", (name, seconds))
+
+    def record_chunk(self, start, size, seconds):
+        """
+        Record a chunk of size bytes at offset start that took seconds.
+        """
+        with self._lock:
+            self.chunks.append((start, size, seconds))
+
+        self._emit("chunk", (start, size, seconds))
+
+    def record_retry(self):
+        """
+        Record that a request of the transfer was repeated.
+        """
+        with self._lock:
+            self.retries += 1
+
+        self._emit("retry", None)
+
+    def _emit(self, event, detail):
+        if self.callback is not None:
+            self.callback(event, self, detail)
+
+    @property
+    def chunk_sizes(self):
+        """
+        Chunk sizes in bytes, in file order.
+        """
+        return [size for _, size, _ in sorted(self.chunks)]
+
+    @property
+    def bytes_transferred(self):
+        """
+        Total number of bytes in acknowledged chunks.
+        """
+        return sum(size for _, size, _ in self.chunks)
+
+    bytes_sent = bytes_transferred
+
+    @property
+    def progress(self):
+        """
+        Fraction of file_size transferred, None while the size is unknown.
+        """
+        if self.file_size is None:
+            return None
+
+        if not self.file_size:
+            return 1.0
+
+        return self.bytes_transferred / self.file_size
+
+    @property
+    def elapsed(self):
+        """
+        Wall clock seconds between start and finish, or until now.
+        """
+        if self.started is None:
+            return 0.0
+
+        end = self.finished if self.finished is not None else (
+            time.perf_counter()
+        )
+
+        return end - self.started
+
+    @property
+    def throughput(self):
+        """
+        Bytes per second over the elapsed time.
+        """
+        elapsed = self.elapsed
+
+        return self.bytes_transferred / elapsed if elapsed else 0.0
+
+    @property
+    def mb_per_second(self):
+        """
+        Throughput in MiB per second.
+        """
+        return self.throughput / 2 ** 20
+
+    def latency_histogram(self, buckets=LATENCY_BUCKETS):
+        """
+        Count the chunk durations per bucket.
+
+        Parameters
+        ----------
+        buckets : sequence of float
+            Ascending upper bounds in seconds. A chunk is counted in the
+            first bucket its duration does not exceed; chunks slower than
+            the last bound are not counted.
+
+        Returns
+        -------
+        list of tuple
+            (upper bound, count) pairs in bucket order.
+        """
+        counts = [0] * len(buckets)
+
+        for _, _, seconds in list(self.chunks):
+            index = bisect.bisect_left(buckets, seconds)
+
+            if index < len(buckets):
+                counts[index] += 1
+
+        return list(zip(buckets, counts))
+
+    def latency_percentile(self, percent):
+        """
+        Chunk duration in seconds below which percent of the chunks fall,
+        or None when no chunk was recorded.
+        """
+        if not 0 <= percent <= 100:
+            raise ValueError("percent must be between 0 and 100.")
+
+        durations = sorted(seconds for _, _, seconds in list(self.chunks))
+
+        if not durations:
+            return None
+
+        index = max(0, -(-len(durations) * percent // 100) - 1)
+
+        return durations[int(index)]
+
+
+# the stats object predates download support
+UploadStats = TransferStats
+
+
+def measure(stats, name):
+    """
+    Context manager timing phase name on stats, or doing nothing when
+    stats is None.
+    """
+    if stats is None:
+        return contextlib.nullcontext()
+
+    return stats.phase(name)
+
+
+class UploadResult:
+    """
+    Outcome of one file of FilesAPI.upload_files.
+
+    Attributes
+    ----------
+    file_path, file_number : str
+        The arguments given for the file.
+    file_id : str or None
+        Id of the File item, set once the chunks were accepted.
+    size : int or None
+        Bytes uploaded.
+    commit_status : int or None
+        Status the commit reported for this file.
+    error : Exception or None
+        Why the file was not uploaded or committed.
+    """
+    def __init__(self, file_path, file_number):
+        self.file_path = file_path
+        self.file_number = file_number
+        self.file_id = None
+        self.size = None
+        self.commit_status = None
+        self.error = None
+
+    def __repr__(self):
+        state = 'ok' if self.ok else f"error={self.error!r}"
+
+        return f"<UploadResult {self.file_path} {state}>"
+
+    @property
+    def ok(self):
+        """
+        True if the file was uploaded and nothing has failed so far.
+        """
+        return self.error is None
+
+
+class DownloadResult:
+    """
+    Outcome of one file of FilesAPI.download_files.
+
+    Attributes
+    ----------
+    file_id : str
+        Id of the File item.
+    path : str or None
+        Where the content was saved.
+    error : Exception or None
+        Why the download failed.
+    """
+    def __init__(self, file_id):
+        self.file_id = file_id
+        self.path = None
+        self.error = None
+
+    def __repr__(self):
+        state = 'ok' if self.ok else f"error={self.error!r}"
+
+        return f"<DownloadResult {self.file_id} {state}>"
+
+    @property
+    def ok(self):
+        """
+        True if the file was downloaded and verified.
+        """
+        return self.error is None and self.path is not None
+
+
+class SyncResult:
+    """
+    Outcome of FilesAPI.sync_directory.
+
+    Attributes
+    ----------
+    uploaded : list of UploadResult
+        Files that were new or changed, with file_number set to their path
+        relative to the synced directory.
+    unchanged : list of str
+        Relative paths whose content is already in the vault.
+    removed : list of str
+        Relative paths that disappeared from the directory and were dropped
+        from the manifest. Their Files are left in the vault.
+    """
+    def __init__(self):
+        self.uploaded = []
+        self.unchanged = []
+        self.removed = []
+
+    def __repr__(self):
+        return (
+            f"<SyncResult uploaded={len(self.uploaded)} "
+            f"failed={len(self.failed)} unchanged={len(self.unchanged)} "
+            f"removed={len(self.removed)}>"
+        )
+
+    @property
+    def failed(self):
+        """
+        Upload results of the files that could not be uploaded.
+        """
+        return [result for result in self.uploaded if not result.ok]
+
+    @property
+    def ok(self):
+        """
+        True if every new or changed file was uploaded.
+        """
+        return not self.failed
+
+
+@contextlib.contextmanager
+def map_file(path):
+    """
+    Map a file read-only and yield a memoryview over its bytes.
+
+    Slices of the view are sent as request bodies without copying the file
+    into Python objects; the operating system pages data in as the socket
+    reads it. Every slice must be released before the context exits.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap refuses empty files.
+            yield memoryview(b'')
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                yield view
+
+
+class UploadSource:
+    """
+    Content of an upload, handed out chunk by chunk.
+
+    Paths and bytes-like sources are random access and chunks are
+    memoryview slices. File objects and iterables are read sequentially,
+    so their chunks must be requested in order.
+    """
+    def __init__(self, size, view=None, reader=None):
+        self.size = size
+        self.random_access = view is not None
+
+        self._view = view
+        self._reader = reader
+        self._position = 0
+
+    def chunk(self, start, length):
+        """
+        Return the bytes [start, start + length) of the content.
+        """
+        if self._view is not None:
+            return self._view[start:start + length]
+
+        if start != self._position:
+            raise ValueError("Sequential sources must be read in order.")
+
+        parts = []
+        remaining = length
+
+        while remaining:
+            data = self._reader.read(remaining)
+
+            if not data:
+                raise ValueError(
+                    f"The source ended after {start + length - remaining} "
+                    f"bytes, {self.size} were declared."
+                )
+
+            parts.append(data)
+            remaining -= len(data)
+
+        self._position += length
+
+        return parts[0] if len(parts) == 1 else b''.join(parts)
+
+
+class _IterableReader:
+    """
+    File-like read() over an iterable of bytes-like blocks.
+    """
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self._block = memoryview(b'')
+
+    def read(self, size):
+        while not self._block:
+            block = next(self._iterator, None)
+
+            if block is None:
+                return b''
+
+            self._block = memoryview(block).cast('B')
+
+        data = bytes(self._block[:size])
+        self._block = self._block[size:]
+
+        return data
+
+
+@contextlib.contextmanager
+def upload_source(source, size=None):
+    """
+    Open the content of an upload and yield an UploadSource.
+
+    Parameters
+    ----------
+    source : str, bytes-like, file object or iterable of bytes
+        A local path, an in-memory buffer, a binary object with read(),
+        e.g. a streamed HTTP response, or an iterable of byte blocks.
+    size : int or None
+        Number of bytes the source provides. Required for iterables and
+        file objects that cannot seek; checked for bytes-like sources.
+    """
+    if size is not None and (not isinstance(size, int) or size < 0):
+        raise ValueError("size must be a non-negative integer.")
+
+    if isinstance(source, str):
+        with map_file(source) as view:
+            yield UploadSource(view.nbytes, view=view)
+
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        with memoryview(source) as base, base.cast('B') as view:
+            if size is not None and size != view.nbytes:
+                raise ValueError(
+                    f"size is {size} but the buffer holds {view.nbytes} "
+                    "bytes."
+                )
+
+            yield UploadSource(view.nbytes, view=view)
+
+    elif hasattr(source, 'read'):
+        if size is None:
+            if not (hasattr(source, 'seekable') and source.seekable()):
+                raise ValueError(
+                    "size must be given for file objects that cannot seek."
+                )
+
+            position = source.tell()
+            size = source.seek(0, os.SEEK_END) - position
+            source.seek(position)
+
+        yield UploadSource(size, reader=source)
+
+    else:
+        try:
+            reader = _IterableReader(source)
+        except TypeError:
+            raise ValueError(
+                "source must be a path, a bytes-like object, a file object "
+                "or an iterable of bytes."
+            ) from None
+
+        if size is None:
+            raise ValueError("size must be given for iterable sources.")
+
+        yield UploadSource(size, reader=reader)
+
+
+def file_fingerprint(path, sample_size=64 * 1024):
+    """
+    Return a cheap fingerprint of a file's current contents.
+
+    Combines size, modification time and SHA-256 digests of the first and
+    last sample_size bytes, enough to notice that a file changed between
+    an interrupted upload and its resumption without reading all of it.
+    """
+    stat = os.stat(path)
+
+    with open(path, 'rb') as f:
+        head = hashlib.sha256(f.read(sample_size)).hexdigest()
+
+        f.seek(max(0, stat.st_size - sample_size))
+        tail = hashlib.sha256(f.read(sample_size)).hexdigest()
+
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'head': head,
+        'tail': tail
+    }
+
+
+def missing_ranges(ranges, size):
+    """
+    Return the [start, end) ranges of a size byte file not covered by the
+    sorted, non-overlapping ranges.
+    """
+    missing = []
+    position = 0
+
+    for start, end in ranges:
+        if start > position:
+            missing.append([position, start])
+
+        position = max(position, end)
+
+    if position < size:
+        missing.append([position, size])
+
+    return missing
+
+
+class UploadJournal:
+    """
+    On-disk record of uploads in progress, so an interrupted upload can be
+    resumed in a later process.
+
+    Each entry holds the vault transaction id, the file id, the file number,
+    a fingerprint of the local file and the byte ranges the vault has
+    acknowledged. Pass an instance as the journal argument of
+    FilesAPI.upload_file.
+
+    Parameters
+    ----------
+    path : str
+        Location of the JSON file backing the journal.
+    flush_interval : int or float
+        Minimum number of seconds between writes while chunks are being
+        acknowledged. At most this much progress is lost when the process
+        dies. Defaults to 1.
+    """
+    def __init__(self, path, flush_interval=1.0):
+        if not isinstance(path, str):
+            raise ValueError("The path parameter must be a string.")
+
+        if (not isinstance(flush_interval, (int, float))
+                or flush_interval < 0):
+            raise ValueError(
+                "The flush_interval parameter must be a non-negative number."
+            )
+
+        self._path = path
+        self._flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._flushed = 0.0
+        self._entries = load_json(path)
+
+    @staticmethod
+    def make_key(base_url, database, file_path):
+        """
+        Return the journal key for uploading a local file to a database.
+        """
+        return json.dumps(
+            [base_url.rstrip('/'), database, os.path.abspath(file_path)]
+        )
+
+    def get(self, key):
+        """
+        Return a copy of the entry for a key, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            return dict(entry, ranges=[list(r) for r in entry['ranges']])
+
+    def begin(self, key, fingerprint, transaction_id, file_id, file_number):
+        """
+        Start a new entry for a key, replacing any earlier one.
+        """
+        with self._lock:
+            self._entries[key] = {
+                'fingerprint': fingerprint,
+                'transaction_id': transaction_id,
+                'file_id': file_id,
+                'file_number': file_number,
+                'ranges': []
+            }
+            self.flush()
+
+    def acknowledge(self, key, start, end):
+        """
+        Record that the vault accepted bytes [start, end) of a key's file.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return
+
+            ranges = entry['ranges']
+            ranges.append([start, end])
+            ranges.sort()
+
+            merged = [ranges[0]]
+            for range_start, range_end in ranges[1:]:
+                if range_start <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], range_end)
+                else:
+                    merged.append([range_start, range_end])
+
+            entry['ranges'] = merged
+
+            if time.monotonic() - self._flushed >= self._flush_interval:
+                self.flush()
+
+    def discard(self, key):
+        """
+        Remove the entry for a key, e.g. after its upload was committed.
+        """
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.flush()
+
+    def flush(self):
+        """
+        Write the journal to disk now.
+        """
+        with self._lock:
+            save_json(self._path, self._entries)
+            self._flushed = time.monotonic()
+
+
+def file_digests(path, block_size=1024 * 1024):
+    """
+    Return the hex SHA-256 and MD5 digests of a file, read once in blocks
+    of block_size bytes.
+    """
+    sha256 = hashlib.sha256()
+    md5 = hashlib.md5()
+
+    buffer = bytearray(block_size)
+    view = memoryview(buffer)
+
+    with open(path, 'rb') as f:
+        while True:
+            count = f.readinto(buffer)
+
+            if not count:
+                break
+
+            sha256.update(view[:count])
+            md5.update(view[:count])
+
+    return sha256.hexdigest(), md5.hexdigest()
+
+
+class ContentIndex:
+    """
+    Local index of file contents known to be in the vault, used by
+    FilesAPI.upload_file_dedup to skip uploading identical files.
+
+    Entries map (base_url, database, SHA-256, filename) to a File id. The
+    digests of local files are cached by path, size and modification time,
+    so unchanged files are not hashed again on later runs.
+
+    Changes are kept in memory until save() is called, so a run over many
+    files writes the index once rather than per file.
+
+    Parameters
+    ----------
+    path : str or None
+        Location of the JSON file backing the index. If None the index only
+        lives in memory.
+    """
+    def __init__(self, path=None):
+        if path is not None and not isinstance(path, str):
+            raise ValueError("The path parameter must be a string or None.")
+
+        self._path = path
+        self._lock = threading.RLock()
+        self._changed = False
+
+        data = load_json(path) if path is not None else {}
+
+        self._files = data.get('files', {})
+        self._digests = data.get('digests', {})
+
+    @staticmethod
+    def make_key(base_url, database, sha256, file_name):
+        """
+        Return the index key for content with a filename in a database.
+        """
+        return json.dumps([base_url.rstrip('/'), database, sha256, file_name])
+
+    def digests(self, file_path):
+        """
+        Return the (sha256, md5) hex digests of a local file, hashing it
+        only if it changed since it was last hashed.
+        """
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+
+        with self._lock:
+            cached = self._digests.get(file_path)
+
+        if (cached is not None and cached['size'] == stat.st_size
+                and cached['mtime_ns'] == stat.st_mtime_ns):
+            return cached['sha256'], cached['md5']
+
+        sha256, md5 = file_digests(file_path)
+
+        with self._lock:
+            self._digests[file_path] = {
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha256': sha256,
+                'md5': md5
+            }
+            self._changed = True
+
+        return sha256, md5
+
+    def get(self, key):
+        """
+        Return the File id recorded for a key, or None.
+        """
+        with self._lock:
+            return self._files.get(key)
+
+    def set(self, key, file_id):
+        """
+        Record that the content of a key is stored as File file_id.
+        """
+        with self._lock:
+            self._files[key] = file_id
+            self._changed = True
+
+    def discard(self, key):
+        """
+        Forget a key, e.g. after its File was deleted from the vault.
+        """
+        with self._lock:
+            if self._files.pop(key, None) is not None:
+                self._changed = True
+
+    def save(self):
+        """
+        Persist the index if it is backed by a file and changed since it
+        was loaded or last saved.
+        """
+        with self._lock:
+            if self._path is not None and self._changed:
+                save_json(
+                    self._path,
+                    {'files': self._files, 'digests': self._digests}
+                )
+                self._changed = False
+
+
+def scan_tree(directory, exclude=()):
+    """
+    Walk a directory tree and return {relative path: (size, mtime_ns)} for
+    every regular file. Relative paths use forward slashes; symbolic links
+    to directories are not followed. Absolute paths in exclude are skipped.
+    """
+    exclude = {os.path.abspath(path) for path in exclude}
+    files = {}
+    pending = [(os.path.abspath(directory), '')]
+
+    while pending:
+        path, prefix = pending.pop()
+
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.path in exclude:
+                    continue
+
+                relative = prefix + entry.name
+
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append((entry.path, relative + '/'))
+                elif entry.is_file():
+                    stat = entry.stat()
+                    files[relative] = (stat.st_size, stat.st_mtime_ns)
+
+    return files
+
+
+class SyncManifest:
+    """
+    Record of the files of a directory tree mirrored into the vault, used
+    by FilesAPI.sync_directory to upload only new or changed files.
+
+    Entries map a path relative to the synced directory to its size,
+    modification time, SHA-256 digest and File id. A file whose size and
+    modification time match its entry is not read at all; one that was
+    touched but kept its content is recognised by its digest. Use one
+    manifest per directory and database.
+
+    Parameters
+    ----------
+    path : str or None
+        Location of the JSON file backing the manifest. If None the
+        manifest only lives in memory.
+    """
+    def __init__(self, path=None):
+        if path is not None and not isinstance(path, str):
+            raise ValueError("The path parameter must be a string or None.")
+
+        self.path = path
+        self._lock = threading.RLock()
+
+        data = load_json(path) if path is not None else {}
+
+        self._entries = data.get('files', {})
+
+    def __len__(self):
+        return len(self._entries)
+
+    def paths(self):
+        """
+        Return the relative paths in the manifest.
+        """
+        with self._lock:
+            return list(self._entries)
+
+    def get(self, relative_path):
+        """
+        Return a copy of the entry of a relative path, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(relative_path)
+
+            return dict(entry) if entry is not None else None
+
+    def set(self, relative_path, size, mtime_ns, sha256, file_id):
+        """
+        Record that the file at relative_path is stored as File file_id.
+        """
+        with self._lock:
+            self._entries[relative_path] = {
+                'size': size,
+                'mtime_ns': mtime_ns,
+                'sha256': sha256,
+                'file_id': file_id
+            }
+
+    def discard(self, relative_path):
+        """
+        Forget a relative path.
+        """
+        with self._lock:
+            self._entries.pop(relative_path, None)
+
+    def save(self):
+        """
+        Persist the manifest if it is backed by a file. Changes are kept in
+        memory until saved, so large trees are not rewritten per file.
+        """
+        if self.path is not None:
+            with self._lock:
+                save_json(self.path, {'files': self._entries})
+
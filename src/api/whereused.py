@@ -0,0 +1,202 @@
+import datetime
+import threading
+
+
+class WhereUsedIndex:
+    """
+    In-memory reverse index of Part BOM relationships.
+
+    load() pages through every Part BOM row, selecting only id, source_id,
+    related_id, quantity and modified_on, and indexes the rows by child
+    part. Afterwards where_used, impact and top_level are answered from
+    dicts without any request. refresh() fetches only the rows modified
+    since the newest row seen so far, then drops the rows deleted in Aras
+    by listing the ids of all rows, which is far lighter than a load().
+
+    Part ids are those of specific generations, as in Part BOM rows. Obtain
+    a loaded index with PartsAPI.where_used_index().
+
+    Parameters
+    ----------
+    api : PartsAPI
+        API object used to query Part BOM.
+    page_size : int
+        Rows requested per round trip.
+    """
+    FIELDS = ("id", "source_id", "related_id", "quantity", "modified_on")
+
+    def __init__(self, api, page_size=1000):
+        self._api = api
+        self._page_size = page_size
+        self._lock = threading.RLock()
+
+        self._rows = {}
+        self._used_in = {}
+        self.modified_since = None
+
+    def __len__(self):
+        return len(self._rows)
+
+    def load(self):
+        """
+        Replace the index with all Part BOM rows. Returns the row count.
+        """
+        rows = {}
+        used_in = {}
+        newest = None
+
+        for record in self._query().iter(page_size=self._page_size):
+            newest = _newest(newest, record.get('modified_on'))
+            _index_row(rows, used_in, record)
+
+        with self._lock:
+            self._rows = rows
+            self._used_in = used_in
+            self.modified_since = newest
+
+        return len(rows)
+
+    def refresh(self):
+        """
+        Add or update the Part BOM rows modified since the last load or
+        refresh, drop the rows that no longer exist and return how many
+        rows were read. Loads everything if the index is empty.
+        """
+        if self.modified_since is None:
+            return self.load()
+
+        since = datetime.datetime.fromisoformat(self.modified_since)
+        # ge rather than gt: rows saved in the same instant as the newest
+        # one seen may not have been visible yet, and re-reading is harmless
+        query = self._query().where("modified_on", "ge", since)
+        count = 0
+
+        for record in query.iter(page_size=self._page_size):
+            with self._lock:
+                self.modified_since = _newest(self.modified_since,
+                                              record.get('modified_on'))
+                _index_row(self._rows, self._used_in, record)
+
+            count += 1
+
+        # a deleted row leaves no modified_on behind, so only the full id
+        # list shows that a where-used link is gone
+        existing = {
+            record['id'] for record in self._api.query("Part BOM")
+            .select("id").iter(page_size=self._page_size)
+        }
+
+        with self._lock:
+            for bom_id in [bom_id for bom_id in self._rows
+                           if bom_id not in existing]:
+                _drop_row(self._rows, self._used_in, bom_id)
+
+        return count
+
+    def where_used(self, part_id):
+        """
+        Return the (assembly id, quantity) pairs of the BOM rows using a
+        part directly.
+        """
+        with self._lock:
+            return list(self._used_in.get(part_id, {}).values())
+
+    def impact(self, part_id):
+        """
+        Return the ids of every assembly that uses a part directly or
+        through subassemblies, nearest first.
+        """
+        seen = {part_id}
+        impacted = []
+        level = [part_id]
+
+        with self._lock:
+            while level:
+                next_level = []
+
+                for child_id in level:
+                    for parent_id, _ in self._used_in.get(child_id,
+                                                          {}).values():
+                        if parent_id not in seen:
+                            seen.add(parent_id)
+                            next_level.append(parent_id)
+
+                impacted.extend(next_level)
+                level = next_level
+
+        return impacted
+
+    def top_level(self, part_id):
+        """
+        Return the ids of the assemblies using a part that are not
+        themselves used anywhere, i.e. the end items it affects.
+        """
+        with self._lock:
+            return [
+                assembly_id for assembly_id in self.impact(part_id)
+                if not self._used_in.get(assembly_id)
+            ]
+
+    def _query(self):
+        return self._api.query("Part BOM").select(*self.FIELDS)
+
+
+def _item_id(record, name):
+    """
+    Return the id of an item property of a record, which Aras sends as a
+    name@aras.id annotation unless the property is expanded.
+    """
+    value = record.get(name)
+
+    if isinstance(value, dict):
+        return value.get('id')
+
+    return record.get(f"{name}@aras.id", value)
+
+
+def _index_row(rows, used_in, record):
+    """
+    Insert or update one Part BOM record in the index dicts.
+    """
+    bom_id = record['id']
+    parent_id = _item_id(record, 'source_id')
+    child_id = _item_id(record, 'related_id')
+
+    _drop_row(rows, used_in, bom_id)
+
+    if parent_id is None or child_id is None:
+        return
+
+    quantity = record.get('quantity')
+    quantity = float(quantity) if quantity not in (None, '') else None
+
+    rows[bom_id] = (parent_id, child_id)
+    used_in.setdefault(child_id, {})[bom_id] = (parent_id, quantity)
+
+
+def _drop_row(rows, used_in, bom_id):
+    """
+    Remove one Part BOM row from the index dicts, if present.
+    """
+    previous = rows.pop(bom_id, None)
+
+    if previous is not None:
+        uses = used_in[previous[1]]
+        del uses[bom_id]
+
+        if not uses:
+            del used_in[previous[1]]
+
+
+def _newest(current, modified_on):
+    """
+    Return the later of two modified_on timestamps, either may be None.
+    """
+    if modified_on is None:
+        return current
+
+    if current is None or (datetime.datetime.fromisoformat(modified_on)
+                           > datetime.datetime.fromisoformat(current)):
+        return modified_on
+
+    return current
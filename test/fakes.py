@@ -0,0 +1,331 @@
+"""
+In-memory stand-in for an InnovatorServer shared by the offline tests.
+
+A FakeServer takes the place of the requests session of an API object, so
+tests drive the real request path: authorization, retries, paging and
+$batch encoding all run as in production. serve() puts the same server
+behind a local HTTP port for the asyncio API classes. Subclasses answer
+the item requests of their test in handle().
+"""
+from src.api.auth import TokenStore
+from src.api.batch import _split_multipart, encode_multipart
+from src.api.policy import RetryPolicy
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from http import HTTPStatus
+from requests.structures import CaseInsensitiveDict
+from unittest import mock
+import contextlib
+import hashlib
+import json
+import requests
+import threading
+import urllib.parse
+
+
+BASE_URL = 'http://localhost/InnovatorServer'
+
+
+class FakeResponse:
+    """
+    Stand-in for requests.Response. A payload is served as a JSON body.
+    With wait set to an asyncio.Event, serve() holds the response back
+    until the event is set.
+    """
+    def __init__(self, status_code=200, payload=None, headers=None,
+                 content=None, wait=None):
+        if content is None and payload is not None:
+            content = json.dumps(payload).encode()
+
+        self.status_code = status_code
+        self.reason = HTTPStatus(status_code).phrase
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.content = content if content is not None else b''
+        self.wait = wait
+        self.closed = False
+
+        if payload is not None:
+            self.headers.setdefault('Content-Type', 'application/json')
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(
+                f"{self.status_code} {self.reason}", response=self
+            )
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+def parse_url(url):
+    """
+    Return the unquoted path of a request url and its query options.
+    """
+    parts = urllib.parse.urlsplit(url)
+
+    return (
+        urllib.parse.unquote(parts.path),
+        dict(urllib.parse.parse_qsl(parts.query, keep_blank_values=True))
+    )
+
+
+def http_part(status, payload=None, headers=None):
+    """
+    Encode one application/http response part of a multipart body.
+    """
+    headers = dict(headers or {})
+    content = b''
+
+    if payload is not None:
+        headers.setdefault('Content-Type', 'application/json')
+        content = json.dumps(payload).encode()
+
+    head = f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+    head += ''.join(f"{name}: {value}\r\n" for name, value in headers.items())
+
+    return (
+        b"Content-Type: application/http\r\n\r\n"
+        + head.encode() + b"\r\n" + content
+    )
+
+
+def multipart_response(parts, boundary='response'):
+    """
+    Return a 200 response whose body joins encoded parts.
+    """
+    return FakeResponse(
+        200,
+        headers={'Content-Type': f"multipart/mixed; boundary={boundary}"},
+        content=encode_multipart(boundary, parts)
+    )
+
+
+def read_batch(headers, body):
+    """
+    Decode a $batch request body into its top-level groups. Each group is
+    a list of (method, url, decoded JSON body or None) operations; groups
+    of a single operation outside a change set are lists of one.
+
+    Returns
+    -------
+    list of (bool, list)
+        (is change set, operations) per group.
+    """
+    groups = []
+
+    for part_headers, payload in _split_multipart(body,
+                                                  headers['Content-Type']):
+        if part_headers.get_content_type() == 'multipart/mixed':
+            groups.append((True, [
+                _read_operation(inner) for _, inner in _split_multipart(
+                    payload, part_headers['Content-Type']
+                )
+            ]))
+        else:
+            groups.append((False, [_read_operation(payload)]))
+
+    return groups
+
+
+def _read_operation(payload):
+    """
+    Decode one application/http request part.
+    """
+    head, _, content = payload.partition(b"\r\n\r\n")
+    method, url, _ = head.split(b"\r\n")[0].decode().split(" ", 2)
+
+    return method, url, json.loads(content) if content.strip() else None
+
+
+def batch_response(answers):
+    """
+    Answer a $batch request. Each answer is an http_part, or a list of
+    them for a change set.
+    """
+    parts = []
+
+    for answer in answers:
+        if isinstance(answer, list):
+            parts.append(
+                b"Content-Type: multipart/mixed; boundary=changeset\r\n\r\n"
+                + encode_multipart('changeset', answer)
+            )
+        else:
+            parts.append(answer)
+
+    return multipart_response(parts)
+
+
+class FakeServer:
+    """
+    Stand-in for the requests session of an API object.
+
+    OAuth discovery and token requests are answered here: every grant
+    issues a new access token "token-<n>" with refresh token
+    "refresh-<n>". The password grant is refused unless it carries the
+    hash of password. Requests carrying a token in revoked are answered
+    with 401; with refresh_ok unset the refresh token grant is refused. Every
+    other request is handed to handle(). All requests are recorded in
+    requests as (method, url, headers) and the grant type of every issued
+    token in grants.
+    """
+    def __init__(self):
+        self.requests = []
+        self.grants = []
+        self.revoked = set()
+        self.refresh_ok = True
+        self.password = 'password'
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def request(self, method, url, headers=None, data=None, params=None,
+                **kwargs):
+        headers = CaseInsensitiveDict(headers or {})
+
+        if params is not None:
+            # query options given apart are sent in the url, as requests does
+            url = requests.Request(method, url, params=params).prepare().url
+
+        with self.lock:
+            self.requests.append((method, url, headers))
+
+        if url.endswith('/OAuthServer/.well-known/openid-configuration'):
+            return FakeResponse(200, {
+                'token_endpoint': url.split('/.well-known/')[0]
+                + '/connect/token'
+            })
+
+        if url.endswith('/OAuthServer/connect/token'):
+            return self.grant(data)
+
+        token = headers.get('Authorization', '').replace('Bearer ', '')
+
+        if token in self.revoked:
+            return FakeResponse(401)
+
+        return self.handle(method, url, headers, data, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        return self.request("POST", url, data=data, **kwargs)
+
+    def close(self):
+        self.closed = True
+
+    def grant(self, data):
+        """
+        Answer a token request with form fields data.
+        """
+        if isinstance(data, bytes):
+            data = dict(urllib.parse.parse_qsl(data.decode()))
+
+        if data['grant_type'] == 'refresh_token' and not self.refresh_ok:
+            return FakeResponse(400, {'error': 'invalid_grant'})
+
+        if (data['grant_type'] == 'password' and data['password']
+                != hashlib.md5(self.password.encode()).hexdigest()):
+            return FakeResponse(400, {'error': 'invalid_grant'})
+
+        with self.lock:
+            self.grants.append(data['grant_type'])
+            count = len(self.grants)
+
+        return FakeResponse(200, {
+            'access_token': f"token-{count}",
+            'expires_in': 3600,
+            'refresh_token': f"refresh-{count}"
+        })
+
+    def handle(self, method, url, headers, data, **kwargs):
+        """
+        Answer an authorized item request. Override in subclasses.
+        """
+        return FakeResponse(404)
+
+    def item_requests(self):
+        """
+        The recorded requests other than authorization.
+        """
+        with self.lock:
+            return [
+                request for request in self.requests
+                if '/OAuthServer/' not in request[1]
+            ]
+
+    @staticmethod
+    def page(records, params):
+        """
+        Answer a paged listing of records with the $top and $skip options
+        in params.
+        """
+        skip = int(params.get('$skip', 0))
+        top = params.get('$top')
+        end = skip + int(top) if top is not None else None
+
+        return FakeResponse(200, {'value': records[skip:end]})
+
+
+def connect(api_class, server, **kwargs):
+    """
+    Build an api_class logged in to server. Retries are off and tokens are
+    cached in a private TokenStore unless given in kwargs.
+    """
+    kwargs.setdefault('password_hash', hashlib.md5(b'password'))
+    kwargs.setdefault('retry', RetryPolicy(total=0))
+    kwargs.setdefault('token_store', TokenStore())
+
+    with mock.patch.object(api_class, '_build_session', return_value=server):
+        return api_class(BASE_URL, 'client', 'db', 'user', **kwargs)
+
+
+def connect_async(api_class, base_url, **kwargs):
+    """
+    Build an unopened asyncio api_class for a server started by serve().
+    """
+    kwargs.setdefault('token_store', TokenStore())
+
+    return api_class(base_url, 'client', 'db', 'user',
+                     hashlib.md5(b'password'), **kwargs)
+
+
+@contextlib.asynccontextmanager
+async def serve(server):
+    """
+    Serve a FakeServer over HTTP on localhost and yield the base url of
+    the InnovatorServer it pretends to be.
+    """
+    async def dispatch(request):
+        response = server.request(
+            request.method, str(request.url), headers=dict(request.headers),
+            data=await request.read()
+        )
+
+        if response.wait is not None:
+            await response.wait.wait()
+
+        return web.Response(status=response.status_code,
+                            headers=dict(response.headers),
+                            body=response.content)
+
+    app = web.Application()
+    app.router.add_route('*', '/{path:.*}', dispatch)
+
+    async with TestServer(app) as test_server:
+        yield str(test_server.make_url('/InnovatorServer'))
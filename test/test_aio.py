@@ -0,0 +1,287 @@
+from fakes import (
+    BASE_URL, FakeResponse, FakeServer, connect_async, http_part,
+    multipart_response, parse_url, serve
+)
+from src.api.aio.files import AsyncFilesAPI
+from src.api.aio.parts import AsyncPartsAPI
+from src.api.batch import _split_multipart
+from src.api.transfer import ContentIndex, TransferStats, UploadJournal
+import asyncio
+import json
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+
+PARTS = [{'id': f"P{n}", 'item_number': str(n)} for n in range(5)]
+
+
+class _Server(FakeServer):
+    """
+    Serves PARTS in pages, answers part updates and vault uploads and
+    serves the committed File records. The chunk starting at fail_at is
+    refused; with hold set every other chunk waits for it.
+    """
+    def __init__(self, fail_at=None, hold=None):
+        super().__init__()
+        self.fail_at = fail_at
+        self.hold = hold
+        self.listings = []
+        self.transactions = 0
+        self.chunks = []
+        self.commits = 0
+        self.files = {}
+
+    def handle(self, method, url, headers, data, **kwargs):
+        path, params = parse_url(url)
+
+        if path.endswith('/Part'):
+            self.listings.append(params)
+
+            return self.page(PARTS, params)
+
+        if method == 'PATCH' and path.endswith("/Part('P1')"):
+            return FakeResponse(200, dict(PARTS[1], **json.loads(data)))
+
+        if path.endswith('/File'):
+            return FakeResponse(200, {'value': []})
+
+        file_id = re.search(r"/File\('(\w+)'\)$", path)
+
+        if file_id is not None:
+            return FakeResponse(200, self.files[file_id.group(1)])
+
+        if path.endswith('vault.BeginTransaction'):
+            self.transactions += 1
+
+            return FakeResponse(200, {'transactionId': 'T1'})
+
+        if path.endswith('vault.UploadFile'):
+            start = int(
+                re.match(r'bytes (\d+)-', headers['Content-Range']).group(1)
+            )
+            self.chunks.append(start)
+
+            if start == self.fail_at:
+                return FakeResponse(500)
+
+            return FakeResponse(200, wait=self.hold)
+
+        if path.endswith('vault.CommitTransaction'):
+            self.commits += 1
+
+            for _, part in _split_multipart(data, headers['Content-Type']):
+                record = json.loads(part.partition(b'\r\n\r\n')[2])
+                self.files[record['id']] = record
+
+            return multipart_response([http_part(201)])
+
+        return FakeResponse(404)
+
+
+class TestAsyncAPI(unittest.TestCase):
+
+    def test_open_and_close(self):
+
+        server = _Server()
+
+        async def run():
+            async with serve(server) as base_url:
+                api = connect_async(AsyncPartsAPI, base_url)
+
+                with self.assertRaises(RuntimeError):
+                    await api.get_parts_list()
+
+                async with api:
+                    self.assertIsNotNone(api._session)
+                    self.assertEqual(server.grants, ['password'])
+
+                    parts = await api.get_parts_list()
+
+                self.assertIsNone(api._session)
+
+                return parts
+
+        parts = asyncio.run(run())
+
+        self.assertEqual(parts['value'], PARTS)
+
+    def test_reauthenticates_on_401(self):
+
+        server = _Server()
+
+        async def run():
+            async with serve(server) as base_url:
+                async with connect_async(AsyncPartsAPI, base_url) as api:
+                    server.revoked.add('token-1')
+
+                    return await api.get_parts_list()
+
+        parts = asyncio.run(run())
+
+        self.assertEqual(parts['value'], PARTS)
+        self.assertEqual(server.grants, ['password', 'refresh_token'])
+        self.assertEqual(
+            [request[2]['Authorization']
+             for request in server.item_requests()],
+            ['Bearer token-1', 'Bearer token-2']
+        )
+
+    def test_pages(self):
+
+        server = _Server()
+
+        async def run():
+            async with serve(server) as base_url:
+                async with connect_async(AsyncPartsAPI, base_url) as api:
+                    return [part async for part in api.iter_parts(2)]
+
+        self.assertEqual(asyncio.run(run()), PARTS)
+        self.assertEqual(
+            [(params['$skip'], params['$top'], params['$orderby'])
+             for params in server.listings],
+            [('0', '2', 'id'), ('2', '2', 'id'), ('4', '2', 'id')]
+        )
+
+    def test_stream_is_refused(self):
+
+        api = connect_async(AsyncPartsAPI, BASE_URL)
+
+        with self.assertRaises(ValueError):
+            api.iter_parts(stream=True)
+
+    def test_update_part(self):
+
+        server = _Server()
+
+        async def run():
+            async with serve(server) as base_url:
+                async with connect_async(AsyncPartsAPI, base_url) as api:
+                    with self.assertRaises(RuntimeError):
+                        await api.update_part('P1', {'color': 'red'})
+
+                    return await api.update_part('P1', {'name': 'bracket'})
+
+        self.assertEqual(asyncio.run(run()),
+                         {'id': 'P1', 'item_number': '1', 'name': 'bracket'})
+        self.assertEqual(
+            [request[0] for request in server.item_requests()], ['PATCH']
+        )
+
+
+class TestAsyncUpload(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'part.step')
+
+        with open(self.path, 'wb') as f:
+            f.write(os.urandom(100))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_upload_commits(self):
+
+        server = _Server()
+        stats = TransferStats()
+
+        async def run():
+            async with serve(server) as base_url:
+                async with connect_async(AsyncFilesAPI, base_url) as api:
+                    return await api.upload_files([(self.path, 'F-1')],
+                                                  workers=4, chunk_size=10,
+                                                  stats=stats)
+
+        results = asyncio.run(run())
+
+        self.assertTrue(results[0].ok)
+        self.assertEqual(results[0].commit_status, 201)
+        self.assertEqual(results[0].size, 100)
+        self.assertEqual(sorted(server.chunks), list(range(0, 100, 10)))
+        self.assertEqual(stats.file_size, 100)
+        self.assertEqual(stats.bytes_transferred, 100)
+        self.assertEqual(set(stats.phases),
+                         {'transaction', 'chunks', 'commit'})
+
+    def test_failed_chunk_cancels_the_others(self):
+
+        async def run():
+            hold = asyncio.Event()
+            server = _Server(fail_at=0, hold=hold)
+
+            async with serve(server) as base_url:
+                try:
+                    async with connect_async(AsyncFilesAPI,
+                                             base_url) as api:
+                        with self.assertRaises(ValueError):
+                            # never returns if the held chunks are awaited
+                            await asyncio.wait_for(
+                                api.upload_file(self.path, 'F-1', workers=4,
+                                                chunk_size=10),
+                                timeout=5
+                            )
+                finally:
+                    hold.set()
+
+            return server
+
+        server = asyncio.run(run())
+
+        # only the first four chunks were claimed, nothing was committed
+        self.assertLessEqual(set(server.chunks), {0, 10, 20, 30})
+        self.assertEqual(server.commits, 0)
+
+    def test_resume_from_journal(self):
+
+        server = _Server(fail_at=50)
+        journal_path = os.path.join(self.directory, 'uploads.json')
+
+        async def run():
+            async with serve(server) as base_url:
+                async with connect_async(AsyncFilesAPI, base_url) as api:
+                    with self.assertRaises(ValueError):
+                        await api.upload_file(
+                            self.path, 'F-1', workers=1, chunk_size=10,
+                            journal=UploadJournal(journal_path)
+                        )
+
+                    server.fail_at = None
+
+                    return await api.upload_file(
+                        self.path, 'F-1', workers=1, chunk_size=10,
+                        journal=UploadJournal(journal_path)
+                    )
+
+        self.assertEqual(asyncio.run(run()).status, 200)
+
+        # the second upload finished the first transaction
+        self.assertEqual(server.transactions, 1)
+        self.assertEqual(server.chunks,
+                         [0, 10, 20, 30, 40, 50, 50, 60, 70, 80, 90])
+        self.assertEqual(server.commits, 1)
+
+    def test_dedup_skips_indexed_content(self):
+
+        server = _Server()
+        index = ContentIndex()
+
+        async def run():
+            async with serve(server) as base_url:
+                async with connect_async(AsyncFilesAPI, base_url) as api:
+                    return [
+                        await api.upload_file_dedup(self.path, 'F-1', index)
+                        for _ in range(2)
+                    ]
+
+        first, second = asyncio.run(run())
+
+        self.assertEqual(first, second)
+        self.assertEqual(list(server.files), [first])
+        self.assertEqual(server.commits, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+from src.api.auth import TokenStore
+from src.api.common import CommonAPI
+from fakes import BASE_URL, FakeResponse, FakeServer, connect
+import hashlib
+import os
+import requests
+import tempfile
+import time
+import unittest
+
+
+class TestTokenStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'tokens.json')
+
+        self.key = TokenStore.make_key(
+            'http://localhost/InnovatorServer/', 'db', 'client', 'user'
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_make_key_ignores_trailing_slash(self):
+
+        other_key = TokenStore.make_key(
+            'http://localhost/InnovatorServer', 'db', 'client', 'user'
+        )
+
+        self.assertEqual(self.key, other_key)
+
+    def test_get_token(self):
+
+        store = TokenStore()
+
+        self.assertIsNone(store.get_token(self.key))
+
+        store.set_token(
+            self.key, {'access_token': 'abc', 'expires_in': 3600}
+        )
+
+        self.assertEqual(store.get_token(self.key), 'abc')
+
+    def test_token_within_refresh_margin_is_stale(self):
+
+        store = TokenStore(refresh_margin=60)
+
+        store.set_token(self.key, {'access_token': 'abc', 'expires_in': 30})
+
+        self.assertIsNone(store.get_token(self.key))
+
+    def test_persisted_between_stores(self):
+
+        store = TokenStore(self.path)
+
+        store.set_discovery(self.key, {'token_endpoint': 'http://token'})
+        store.set_token(
+            self.key,
+            {
+                'access_token': 'abc',
+                'expires_in': 3600,
+                'refresh_token': 'def'
+            }
+        )
+
+        new_store = TokenStore(self.path)
+
+        self.assertEqual(new_store.get_token(self.key), 'abc')
+        self.assertEqual(new_store.get_refresh_token(self.key), 'def')
+        self.assertEqual(
+            new_store.get_discovery(self.key),
+            {'token_endpoint': 'http://token'}
+        )
+
+    def test_invalidate_only_matching_token(self):
+
+        store = TokenStore()
+
+        store.set_token(self.key, {'access_token': 'new'})
+        store.invalidate(self.key, 'old')
+
+        self.assertEqual(store.get_token(self.key), 'new')
+
+        store.invalidate(self.key, 'new')
+
+        self.assertIsNone(store.get_token(self.key))
+
+    def test_expired_token_in_file(self):
+
+        store = TokenStore(self.path)
+        store.set_token(self.key, {'access_token': 'abc', 'expires_in': 1})
+
+        store._entries[self.key]['expires_at'] = time.time() - 1
+        store._save()
+
+        self.assertIsNone(TokenStore(self.path).get_token(self.key))
+
+
+class _ItemServer(FakeServer):
+    """
+    Answers every item request with an empty listing.
+    """
+    def handle(self, method, url, headers, data, **kwargs):
+        return FakeResponse(200, {'value': []})
+
+
+class TestLogin(unittest.TestCase):
+    """
+    How CommonAPI obtains, reuses and renews its access token.
+    """
+    url = f"{BASE_URL}/server/odata/Part"
+
+    def setUp(self):
+        self.server = _ItemServer()
+        self.store = TokenStore(refresh_margin=60)
+        self.key = TokenStore.make_key(BASE_URL, 'db', 'client', 'user',
+                                       hashlib.md5(b'password'))
+
+    def authorizations(self):
+        return [
+            request[2]['Authorization']
+            for request in self.server.item_requests()
+        ]
+
+    def test_one_login_per_store(self):
+
+        connect(CommonAPI, self.server, token_store=self.store)
+        api = connect(CommonAPI, self.server, token_store=self.store)
+        api._request("GET", self.url)
+
+        self.assertEqual(self.server.grants, ['password'])
+        self.assertEqual(self.authorizations(), ['Bearer token-1'])
+
+    def test_401_retried_after_refresh(self):
+
+        api = connect(CommonAPI, self.server, token_store=self.store)
+        self.server.revoked.add('token-1')
+
+        response = api._request("GET", self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.grants, ['password', 'refresh_token'])
+        self.assertEqual(self.authorizations(),
+                         ['Bearer token-1', 'Bearer token-2'])
+
+    def test_wrong_password_not_served_from_store(self):
+
+        connect(CommonAPI, self.server, token_store=self.store)
+
+        with self.assertRaises(requests.HTTPError):
+            connect(CommonAPI, self.server, token_store=self.store,
+                    password_hash=hashlib.md5(b'wrong'))
+
+        self.assertEqual(self.server.grants, ['password'])
+
+    def test_401_retried_once(self):
+
+        api = connect(CommonAPI, self.server, token_store=self.store)
+        self.server.revoked.update(['token-1', 'token-2'])
+
+        response = api._request("GET", self.url)
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(len(self.authorizations()), 2)
+
+    def test_expiring_token_refreshed(self):
+
+        self.store.set_token(self.key, {
+            'access_token': 'old',
+            'expires_in': 30,
+            'refresh_token': 'refresh-0'
+        })
+
+        api = connect(CommonAPI, self.server, token_store=self.store)
+        api._request("GET", self.url)
+
+        self.assertEqual(self.server.grants, ['refresh_token'])
+        self.assertEqual(self.authorizations(), ['Bearer token-1'])
+
+    def test_refused_refresh_falls_back_to_password(self):
+
+        self.store.set_token(self.key, {
+            'access_token': 'old',
+            'expires_in': 30,
+            'refresh_token': 'refresh-0'
+        })
+        self.server.refresh_ok = False
+
+        connect(CommonAPI, self.server, token_store=self.store)
+
+        self.assertEqual(self.server.grants, ['password'])
+        self.assertEqual(self.store.get_refresh_token(self.key), 'refresh-1')
@@ -0,0 +1,170 @@
+from src.api.batch import Batch, encode_multipart, encode_request
+from src.api.common import CommonAPI
+from fakes import FakeServer, batch_response, connect, http_part, read_batch
+from unittest import mock
+import requests
+import unittest
+
+
+class _BatchServer(FakeServer):
+    """
+    Answers every $batch request by echoing one 201 per operation, and fails
+    change sets containing a DELETE as a whole. The request numbered
+    offline_at, counting from 0, loses its connection. With answered set
+    only the first answered groups of a request get a response part.
+    """
+    def __init__(self, offline_at=None, answered=None):
+        super().__init__()
+        self.bodies = []
+        self.offline_at = offline_at
+        self.answered = answered
+
+    def handle(self, method, url, headers, data, **kwargs):
+        self.bodies.append(data)
+
+        if len(self.bodies) - 1 == self.offline_at:
+            raise requests.ConnectionError("connection reset")
+
+        answers = []
+        for changeset, operations in read_batch(headers, data):
+            if not changeset:
+                answers.append(http_part(201, {'n': len(answers)}))
+            elif any(operation[0] == 'DELETE' for operation in operations):
+                answers.append(http_part(400))
+            else:
+                answers.append([
+                    http_part(201, {'n': len(answers)}) for _ in operations
+                ])
+
+        return batch_response(answers[:self.answered])
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.server = _BatchServer()
+        self.api = connect(CommonAPI, self.server)
+        invalidate = mock.patch.object(self.api, '_invalidate')
+        self.invalidate = invalidate.start()
+        self.addCleanup(invalidate.stop)
+
+    def test_encode_request(self):
+
+        part = encode_request('POST', 'http://host/Part', {'name': 'a'})
+
+        self.assertEqual(
+            part,
+            b"Content-Type: application/http\r\n\r\n"
+            b"POST http://host/Part HTTP/1.1\r\n"
+            b"Content-Type: application/json\r\n\r\n"
+            b'{"name": "a"}'
+        )
+
+    def test_encode_multipart(self):
+
+        self.assertEqual(
+            encode_multipart('b', [b'one', b'two']),
+            b"--b\r\none\r\n--b\r\ntwo\r\n--b--"
+        )
+
+    def test_results_in_add_order(self):
+
+        batch = Batch(self.api, max_operations=2)
+
+        for i in range(5):
+            batch.post('Part', {'item_number': str(i)})
+
+        results = batch.execute()
+
+        self.assertEqual(len(self.server.bodies), 3)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result.status_code == 201 for result in results))
+        self.assertEqual(
+            [result.json()['n'] for result in results], [0, 1, 0, 1, 0]
+        )
+
+    def test_changeset_not_split(self):
+
+        batch = Batch(self.api, max_operations=2)
+
+        batch.post('Part', {'item_number': '1'})
+        with batch.changeset():
+            batch.patch("Part('A')", {'name': 'a'})
+            batch.patch("Part('B')", {'name': 'b'})
+
+        results = batch.execute()
+
+        self.assertEqual(len(self.server.bodies), 2)
+        self.assertEqual(
+            [result.status_code for result in results], [201, 201, 201]
+        )
+        self.assertEqual(
+            self.invalidate.call_args_list,
+            [mock.call('Part', 'A'), mock.call('Part', 'B')]
+        )
+
+    def test_failed_changeset_reported_per_operation(self):
+
+        with Batch(self.api) as batch:
+            with batch.changeset():
+                batch.patch("Part('A')", {'name': 'a'})
+                batch.delete("Part('B')")
+            batch.post('Part', {'item_number': '1'})
+
+        self.assertEqual(
+            [result.ok for result in batch.results], [False, False, True]
+        )
+
+    def test_max_bytes(self):
+
+        batch = Batch(self.api, max_bytes=300)
+
+        for i in range(3):
+            batch.post('Part', {'description': 'x' * 150})
+
+        batch.execute()
+
+        self.assertEqual(len(self.server.bodies), 3)
+
+    def test_connection_error_reported_and_not_resent(self):
+
+        self.server.offline_at = 1
+        batch = Batch(self.api, max_operations=2)
+
+        for i in range(5):
+            batch.post('Part', {'item_number': str(i)})
+        batch.patch("Part('A')", {'name': 'a'})
+
+        results = batch.execute()
+
+        self.assertEqual([result.ok for result in results],
+                         [True, True, False, False, True, True])
+        self.assertIsNone(results[2].status_code)
+        self.assertIsInstance(results[3].error, requests.ConnectionError)
+        self.assertEqual(len(self.server.bodies), 3)
+        self.assertEqual(self.invalidate.call_args_list,
+                         [mock.call('Part', 'A')])
+
+        # nothing is left to send again
+        self.assertEqual(len(batch), 0)
+        self.assertEqual(batch.execute(), [])
+        self.assertEqual(len(self.server.bodies), 3)
+
+    def test_unanswered_operations_fail(self):
+
+        self.server.answered = 2
+        batch = Batch(self.api)
+
+        for i in range(4):
+            batch.post('Part', {'item_number': str(i)})
+
+        results = batch.execute()
+
+        self.assertEqual([result.status_code for result in results],
+                         [201, 201, None, None])
+        self.assertEqual([result.ok for result in results],
+                         [True, True, False, False])
+        self.assertEqual(
+            self.server.item_requests()[0][2]['Prefer'],
+            'odata.continue-on-error'
+        )
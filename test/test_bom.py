@@ -0,0 +1,105 @@
+from src.api.bom import BOMGraph
+import unittest
+
+
+# A uses 2 B and 1 C; B and C share the subassembly D
+LINES = [
+    ('A', 'B', 2),
+    ('A', 'C', '1'),
+    ('B', 'D', 3),
+    ('B', 'E', None),
+    ('C', 'D', 4),
+    ('D', 'F', 0.5)
+]
+
+
+class TestBOMGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.graph = BOMGraph.from_lines(LINES)
+
+    def rollup(self, root, quantity=1.0):
+        total = self.graph.rollup(root, quantity)
+
+        return {
+            part_id: total[n] for n, part_id in enumerate(self.graph.ids)
+            if total[n]
+        }
+
+    def test_rollup(self):
+
+        self.assertEqual(self.rollup('A'), {
+            'A': 1, 'B': 2, 'C': 1, 'D': 10, 'E': 2, 'F': 5
+        })
+        self.assertEqual(self.rollup('B', 2), {
+            'B': 2, 'D': 6, 'E': 2, 'F': 3
+        })
+
+    def test_levels(self):
+
+        levels = dict(zip(self.graph.ids, self.graph.levels('B')))
+
+        self.assertEqual(levels, {
+            'A': -1, 'B': 0, 'C': -1, 'D': 1, 'E': 1, 'F': 2
+        })
+
+        levels = dict(zip(self.graph.ids, self.graph.levels()))
+
+        self.assertEqual(levels['D'], 2)
+        self.assertEqual(levels['F'], 3)
+
+    def test_flatten(self):
+
+        self.assertEqual(self.graph.flatten('A'), [
+            ('B', 1, 2.0), ('C', 1, 1.0), ('D', 2, 10.0), ('E', 2, 2.0),
+            ('F', 3, 5.0)
+        ])
+        self.assertEqual(self.graph.children_of('A'),
+                         [('B', 2.0), ('C', 1.0)])
+
+    def test_cycles(self):
+
+        graph = BOMGraph.from_lines([('A', 'B', 1), ('B', 'A', 1)])
+
+        with self.assertRaises(ValueError):
+            graph.rollup('A')
+
+        graph = BOMGraph.from_lines(
+            [('X', 'A', 1), ('A', 'B', 1), ('B', 'A', 1)]
+        )
+
+        with self.assertRaises(ValueError):
+            graph.levels()
+
+        with self.assertRaises(ValueError):
+            self.graph.rollup('MISSING')
+
+    def test_from_structure(self):
+
+        def row(child_id, quantity):
+            return {'related_id': {'id': child_id}, 'quantity': quantity}
+
+        structure = {
+            'A': {'bom': [row('B', '2'), row('C', None)]},
+            'B': {'bom': [row('D', '3')]},
+            'C': {'bom': []},
+            'D': {'bom': None}
+        }
+
+        graph = BOMGraph.from_structure(structure)
+
+        self.assertEqual(len(graph), 4)
+        self.assertEqual(list(graph.rollup('A')), [1.0, 2.0, 1.0, 6.0])
+
+    def test_deep_chain(self):
+
+        graph = BOMGraph.from_lines(
+            (f"P{n}", f"P{n + 1}", 2) for n in range(60)
+        )
+
+        self.assertEqual(graph.rollup('P0')[graph.index('P60')], 2.0 ** 60)
+        self.assertEqual(graph.levels('P0').max(), 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
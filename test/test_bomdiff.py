@@ -0,0 +1,132 @@
+from src.api.bomdiff import BOMChange, BOMSnapshot, diff_boms
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def _row(bom_id, part_id, item_number, quantity, name=None):
+    return {
+        'id': bom_id,
+        'quantity': quantity,
+        'related_id': {
+            'id': part_id, 'item_number': item_number, 'name': name
+        }
+    }
+
+
+# 100 uses two of 1 and one of 2; 1 uses four of 1.1
+STRUCTURE = {
+    'P100': {'depth': 0, 'bom': [
+        _row('R1', 'P1', '1', '2', 'Bracket'),
+        _row('R2', 'P2', '2', '1', 'Plate')
+    ]},
+    'P1': {'depth': 1, 'bom': [_row('R3', 'P11', '1.1', '4', 'Bolt')]},
+    'P2': {'depth': 1, 'bom': []},
+    'P11': {'depth': 2, 'bom': []}
+}
+
+
+class TestBOMDiff(unittest.TestCase):
+
+    def setUp(self):
+        self.aras = BOMSnapshot.from_structure(STRUCTURE, '100')
+
+    def test_snapshot_from_structure(self):
+
+        self.assertEqual(self.aras.lines, {
+            ('100', '1'): 2.0, ('100', '2'): 1.0, ('1', '1.1'): 4.0
+        })
+        self.assertEqual(self.aras.part_ids['100'], 'P100')
+        self.assertEqual(self.aras.line_ids[('1', '1.1')], 'R3')
+        self.assertEqual(self.aras.parts['1.1'], {'name': 'Bolt'})
+
+    def test_spreadsheet_matching_aras_has_no_changes(self):
+
+        sheet = BOMSnapshot.from_dataframe({
+            'ITEM NO.': [1, '1.1', 2.0],
+            'PART NUMBER': ['Bracket', 'Bolt', 'Plate'],
+            'QTY.': [2, 4, float('nan')]
+        }, '100')
+
+        self.assertEqual(diff_boms(self.aras, sheet), [])
+
+    def test_minimal_changes(self):
+
+        sheet = BOMSnapshot.from_dataframe({
+            'ITEM NO.': ['1', '1.1', '1.2', '3'],
+            'PART NUMBER': ['Bracket', 'Bolt', 'Washer', 'Cover'],
+            'QTY.': [2, 6, 6, 1]
+        }, '100')
+
+        self.assertEqual(diff_boms(self.aras, sheet), [
+            BOMChange('create', '1.2', attributes={'name': 'Washer'}),
+            BOMChange('create', '3', attributes={'name': 'Cover'}),
+            BOMChange('link', parent='1', child='1.2', quantity=6.0),
+            BOMChange('link', parent='100', child='3', quantity=1.0),
+            BOMChange('quantity', parent='1', child='1.1', quantity=6.0,
+                      previous=4.0, aras_id='R3'),
+            BOMChange('unlink', parent='100', child='2', quantity=1.0,
+                      aras_id='R2'),
+            BOMChange('delete', '2', aras_id='P2')
+        ])
+
+    def test_item_numbers_keep_trailing_zeros(self):
+
+        sheet = BOMSnapshot.from_dataframe({
+            'ITEM NO.': ['1', '1.1', '1.10', '1.10.1'],
+            'PART NUMBER': ['Bracket', 'Bolt', 'Nut', 'Washer'],
+            'QTY.': [1, 1, 2, 3]
+        }, '100')
+
+        self.assertEqual(
+            sorted(sheet.lines),
+            [('1', '1.1'), ('1', '1.10'), ('1.10', '1.10.1'), ('100', '1')]
+        )
+
+        with self.assertRaises(ValueError):
+            BOMSnapshot.from_dataframe({
+                'ITEM NO.': [1, 1.1, 1.1],
+                'PART NUMBER': ['Bracket', 'Bolt', 'Nut'],
+                'QTY.': [1, 1, 2]
+            }, '100')
+
+    def test_attribute_updates(self):
+
+        renamed = BOMSnapshot.from_assembly('100', {'value': [
+            _row('R1', 'P1', '1', '2', 'Bracket, machined')
+        ]})
+        renamed.add_line('100', '2', 1)
+        renamed.add_line('1', '1.1', 4)
+
+        self.assertEqual(diff_boms(self.aras, renamed), [
+            BOMChange('update', '1', attributes={'name': 'Bracket, machined'},
+                      aras_id='P1')
+        ])
+
+    def test_snapshot_round_trip(self):
+
+        directory = tempfile.mkdtemp()
+
+        try:
+            path = os.path.join(directory, 'snapshot.json')
+            self.aras.save(path)
+            loaded = BOMSnapshot.load(path)
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual(diff_boms(self.aras, loaded), [])
+        self.assertEqual(loaded.line_ids, self.aras.line_ids)
+        self.assertEqual(loaded.part_ids, self.aras.part_ids)
+
+    def test_repeated_lines_add_up(self):
+
+        snapshot = BOMSnapshot('A')
+        snapshot.add_line('A', 'B', 2)
+        snapshot.add_line('A', 'B', '3')
+
+        self.assertEqual(snapshot.lines, {('A', 'B'): 5.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+from src.api.cache import ResponseCache
+import time
+import unittest
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ResponseCache(maxsize=2, ttl=60)
+
+    def test_hit_and_miss(self):
+
+        self.assertIsNone(self.cache.lookup('a'))
+
+        self.cache.store('a', b'{"id": "A"}', tags=[('Part', 'A')])
+
+        self.assertEqual(self.cache.lookup('a'), (b'{"id": "A"}', None, True))
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_lru_eviction(self):
+
+        self.cache.store('a', b'1')
+        self.cache.store('b', b'2')
+        self.cache.lookup('a')
+        self.cache.store('c', b'3')
+
+        self.assertIsNotNone(self.cache.lookup('a'))
+        self.assertIsNone(self.cache.lookup('b'))
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_invalidate_by_tag(self):
+
+        self.cache.store('part', b'1', tags=[('Part', 'A')])
+        self.cache.store('bom', b'2', tags=[('Part', 'B'), ('Part', 'A')])
+
+        self.cache.invalidate('Part', 'A')
+
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.stats()['invalidations'], 2)
+
+    def test_stale_entry_revalidated(self):
+
+        cache = ResponseCache(ttl=0.01)
+        cache.store('a', b'1', etag='"v1"')
+
+        time.sleep(0.02)
+
+        self.assertEqual(cache.lookup('a'), (b'1', '"v1"', False))
+        self.assertEqual(cache.revalidated('a'), b'1')
+        self.assertEqual(cache.lookup('a')[2], True)
+        self.assertEqual(cache.stats()['revalidations'], 1)
@@ -0,0 +1,104 @@
+from fakes import BASE_URL, FakeResponse, FakeServer
+from src.api.auth import TokenStore
+from src.api.client import ArasClient
+from src.api.policy import RetryPolicy
+from unittest import mock
+import hashlib
+import unittest
+
+
+class _ItemServer(FakeServer):
+    """
+    Answers every item request with an empty listing.
+    """
+    def handle(self, method, url, headers, data, **kwargs):
+        return FakeResponse(200, {'value': []})
+
+
+class TestArasClient(unittest.TestCase):
+
+    def setUp(self):
+        self.server = _ItemServer()
+        self.store = TokenStore()
+
+    def connect(self, password_hash=None):
+        with mock.patch.object(ArasClient, '_build_session',
+                               return_value=self.server):
+            return ArasClient(BASE_URL, 'client', 'db', 'user',
+                              password_hash, token_store=self.store,
+                              retry=RetryPolicy(total=0))
+
+    def test_views_share_one_login(self):
+
+        client = self.connect(hashlib.md5(b'password'))
+
+        client.parts.get_parts_list()
+        client.files.get_file_list()
+        client.documents.get_document_list()
+        client.airworthiness.get_aw_parameter_list()
+
+        self.assertEqual(self.server.grants, ['password'])
+        self.assertEqual(
+            {request[2]['Authorization']
+             for request in self.server.item_requests()},
+            {'Bearer token-1'}
+        )
+
+        for view in (client.parts, client.files, client.documents,
+                     client.airworthiness):
+            self.assertIs(view._connection, client._connection)
+            self.assertIs(view._session, self.server)
+
+    def test_password_prompted_once(self):
+
+        key = TokenStore.make_key(BASE_URL, 'db', 'client', 'user')
+        self.store.set_token(key, {'access_token': 'cached',
+                                   'expires_in': 3600})
+        self.server.password = 'secret'
+
+        with mock.patch('src.api.common.getpass.getpass',
+                        return_value='secret') as prompt:
+            # starts from the cached token, nothing is prompted yet
+            client = self.connect()
+            prompt.assert_not_called()
+
+            # each view has to log in again with the password
+            self.server.refresh_ok = False
+            self.server.revoked.add('cached')
+            client.parts.get_parts_list()
+
+            self.server.revoked.add('token-1')
+            client.files.get_file_list()
+
+        self.assertEqual(prompt.call_count, 1)
+        self.assertEqual(self.server.grants, ['password', 'password'])
+
+    def test_metrics_shared(self):
+
+        client = self.connect(hashlib.md5(b'password'))
+
+        client.parts.get_parts_list()
+        self.server.revoked.add('token-1')
+        client.files.get_file_list()
+
+        self.assertIs(client.parts.metrics, client.metrics)
+        self.assertEqual(client.metrics.snapshot(), {
+            'requests': 3,
+            'retries': 0,
+            'reauthentications': 1,
+            'errors': 0,
+            'statuses': {200: 2, 401: 1}
+        })
+
+    def test_close_closes_shared_session(self):
+
+        client = self.connect(hashlib.md5(b'password'))
+
+        with client:
+            client.parts.get_parts_list()
+
+        self.assertTrue(self.server.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+from fakes import BASE_URL, FakeResponse, FakeServer, connect, parse_url
+from src.api.common import CommonAPI
+from src.api.parts import PartsAPI
+from unittest import mock
+import unittest
+
+
+PARTS = [{'id': f"P{n}", 'name': f"part {n % 2}"} for n in range(5)]
+
+
+class _ListingServer(FakeServer):
+    """
+    Lists PARTS with $top and $skip. With server_page set the client's
+    paging is ignored and pages of that size are chained with nextLinks
+    instead. The query options of every listing are kept in listings.
+    """
+    def __init__(self, server_page=None):
+        super().__init__()
+        self.server_page = server_page
+        self.listings = []
+
+    def handle(self, method, url, headers, data, **kwargs):
+        _, params = parse_url(url)
+        self.listings.append(params)
+
+        if self.server_page is None:
+            return self.page(PARTS, params)
+
+        start = int(params.get('$skiptoken', 0))
+        end = start + self.server_page
+        page = {'value': PARTS[start:end]}
+
+        if end < len(PARTS):
+            page['@odata.nextLink'] = (
+                f"{BASE_URL}/server/odata/Part?$skiptoken={end}"
+            )
+
+        return FakeResponse(200, page)
+
+
+class TestSession(unittest.TestCase):
+
+    def test_requests_share_session(self):
+
+        server = _ListingServer()
+        api = connect(PartsAPI, server)
+
+        api.get_parts_list()
+        api._request("GET", f"{BASE_URL}/server/odata/Part",
+                     headers={'Prefer': 'odata.maxpagesize=1'})
+
+        requests = server.item_requests()
+
+        self.assertEqual(len(requests), 2)
+        for _, _, headers in requests:
+            self.assertEqual(headers['Authorization'], 'Bearer token-1')
+        self.assertEqual(requests[1][2]['Prefer'], 'odata.maxpagesize=1')
+
+    def test_close_closes_session(self):
+
+        server = _ListingServer()
+
+        with connect(PartsAPI, server):
+            self.assertFalse(server.closed)
+
+        self.assertTrue(server.closed)
+
+    def test_pool_limits(self):
+
+        session = CommonAPI._build_session(pool_connections=2,
+                                           pool_maxsize=4, pool_block=True)
+        adapter = session.get_adapter(BASE_URL)
+
+        self.assertEqual(adapter._pool_connections, 2)
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertTrue(adapter._pool_block)
+        self.assertIs(session.get_adapter('https://host/'), adapter)
+
+        session.close()
+
+    def test_invalid_pool_limits(self):
+
+        server = _ListingServer()
+
+        with self.assertRaises(ValueError):
+            connect(PartsAPI, server, pool_connections=0)
+
+        with self.assertRaises(ValueError):
+            connect(PartsAPI, server, pool_maxsize=0)
+
+
+class TestPaging(unittest.TestCase):
+
+    def test_skip_advances_by_page(self):
+
+        for stream in (False, True):
+            server = _ListingServer()
+            api = connect(PartsAPI, server)
+
+            self.assertEqual(
+                list(api.iter_parts(page_size=2, stream=stream)), PARTS
+            )
+            self.assertEqual(
+                [(params['$top'], params['$skip'])
+                 for params in server.listings],
+                [('2', '0'), ('2', '2'), ('2', '4')]
+            )
+
+    def test_full_last_page_ends_on_empty_page(self):
+
+        server = _ListingServer()
+        api = connect(PartsAPI, server)
+
+        self.assertEqual(list(api.iter_parts(page_size=5)), PARTS)
+        self.assertEqual([params['$skip'] for params in server.listings],
+                         ['0', '5'])
+
+    def test_next_link_followed(self):
+
+        server = _ListingServer(server_page=2)
+        api = connect(PartsAPI, server)
+
+        self.assertEqual(list(api.iter_parts(page_size=100)), PARTS)
+        self.assertEqual(server.listings[1:],
+                         [{'$skiptoken': '2'}, {'$skiptoken': '4'}])
+
+    def test_order_ends_on_id(self):
+
+        server = _ListingServer()
+        api = connect(PartsAPI, server)
+
+        for order, sent in [(None, 'id'),
+                            ('name desc', 'name desc,id'),
+                            ('name,id desc', 'name,id desc')]:
+            params = {'$orderby': order} if order is not None else None
+            list(api._iter_items('Part', params=params))
+
+            self.assertEqual(server.listings[-1]['$orderby'], sent)
+
+
+class TestSend(unittest.TestCase):
+
+    def test_headers_sent_without_copy(self):
+
+        server = _ListingServer()
+        api = connect(CommonAPI, server)
+        headers = {'Content-Range': 'bytes 0-9/10'}
+
+        with mock.patch.object(server, 'request',
+                               wraps=server.request) as request:
+            api._request("GET", f"{BASE_URL}/server/odata/Part",
+                         headers=headers)
+            api._request("GET", f"{BASE_URL}/server/odata/Part",
+                         headers=headers)
+
+        self.assertEqual(headers['Authorization'], 'Bearer token-1')
+        for call in request.call_args_list:
+            self.assertIs(call.kwargs['headers'], headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+from src.api.parts import PartsAPI
+from fakes import (
+    BASE_URL, FakeServer, batch_response, connect, http_part, read_batch
+)
+import requests
+import unittest
+
+
+class _PartServer(FakeServer):
+    """
+    Answers $batch requests by creating each posted Part, with an id
+    derived from its item number. Parts named 'reject' fail with a 400,
+    parts named 'bare' are answered with an empty 204 that names the new
+    part in its OData-EntityId header, parts named 'anonymous' are
+    answered without an id and batches containing a part named 'offline'
+    lose the connection. The reply to a batch stops before the first part
+    named 'dropped'.
+    """
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def handle(self, method, url, headers, data, **kwargs):
+        bodies = [
+            operations[0][2] for _, operations in read_batch(headers, data)
+        ]
+
+        with self.lock:
+            self.batches.append(len(bodies))
+
+        if any(body.get('name') == 'offline' for body in bodies):
+            raise requests.ConnectionError("connection reset")
+
+        names = [body.get('name') for body in bodies]
+        answered = names.index('dropped') if 'dropped' in names else None
+
+        return batch_response(
+            [self.answer(body) for body in bodies[:answered]]
+        )
+
+    @staticmethod
+    def answer(body):
+        part_id = f"ID{body['item_number']}"
+
+        if body.get('name') == 'reject':
+            return http_part(400, {'error': 'rejected'})
+
+        if body.get('name') == 'anonymous':
+            return http_part(201, {})
+
+        if body.get('name') == 'bare':
+            return http_part(204, headers={
+                'OData-EntityId': f"{BASE_URL}/server/odata/Part('{part_id}')"
+            })
+
+        return http_part(201, {'id': part_id})
+
+
+class TestCreateParts(unittest.TestCase):
+
+    def setUp(self):
+        self.server = _PartServer()
+        self.api = connect(PartsAPI, self.server)
+
+    def test_creates_in_batches_in_order(self):
+
+        records = ({'item_number': str(n)} for n in range(25))
+
+        results = list(self.api.create_parts(records, batch_size=10,
+                                             workers=2))
+
+        self.assertEqual(sorted(self.server.batches), [5, 10, 10])
+        self.assertEqual([result.index for result in results], list(range(25)))
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(results[7].id, 'ID7')
+        self.assertEqual(results[7].status_code, 201)
+
+    def test_failures_are_reported_per_record(self):
+
+        records = [
+            {'item_number': '1'},
+            {'item_number': '2', 'colour': 'red'},
+            'not a part',
+            {'item_number': '4', 'name': 'reject'},
+            {'item_number': '5'},
+            {'item_number': '6', 'name': 'offline'},
+            {'item_number': '7'}
+        ]
+
+        results = list(self.api.create_parts(records, batch_size=5))
+
+        self.assertEqual([result.ok for result in results],
+                         [True, False, False, False, True, False, False])
+        # invalid records are never sent
+        self.assertEqual(sorted(self.server.batches), [2, 3])
+        self.assertIsInstance(results[1].error, RuntimeError)
+        self.assertIsInstance(results[2].error, ValueError)
+        self.assertIsNone(results[2].status_code)
+        self.assertEqual(results[3].status_code, 400)
+        self.assertIsInstance(results[6].error, requests.ConnectionError)
+
+    def test_created_without_body(self):
+
+        records = [
+            {'item_number': '1', 'name': 'bare'},
+            {'item_number': '2'}
+        ]
+
+        results = list(self.api.create_parts(records))
+
+        self.assertEqual([result.ok for result in results], [True, True])
+        self.assertEqual(results[0].status_code, 204)
+        self.assertEqual([result.id for result in results], ['ID1', 'ID2'])
+
+    def test_partial_reply(self):
+
+        records = [
+            {'item_number': '1'},
+            {'item_number': '2', 'name': 'anonymous'},
+            {'item_number': '3', 'name': 'dropped'},
+            {'item_number': '4'}
+        ]
+
+        results = list(self.api.create_parts(records))
+
+        self.assertEqual([result.ok for result in results],
+                         [True, False, False, False])
+        self.assertEqual([result.id for result in results],
+                         ['ID1', None, None, None])
+        self.assertEqual(results[1].status_code, 201)
+        self.assertIsInstance(results[1].error, ValueError)
+        self.assertIsNone(results[3].status_code)
+        self.assertIsInstance(results[3].error, ValueError)
+
+    def test_unencodable_record_fails_alone(self):
+
+        records = [
+            {'item_number': '1', 'description': object()},
+            {'item_number': '2'}
+        ]
+
+        results = list(self.api.create_parts(records))
+
+        self.assertEqual([result.ok for result in results], [False, True])
+        self.assertIsInstance(results[0].error, TypeError)
+        self.assertEqual(self.server.batches, [1])
+
+    def test_large_records_share_one_request(self):
+
+        records = [
+            {'item_number': str(n), 'description': 'x' * 3 * 1024 * 1024}
+            for n in range(2)
+        ]
+
+        results = list(self.api.create_parts(records, batch_size=2))
+
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(self.server.batches, [2])
+
+    def test_invalid_arguments(self):
+
+        with self.assertRaises(ValueError):
+            self.api.create_parts([], batch_size=0)
+
+        with self.assertRaises(ValueError):
+            self.api.create_parts([], workers=0)
+
+        self.assertEqual(list(self.api.create_parts([])), [])
+
+    def test_create_part_validation(self):
+
+        with self.assertRaises(RuntimeError):
+            self.api.create_part({'item_number': '1', 'colour': 'red'})
+
+        with self.assertRaises(RuntimeError):
+            self.api.update_part('ID1', {'related_id': 'ID2'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,225 @@
+from fakes import FakeResponse, FakeServer, connect, parse_url
+from src.api.files import FilesAPI
+from src.api.transfer import TransferStats
+import hashlib
+import io
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+
+class _Vault(FakeServer):
+    """
+    Vault serving File content from memory, under the filename in names
+    or "<id>.step". With ranges unset it ignores Range headers; corrupt
+    flips the first byte of every response. The headers of every content
+    request are kept in content_requests.
+    """
+
+    def __init__(self, files, ranges=True, corrupt=False, names=None):
+        super().__init__()
+        self.files = files
+        self.names = names or {}
+        self.ranges = ranges
+        self.corrupt = corrupt
+        self.content_requests = []
+
+    def handle(self, method, url, headers, data, **kwargs):
+        path, _ = parse_url(url)
+        file_id, value = re.search(r"File\('(\w+)'\)(/\$value)?$",
+                                   path).groups()
+
+        if file_id not in self.files:
+            return FakeResponse(404, {'error': {'code': 'NotFound'}})
+
+        content = self.files[file_id]
+
+        if value is None:
+            name = self.names.get(file_id, f"{file_id}.step")
+
+            return FakeResponse(200, {
+                'id': file_id,
+                'filename': name,
+                'file_size': len(content),
+                'checksum': hashlib.md5(content).hexdigest().upper()
+            })
+
+        with self.lock:
+            self.content_requests.append(headers)
+
+        if self.corrupt:
+            content = bytes([content[0] ^ 1]) + content[1:]
+
+        if self.ranges and 'Range' in headers:
+            start, end = map(int, re.match(
+                r'bytes=(\d+)-(\d+)', headers['Range']
+            ).groups())
+
+            return FakeResponse(206, content=content[start:end + 1])
+
+        return FakeResponse(200, content=content)
+
+
+class TestDownload(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.content = os.urandom(100003)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_parallel_ranges_to_directory(self):
+
+        vault = _Vault({'F1': self.content})
+        api = connect(FilesAPI, vault)
+
+        path = api.download_file('F1', self.directory, workers=4,
+                                 range_size=8192)
+
+        self.assertEqual(path, os.path.join(self.directory, 'F1.step'))
+
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+        self.assertEqual(len(vault.content_requests),
+                         -(-len(self.content) // 8192))
+        self.assertEqual(os.listdir(self.directory), ['F1.step'])
+
+    def test_stats(self):
+
+        vault = _Vault({'F1': self.content})
+        api = connect(FilesAPI, vault)
+        stats = TransferStats()
+
+        api.download_file('F1', self.directory, workers=4, range_size=8192,
+                          stats=stats)
+
+        self.assertEqual(stats.bytes_transferred, len(self.content))
+        self.assertEqual(stats.chunk_sizes[0], 8192)
+        self.assertEqual(set(stats.phases), {'metadata', 'content', 'verify'})
+        self.assertGreater(stats.mb_per_second, 0)
+
+    def test_stream_to_file_object(self):
+
+        vault = _Vault({'F1': self.content})
+        api = connect(FilesAPI, vault)
+        buffer = io.BytesIO()
+
+        api.download_file('F1', buffer, range_size=8192)
+
+        self.assertEqual(buffer.getvalue(), self.content)
+
+    def test_server_without_range_support(self):
+
+        vault = _Vault({'F1': self.content}, ranges=False)
+        api = connect(FilesAPI, vault)
+
+        path = api.download_file('F1', self.directory, range_size=8192)
+
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+        self.assertEqual(len(vault.content_requests), 1)
+
+    def test_checksum_mismatch_leaves_no_file(self):
+
+        vault = _Vault({'F1': self.content}, corrupt=True)
+        api = connect(FilesAPI, vault)
+
+        with self.assertRaises(ValueError):
+            api.download_file('F1', self.directory, range_size=8192)
+
+        self.assertEqual(os.listdir(self.directory), [])
+
+        path = api.download_file('F1', self.directory, range_size=8192,
+                                 verify=False)
+
+        self.assertTrue(os.path.exists(path))
+
+    def test_empty_file(self):
+
+        vault = _Vault({'F1': b''})
+        api = connect(FilesAPI, vault)
+        path = api.download_file('F1', self.directory)
+
+        self.assertEqual(os.path.getsize(path), 0)
+
+    def test_download_files(self):
+
+        files = {f"F{n}": os.urandom(1000 * n + 1) for n in range(1, 6)}
+        vault = _Vault(files)
+        api = connect(FilesAPI, vault)
+
+        results = api.download_files(list(files) + ['MISSING'],
+                                     self.directory, workers=3,
+                                     range_size=1024)
+
+        self.assertEqual([result.ok for result in results],
+                         [True] * 5 + [False])
+
+        for result in results[:5]:
+            with open(result.path, 'rb') as f:
+                self.assertEqual(f.read(), files[result.file_id])
+
+    def test_download_files_stats(self):
+
+        files = {f"F{n}": os.urandom(1000 * n + 1) for n in range(1, 4)}
+        api = connect(FilesAPI, _Vault(files))
+        stats = TransferStats()
+
+        api.download_files(list(files), self.directory, workers=3,
+                           range_size=1024, stats=stats)
+
+        self.assertEqual(stats.file_size, 6003)
+        self.assertEqual(stats.bytes_transferred, 6003)
+        self.assertEqual(stats.progress, 1.0)
+        self.assertEqual(set(stats.phases), {'metadata', 'content', 'verify'})
+        self.assertIsNotNone(stats.finished)
+
+    def test_download_files_shared_names(self):
+
+        files = {'F1': b'one', 'F2': b'two', 'F3': b'three'}
+        vault = _Vault(files, names={'F1': 'a.step', 'F2': 'a.step'})
+        api = connect(FilesAPI, vault)
+
+        results = api.download_files(['F1', 'F2', 'F3', 'F1'],
+                                     self.directory)
+
+        self.assertEqual(
+            [os.path.basename(result.path) for result in results],
+            ['a.step', 'a (2).step', 'F3.step', 'a.step']
+        )
+        self.assertIs(results[0], results[3])
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['F3.step', 'a (2).step', 'a.step'])
+
+        with open(results[1].path, 'rb') as f:
+            self.assertEqual(f.read(), b'two')
+
+    def test_filename_cannot_leave_directory(self):
+
+        target = os.path.join(self.directory, 'target')
+        os.mkdir(target)
+
+        vault = _Vault({'F1': b'one', 'F2': b'two', 'F3': b'three'}, names={
+            'F1': '../escaped.step',
+            'F2': os.path.join(self.directory, 'absolute.step'),
+            'F3': '..'
+        })
+        api = connect(FilesAPI, vault)
+
+        results = api.download_files(['F1', 'F2', 'F3'], target)
+
+        self.assertEqual([result.ok for result in results],
+                         [True, True, False])
+        self.assertIsInstance(results[2].error, ValueError)
+        self.assertEqual(sorted(os.listdir(target)),
+                         ['absolute.step', 'escaped.step'])
+        self.assertEqual(sorted(os.listdir(self.directory)), ['target'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,241 @@
+from src.api.common import CommonAPI
+from src.api.policy import (
+    CircuitBreaker, CircuitOpenError, RateLimiter, RetryPolicy
+)
+from fakes import BASE_URL, FakeResponse, FakeServer, connect
+from email.utils import formatdate
+from unittest import mock
+import requests
+import time
+import unittest
+
+
+class _ScriptedServer(FakeServer):
+    """
+    Answers item requests with the outcomes in script, in order. An
+    exception in the script is raised instead of answering.
+    """
+    def __init__(self, *script):
+        super().__init__()
+        self.script = list(script)
+
+    def handle(self, method, url, headers, data, **kwargs):
+        outcome = self.script.pop(0)
+
+        if isinstance(outcome, BaseException):
+            raise outcome
+
+        return outcome
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = RetryPolicy(total=2, backoff_factor=1, jitter=False)
+
+    def test_idempotent_verbs_retried(self):
+
+        self.assertTrue(self.policy.should_retry('GET', 0, 503))
+        self.assertTrue(self.policy.should_retry('DELETE', 1, None))
+        self.assertFalse(self.policy.should_retry('GET', 0, 404))
+        self.assertFalse(self.policy.should_retry('GET', 2, 503))
+
+    def test_non_idempotent_verbs(self):
+
+        self.assertFalse(self.policy.should_retry('POST', 0, 503))
+        self.assertFalse(self.policy.should_retry('PATCH', 0, None))
+        self.assertTrue(self.policy.should_retry('POST', 0, 429))
+        self.assertTrue(
+            self.policy.should_retry('POST', 0, 503, idempotent=True)
+        )
+
+    def test_backoff(self):
+
+        self.assertEqual(self.policy.backoff(0), 1)
+        self.assertEqual(self.policy.backoff(3), 8)
+        self.assertEqual(self.policy.backoff(10), 30)
+        self.assertEqual(self.policy.backoff(0, retry_after='4'), 4)
+
+        retry_at = formatdate(time.time() + 10, usegmt=True)
+        self.assertAlmostEqual(
+            self.policy.backoff(0, retry_after=retry_at), 10, delta=1.5
+        )
+
+    def test_jitter_bounded(self):
+
+        policy = RetryPolicy(backoff_factor=1)
+
+        for _ in range(50):
+            self.assertTrue(0 <= policy.backoff(2) <= 4)
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_rate(self):
+
+        limiter = RateLimiter(rate=100, burst=1)
+
+        start = time.monotonic()
+        for _ in range(21):
+            limiter.acquire()
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+    def test_burst(self):
+
+        limiter = RateLimiter(rate=1, burst=5)
+
+        start = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+
+        self.assertLess(time.monotonic() - start, 0.1)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_and_recovers(self):
+
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0.05)
+
+        breaker.before_request()
+        breaker.record_failure()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_request()
+
+        time.sleep(0.06)
+        breaker.before_request()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+
+        # only the single trial request is let through
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_request()
+
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_failed_trial_reopens(self):
+
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0)
+
+        breaker.record_failure()
+        breaker.before_request()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+    def test_release_hands_trial_on(self):
+
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=60)
+
+        breaker.record_failure()
+        breaker.release()
+
+        # a closed or open circuit is left alone
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_request()
+
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0)
+
+        breaker.record_failure()
+        breaker.before_request()
+        breaker.recovery_timeout = 60
+        breaker.release()
+
+        breaker.before_request()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+
+
+class TestRequestPolicies(unittest.TestCase):
+    """
+    How CommonAPI._request applies the retry policy and circuit breaker.
+    """
+    url = f"{BASE_URL}/server/odata/Part"
+
+    def test_retry_after_honored(self):
+
+        server = _ScriptedServer(
+            FakeResponse(503, headers={'Retry-After': '7'}),
+            FakeResponse(200, {'value': []})
+        )
+        api = connect(CommonAPI, server, retry=RetryPolicy(total=2))
+
+        with mock.patch('src.api.common.time.sleep') as sleep:
+            response = api._request("GET", self.url)
+
+        self.assertEqual(response.status_code, 200)
+        sleep.assert_called_once_with(7.0)
+
+    def test_on_retry_per_retry(self):
+
+        server = _ScriptedServer(
+            requests.ConnectionError("reset"),
+            FakeResponse(502),
+            FakeResponse(200, {'value': []})
+        )
+        api = connect(CommonAPI, server,
+                      retry=RetryPolicy(total=3, jitter=False))
+        on_retry = mock.Mock()
+
+        with mock.patch('src.api.common.time.sleep') as sleep:
+            response = api._request("GET", self.url, on_retry=on_retry)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(on_retry.call_count, 2)
+        self.assertEqual(sleep.call_args_list,
+                         [mock.call(0.5), mock.call(1.0)])
+
+    def test_non_idempotent_not_retried(self):
+
+        server = _ScriptedServer(FakeResponse(502))
+        api = connect(CommonAPI, server, retry=RetryPolicy(total=3))
+        on_retry = mock.Mock()
+
+        with mock.patch('src.api.common.time.sleep') as sleep:
+            response = api._request("POST", self.url, on_retry=on_retry)
+
+        self.assertEqual(response.status_code, 502)
+        on_retry.assert_not_called()
+        sleep.assert_not_called()
+
+    def test_circuit_breaker_transitions(self):
+
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0.05)
+        server = _ScriptedServer(
+            FakeResponse(500),
+            requests.Timeout("timed out"),
+            requests.exceptions.ChunkedEncodingError("broken body"),
+            RuntimeError("interrupted"),
+            FakeResponse(200, {'value': []})
+        )
+        api = connect(CommonAPI, server, circuit_breaker=breaker)
+
+        self.assertEqual(api._request("GET", self.url).status_code, 500)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+        with self.assertRaises(requests.Timeout):
+            api._request("GET", self.url)
+
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            api._request("GET", self.url)
+
+        # a broken response to the trial request opens the circuit again
+        time.sleep(0.06)
+        with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+            api._request("GET", self.url)
+
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        # a trial ending without an outcome lets the next request try
+        time.sleep(0.06)
+        with self.assertRaises(RuntimeError):
+            api._request("GET", self.url)
+
+        self.assertEqual(api._request("GET", self.url).status_code, 200)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(server.script, [])
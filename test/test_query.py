@@ -0,0 +1,92 @@
+from src.api.query import Query, encode_params, literal
+import datetime
+import unittest
+
+
+class TestQuery(unittest.TestCase):
+
+    def setUp(self):
+        self.base_url = 'http://localhost/InnovatorServer'
+        self.query = Query(None, 'Part')
+
+    def test_literal(self):
+
+        self.assertEqual(literal("O'Ring"), "'O''Ring'")
+        self.assertEqual(literal(True), 'true')
+        self.assertEqual(literal(None), 'null')
+        self.assertEqual(literal(3), '3')
+        self.assertEqual(
+            literal(datetime.datetime(2024, 1, 2, 3, 4, 5)),
+            '2024-01-02T03:04:05'
+        )
+
+        with self.assertRaises(TypeError):
+            literal(object())
+
+    def test_filter_and_where(self):
+
+        query = self.query \
+            .filter(item_number='0403') \
+            .where('name', 'startswith', 'Cl') \
+            .where('quantity', 'gt', 2)
+
+        self.assertEqual(
+            query.params()['$filter'],
+            "item_number eq '0403' and startswith(name,'Cl') and "
+            "quantity gt 2"
+        )
+
+        with self.assertRaises(ValueError):
+            self.query.where('name', 'like', 'x')
+
+    def test_where_in(self):
+
+        query = self.query.where_in('id', ['A', 'B'])
+
+        self.assertEqual(query.params()['$filter'], "(id eq 'A' or id eq 'B')")
+
+    def test_builder_is_immutable(self):
+
+        base = self.query.filter(state='Released')
+        projected = base.select('id', 'name')
+
+        self.assertNotIn('$select', base.params())
+        self.assertEqual(projected.params()['$select'], 'id,name')
+
+    def test_params(self):
+
+        query = self.query \
+            .select('id') \
+            .orderby('item_number', descending=True) \
+            .expand('related_id') \
+            .top(10) \
+            .skip(20)
+
+        self.assertEqual(
+            query.params(),
+            {
+                '$select': 'id',
+                '$orderby': 'item_number desc',
+                '$expand': 'related_id',
+                '$top': 10,
+                '$skip': 20
+            }
+        )
+        self.assertNotIn('$top', query.params(paging=False))
+
+    def test_url_encoding(self):
+
+        query = Query(None, 'Part BOM').filter(name="a b&c")
+
+        self.assertEqual(
+            query.url(self.base_url),
+            "http://localhost/InnovatorServer/server/odata/Part BOM"
+            "?$filter=name%20eq%20'a%20b%26c'"
+        )
+
+    def test_encode_params(self):
+
+        self.assertEqual(
+            encode_params({'$orderby': 'id', '$top': 5}),
+            '$orderby=id&$top=5'
+        )
@@ -0,0 +1,60 @@
+from src.api.stream import JSONArrayStream
+import json
+import unittest
+
+
+class TestJSONArrayStream(unittest.TestCase):
+
+    def setUp(self):
+        self.document = {
+            '@odata.context': 'http://host/$metadata#Part',
+            'value': [
+                {'id': 'A', 'name': 'Bolt, "hex"', 'quantity': 12},
+                {'id': 'B', 'name': 'Washer é', 'related_id': {'id': 'C'}},
+                {'id': 'C', 'values': [1, 2.5, None, True]}
+            ],
+            '@odata.nextLink': 'http://host/Part?$skip=3'
+        }
+        self.body = json.dumps(self.document, ensure_ascii=False).encode()
+
+    def test_every_split_point(self):
+
+        for size in (1, 2, 3, 7, 64):
+            chunks = [
+                self.body[i:i + size] for i in range(0, len(self.body), size)
+            ]
+            stream = JSONArrayStream(chunks)
+
+            self.assertEqual(list(stream), self.document['value'])
+            self.assertEqual(
+                stream.metadata,
+                {
+                    '@odata.context': self.document['@odata.context'],
+                    '@odata.nextLink': self.document['@odata.nextLink']
+                }
+            )
+
+    def test_scalar_array(self):
+
+        body = b'{"value": [10, 200, 3000]}'
+        chunks = [body[i:i + 1] for i in range(len(body))]
+
+        self.assertEqual(list(JSONArrayStream(chunks)), [10, 200, 3000])
+
+    def test_empty(self):
+
+        self.assertEqual(list(JSONArrayStream([b'{"value": []}'])), [])
+        self.assertEqual(list(JSONArrayStream([b'{}'])), [])
+
+    def test_records_yielded_before_end_of_input(self):
+
+        def chunks():
+            yield b'{"value": [{"id": "A"},'
+            raise AssertionError("read past the first record")
+
+        self.assertEqual(next(iter(JSONArrayStream(chunks()))), {'id': 'A'})
+
+    def test_truncated(self):
+
+        with self.assertRaises(ValueError):
+            list(JSONArrayStream([b'{"value": [{"id": "A"}, {"id"']))
@@ -0,0 +1,146 @@
+from fakes import (
+    FakeResponse, FakeServer, connect, connect_async, parse_url, serve
+)
+from src.api.aio.parts import AsyncPartsAPI
+from src.api.parts import PartsAPI
+import asyncio
+import collections
+import re
+import time
+import unittest
+
+
+class _BOMServer(FakeServer):
+    """
+    Server answering assembly requests from a {part id: [child ids]} dict,
+    counting the requests per part and the most that were in flight at
+    once.
+    """
+
+    def __init__(self, bom, delay=0):
+        super().__init__()
+        self.bom = bom
+        self.delay = delay
+        self.assemblies = collections.Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def handle(self, method, url, headers, data, **kwargs):
+        path, _ = parse_url(url)
+        part_id = re.search(r"Part\('(\w+)'\)/Part BOM$", path).group(1)
+
+        with self.lock:
+            self.assemblies[part_id] += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        time.sleep(self.delay)
+
+        with self.lock:
+            self.in_flight -= 1
+
+        if part_id not in self.bom:
+            return FakeResponse(404, {'error': {'code': 'NotFound'}})
+
+        return FakeResponse(200, {'value': [
+            {'id': f"{part_id}-{child_id}", 'related_id': {'id': child_id}}
+            for child_id in self.bom[part_id]
+        ]})
+
+
+# A uses B twice and C; B and C share the subassembly D
+BOM = {
+    'A': ['B', 'C', 'B'],
+    'B': ['D', 'E'],
+    'C': ['D'],
+    'D': ['F'],
+    'E': [],
+    'F': []
+}
+
+
+class TestProductStructure(unittest.TestCase):
+
+    def test_structure(self):
+
+        server = _BOMServer(BOM)
+        api = connect(PartsAPI, server)
+        structure = api.get_product_structure('A')
+
+        self.assertEqual(set(structure), set(BOM))
+        self.assertEqual(structure['A']['children'], ['B', 'C', 'B'])
+        self.assertEqual(structure['D']['parents'], ['B', 'C'])
+        self.assertEqual(structure['D']['depth'], 2)
+        self.assertEqual(structure['F']['depth'], 3)
+        self.assertEqual(structure['E']['bom'], [])
+        self.assertEqual(set(server.assemblies.values()), {1})
+
+    def test_max_depth(self):
+
+        server = _BOMServer(BOM)
+        api = connect(PartsAPI, server)
+        structure = api.get_product_structure('A', max_depth=1)
+
+        self.assertEqual(set(structure), {'A', 'B', 'C'})
+        self.assertIsNone(structure['B']['bom'])
+        self.assertEqual(list(server.assemblies), ['A'])
+
+        structure = api.get_product_structure('A', max_depth=0)
+
+        self.assertEqual(structure, {'A': {
+            'depth': 0, 'parents': [], 'children': [], 'bom': None
+        }})
+
+    def test_levels_are_fetched_concurrently(self):
+
+        bom = {'A': [f"P{n}" for n in range(8)]}
+        bom.update({f"P{n}": [] for n in range(8)})
+
+        server = _BOMServer(bom, delay=0.05)
+        api = connect(PartsAPI, server)
+        api.get_product_structure('A', workers=8)
+
+        self.assertEqual(server.max_in_flight, 8)
+
+    def test_deep_and_cyclic_structures(self):
+
+        depth = 5000
+        bom = {f"P{n}": [f"P{n + 1}"] for n in range(depth)}
+        bom[f"P{depth}"] = ['P0']
+
+        server = _BOMServer(bom)
+        api = connect(PartsAPI, server)
+        structure = api.get_product_structure('P0')
+
+        self.assertEqual(len(structure), depth + 1)
+        self.assertEqual(structure[f"P{depth}"]['depth'], depth)
+        self.assertEqual(structure['P0']['parents'], [f"P{depth}"])
+
+    def test_unreadable_bom(self):
+
+        server = _BOMServer(BOM)
+        api = connect(PartsAPI, server)
+
+        with self.assertRaises(ValueError):
+            api.get_product_structure('MISSING')
+
+        with self.assertRaises(ValueError):
+            api.get_product_structure('A', max_depth=-1)
+
+    def test_async_structure(self):
+
+        expected = connect(PartsAPI, _BOMServer(BOM)).get_product_structure(
+            'A'
+        )
+        server = _BOMServer(BOM)
+
+        async def walk():
+            async with serve(server) as base_url:
+                async with connect_async(AsyncPartsAPI, base_url) as api:
+                    return await api.get_product_structure('A')
+
+        self.assertEqual(asyncio.run(walk()), expected)
+        self.assertEqual(set(server.assemblies.values()), {1})
+
+if __name__ == '__main__':
+    unittest.main()
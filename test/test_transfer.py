@@ -0,0 +1,361 @@
+from src.api.transfer import (
+    AdaptiveChunkSize, ContentIndex, SyncManifest, TransferStats,
+    UploadJournal, UploadStats,
+    file_digests, missing_ranges, scan_tree, upload_source
+)
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestAdaptiveChunkSize(unittest.TestCase):
+
+    def test_grows_on_fast_link(self):
+
+        sizer = AdaptiveChunkSize(initial=1000, minimum=500, maximum=10000)
+
+        # 1000 bytes in 1 ms is far below the one second target
+        sizer.record(1000, 0.001)
+        self.assertEqual(sizer.size, 2000)
+
+        for _ in range(10):
+            sizer.record(sizer.size, 0.001)
+
+        self.assertEqual(sizer.size, 10000)
+
+    def test_shrinks_on_slow_link(self):
+
+        sizer = AdaptiveChunkSize(initial=8000, minimum=500, maximum=10000)
+
+        sizer.record(8000, 4.0)
+        self.assertEqual(sizer.size, 4000)
+
+        sizer.record(4000, 2.0)
+        self.assertEqual(sizer.size, 2000)
+
+    def test_converges_on_target(self):
+
+        sizer = AdaptiveChunkSize(initial=1000, minimum=500, maximum=100000)
+
+        # link delivers 5000 bytes per second
+        for _ in range(10):
+            sizer.record(sizer.size, sizer.size / 5000)
+
+        self.assertEqual(sizer.size, 5000)
+
+    def test_ignores_short_tail_chunk(self):
+
+        sizer = AdaptiveChunkSize(initial=8000, minimum=500, maximum=10000)
+        sizer.record(100, 5.0)
+
+        self.assertEqual(sizer.size, 8000)
+
+    def test_failure_halves_down_to_minimum(self):
+
+        sizer = AdaptiveChunkSize(initial=2000, minimum=600, maximum=10000)
+
+        sizer.record_failure()
+        self.assertEqual(sizer.size, 1000)
+
+        sizer.record_failure()
+        self.assertEqual(sizer.size, 600)
+
+    def test_invalid_bounds(self):
+
+        with self.assertRaises(ValueError):
+            AdaptiveChunkSize(initial=100, minimum=500)
+
+        with self.assertRaises(ValueError):
+            AdaptiveChunkSize(growth=1)
+
+
+class TestUploadStats(unittest.TestCase):
+
+    def test_totals(self):
+
+        stats = UploadStats()
+        stats.start(300)
+        stats.record_chunk(100, 200, 0.2)
+        stats.record_chunk(0, 100, 0.1)
+        stats.finish()
+
+        self.assertEqual(stats.chunk_sizes, [100, 200])
+        self.assertEqual(stats.bytes_sent, 300)
+        self.assertGreater(stats.throughput, 0)
+
+    def test_latency(self):
+
+        stats = TransferStats()
+
+        for seconds in (0.001, 0.02, 0.03, 0.2, 30):
+            stats.record_chunk(0, 1, seconds)
+
+        histogram = dict(stats.latency_histogram((0.01, 0.1, 1.0)))
+
+        self.assertEqual(histogram, {0.01: 1, 0.1: 2, 1.0: 1})
+        self.assertEqual(stats.latency_percentile(50), 0.03)
+        self.assertEqual(stats.latency_percentile(100), 30)
+        self.assertEqual(stats.latency_percentile(0), 0.001)
+        self.assertIsNone(TransferStats().latency_percentile(50))
+
+        with self.assertRaises(ValueError):
+            stats.latency_percentile(101)
+
+    def test_events_and_phases(self):
+
+        events = []
+        stats = TransferStats(
+            callback=lambda event, stats, detail: events.append(
+                (event, detail)
+            )
+        )
+
+        stats.start()
+        self.assertIsNone(stats.progress)
+
+        stats.file_size = 10
+
+        with stats.phase('chunks'):
+            stats.record_chunk(0, 4, 0.5)
+            stats.record_retry()
+
+        with stats.phase('chunks'):
+            pass
+
+        stats.finish()
+
+        self.assertEqual([event for event, _ in events],
+                         ['start', 'chunk', 'retry', 'phase', 'phase',
+                          'finish'])
+        self.assertEqual(events[1][1], (0, 4, 0.5))
+        self.assertEqual(events[3][1][0], 'chunks')
+        self.assertEqual(list(stats.phases), ['chunks'])
+        self.assertEqual(stats.retries, 1)
+        self.assertEqual(stats.progress, 0.4)
+
+    def test_start_resets(self):
+
+        stats = TransferStats()
+        stats.start(10)
+
+        with stats.phase('chunks'):
+            stats.record_chunk(0, 10, 0.1)
+            stats.record_retry()
+
+        stats.finish()
+        stats.start()
+        stats.add_size(4)
+        stats.add_size(6)
+
+        self.assertEqual(stats.chunks, [])
+        self.assertEqual(stats.phases, {})
+        self.assertEqual(stats.retries, 0)
+        self.assertIsNone(stats.finished)
+        self.assertEqual(stats.file_size, 10)
+        self.assertEqual(stats.progress, 0.0)
+
+
+class TestUploadSource(unittest.TestCase):
+
+    def test_sources(self):
+        content = bytes(range(256)) * 4
+
+        with upload_source(bytearray(content)) as source:
+            self.assertTrue(source.random_access)
+            self.assertEqual(source.size, len(content))
+            self.assertEqual(bytes(source.chunk(1000, 24)), content[1000:])
+
+        with upload_source(io.BytesIO(content)) as source:
+            self.assertFalse(source.random_access)
+            self.assertEqual(source.size, len(content))
+            self.assertEqual(bytes(source.chunk(0, 10)), content[:10])
+
+            with self.assertRaises(ValueError):
+                source.chunk(100, 10)
+
+        blocks = [content[:3], content[3:600], content[600:]]
+
+        with upload_source(iter(blocks), size=len(content)) as source:
+            self.assertEqual(bytes(source.chunk(0, 500)), content[:500])
+            self.assertEqual(bytes(source.chunk(500, 524)), content[500:])
+
+    def test_invalid_sources(self):
+
+        with self.assertRaises(ValueError):
+            with upload_source(iter([b'abc'])):
+                pass
+
+        with self.assertRaises(ValueError):
+            with upload_source(b'abc', size=4):
+                pass
+
+        with self.assertRaises(ValueError):
+            with upload_source(42):
+                pass
+
+
+class TestUploadJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'journal.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_missing_ranges(self):
+
+        self.assertEqual(missing_ranges([], 10), [[0, 10]])
+        self.assertEqual(
+            missing_ranges([[0, 3], [5, 7]], 10), [[3, 5], [7, 10]]
+        )
+        self.assertEqual(missing_ranges([[0, 10]], 10), [])
+
+    def test_acknowledged_ranges_merge_and_persist(self):
+
+        journal = UploadJournal(self.path, flush_interval=0)
+        key = journal.make_key('http://host/', 'db', 'a.step')
+
+        journal.begin(key, {'size': 30}, 'T1', 'F1', 'N1')
+        journal.acknowledge(key, 10, 20)
+        journal.acknowledge(key, 0, 10)
+        journal.acknowledge(key, 25, 30)
+
+        entry = UploadJournal(self.path).get(key)
+
+        self.assertEqual(entry['transaction_id'], 'T1')
+        self.assertEqual(entry['ranges'], [[0, 20], [25, 30]])
+
+        journal.discard(key)
+
+        self.assertIsNone(UploadJournal(self.path).get(key))
+
+    def test_flush_interval_batches_writes(self):
+
+        journal = UploadJournal(self.path, flush_interval=3600)
+        key = journal.make_key('http://host', 'db', 'a.step')
+
+        journal.begin(key, {'size': 30}, 'T1', 'F1', 'N1')
+        journal.acknowledge(key, 0, 10)
+
+        self.assertEqual(UploadJournal(self.path).get(key)['ranges'], [])
+
+        journal.flush()
+
+        self.assertEqual(
+            UploadJournal(self.path).get(key)['ranges'], [[0, 10]]
+        )
+
+
+class TestContentIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.directory, 'part.step')
+
+        with open(self.file_path, 'wb') as f:
+            f.write(b'solid' * 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_file_digests(self):
+
+        self.assertEqual(
+            file_digests(self.file_path, block_size=7),
+            (hashlib.sha256(b'solid' * 1000).hexdigest(),
+             hashlib.md5(b'solid' * 1000).hexdigest())
+        )
+
+    def test_persists_files_and_digests(self):
+
+        path = os.path.join(self.directory, 'index.json')
+
+        index = ContentIndex(path)
+        sha256, _ = index.digests(self.file_path)
+        key = index.make_key('http://host', 'db', sha256, 'part.step')
+        index.set(key, 'F1')
+
+        # nothing is written until the index is saved
+        self.assertFalse(os.path.exists(path))
+
+        index.save()
+        reloaded = ContentIndex(path)
+
+        self.assertEqual(reloaded.get(key), 'F1')
+        self.assertIn(os.path.abspath(self.file_path), reloaded._digests)
+
+        reloaded.discard(key)
+        reloaded.save()
+
+        self.assertIsNone(ContentIndex(path).get(key))
+
+    def test_unchanged_index_not_rewritten(self):
+
+        path = os.path.join(self.directory, 'index.json')
+
+        index = ContentIndex(path)
+        index.digests(self.file_path)
+        index.save()
+        os.remove(path)
+
+        index.digests(self.file_path)
+        index.save()
+
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(os.listdir(self.directory), ['part.step'])
+
+    def test_rehashes_changed_file(self):
+
+        index = ContentIndex()
+        before = index.digests(self.file_path)
+
+        with open(self.file_path, 'ab') as f:
+            f.write(b'!')
+
+        self.assertNotEqual(index.digests(self.file_path), before)
+
+
+class TestSyncManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_scan_tree(self):
+        os.makedirs(os.path.join(self.directory, 'a', 'b'))
+
+        for relative_path in ('top.txt', 'a/b/deep.txt', 'skip.json'):
+            with open(os.path.join(self.directory, relative_path), 'wb') as f:
+                f.write(b'x' * len(relative_path))
+
+        files = scan_tree(self.directory,
+                          [os.path.join(self.directory, 'skip.json')])
+
+        self.assertEqual(sorted(files), ['a/b/deep.txt', 'top.txt'])
+        self.assertEqual(files['top.txt'][0], 7)
+
+    def test_persists_on_save(self):
+        path = os.path.join(self.directory, 'manifest.json')
+
+        manifest = SyncManifest(path)
+        manifest.set('a/b.txt', 3, 10, 'abc', 'F1')
+
+        self.assertEqual(len(SyncManifest(path)), 0)
+
+        manifest.save()
+        manifest = SyncManifest(path)
+
+        self.assertEqual(manifest.get('a/b.txt')['file_id'], 'F1')
+
+        manifest.discard('a/b.txt')
+        self.assertEqual(manifest.paths(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
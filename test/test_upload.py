@@ -0,0 +1,634 @@
+from fakes import (
+    FakeResponse, FakeServer, connect, http_part, multipart_response,
+    parse_url
+)
+from src.api.batch import _split_multipart
+from src.api.files import FilesAPI
+from src.api.transfer import (
+    AdaptiveChunkSize, ContentIndex, SyncManifest, UploadJournal,
+    UploadStats
+)
+import hashlib
+import io
+import json
+import os
+import re
+import requests
+import shutil
+import tempfile
+import unittest
+
+
+class _Vault(FakeServer):
+    """
+    Vault answering uploads in memory. Chunks are reassembled from their
+    Content-Range headers; fail_at makes the chunk starting at that offset
+    return a 500 and die_at makes it lose the connection. With forgetful
+    set, chunks for transactions this server did not begin are refused
+    with a 404. Chunks of the file number fail_number fail and the commit
+    part of the filename reject_commit is refused. With commit_parts set
+    the commit reply holds only that many parts; with commit_lost set the
+    commit loses the connection.
+    """
+
+    def __init__(self, fail_at=None, die_at=None, forgetful=False,
+                 fail_number=None, reject_commit=None, commit_parts=None,
+                 commit_lost=False):
+        super().__init__()
+        self.fail_at = fail_at
+        self.die_at = die_at
+        self.forgetful = forgetful
+        self.fail_number = fail_number
+        self.reject_commit = reject_commit
+        self.commit_parts = commit_parts
+        self.commit_lost = commit_lost
+        self.transactions = 0
+        self.received = {}
+        self.received_by_file = {}
+        self.commits = []
+        self.committed_transactions = []
+        self.files = {}
+
+    def handle(self, method, url, headers, data, **kwargs):
+        path, params = parse_url(url)
+
+        if path.endswith('vault.BeginTransaction'):
+            with self.lock:
+                self.transactions += 1
+                transaction_id = f"T{self.transactions}"
+
+            return FakeResponse(200, {'transactionId': transaction_id})
+
+        if path.endswith('vault.CommitTransaction'):
+            return self.commit(headers, data)
+
+        if path.endswith('vault.UploadFile'):
+            return self.chunk(params['fileId'], headers, data)
+
+        if path.endswith('/File'):
+            name = re.match(r"filename eq '(.*)'$", params['$filter'])
+
+            return FakeResponse(200, {'value': [
+                record for record in self.files.values()
+                if record['filename'] == name.group(1)
+            ]})
+
+        file_id = re.search(r"File\('(\w+)'\)$", path).group(1)
+
+        if file_id not in self.files:
+            return FakeResponse(404, {'error': {'code': 'NotFound'}})
+
+        return FakeResponse(200, self.files[file_id])
+
+    def commit(self, headers, body):
+        if self.commit_lost:
+            raise requests.ConnectionError("connection reset")
+
+        self.commits.append(body)
+        self.committed_transactions.append(headers['transactionid'])
+
+        answers = []
+        for _, part in _split_multipart(body, headers['Content-Type']):
+            record = json.loads(part.partition(b'\r\n\r\n')[2])
+
+            if record['filename'] == self.reject_commit:
+                answers.append(http_part(400))
+                continue
+
+            self.files[record['id']] = {
+                'id': record['id'],
+                'filename': record['filename'],
+                'file_size': record['file_size']
+            }
+            answers.append(http_part(201))
+
+        return multipart_response(answers[:self.commit_parts])
+
+    def chunk(self, file_id, headers, data):
+        start = int(
+            re.match(r'bytes (\d+)-', headers['Content-Range']).group(1)
+        )
+
+        if start == self.fail_at:
+            return FakeResponse(500)
+
+        if (self.fail_number is not None
+                and headers['Content-Disposition'].endswith(
+                    self.fail_number)):
+            return FakeResponse(500)
+
+        if start == self.die_at:
+            raise requests.ConnectionError()
+
+        if (self.forgetful
+                and headers['transactionid'] != f"T{self.transactions}"):
+            return FakeResponse(404)
+
+        with self.lock:
+            self.received[start] = bytes(data)
+            self.received_by_file.setdefault(file_id, {})[start] = bytes(
+                data
+            )
+
+        return FakeResponse(200)
+
+    def assembled(self):
+        return b''.join(
+            self.received[start] for start in sorted(self.received)
+        )
+
+
+class TestUpload(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        self.content = os.urandom(100003)
+
+        with os.fdopen(handle, 'wb') as f:
+            f.write(self.content)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_parallel_upload(self):
+
+        vault = _Vault()
+        api = connect(FilesAPI, vault)
+        api.upload_file(self.path, 'F-1', workers=8, chunk_size=4096)
+
+        self.assertEqual(vault.assembled(), self.content)
+        self.assertEqual(len(vault.received), -(-len(self.content) // 4096))
+        self.assertEqual(len(vault.commits), 1)
+
+    def test_serial_upload(self):
+
+        vault = _Vault()
+        api = connect(FilesAPI, vault)
+        api.upload_file(self.path, 'F-1', workers=1)
+
+        self.assertEqual(vault.assembled(), self.content)
+
+    def test_adaptive_upload(self):
+
+        vault = _Vault()
+        api = connect(FilesAPI, vault)
+        sizer = AdaptiveChunkSize(initial=1024, minimum=1024, maximum=65536)
+        stats = UploadStats()
+
+        api.upload_file(self.path, 'F-1', workers=2, chunk_size=sizer,
+                        stats=stats)
+
+        self.assertEqual(vault.assembled(), self.content)
+        self.assertEqual(stats.bytes_sent, len(self.content))
+        self.assertGreater(max(stats.chunk_sizes), 1024)
+        self.assertLessEqual(max(stats.chunk_sizes), 65536)
+
+    def test_stats_phases_and_events(self):
+
+        vault = _Vault()
+        api = connect(FilesAPI, vault)
+        chunks = []
+        stats = UploadStats(
+            callback=lambda event, stats, detail: (
+                chunks.append(detail) if event == 'chunk' else None
+            )
+        )
+
+        api.upload_file(self.path, 'F-1', workers=4, chunk_size=4096,
+                        stats=stats)
+
+        self.assertEqual(set(stats.phases),
+                         {'transaction', 'chunks', 'commit'})
+        self.assertEqual(stats.file_size, len(self.content))
+        self.assertEqual(stats.progress, 1.0)
+        self.assertEqual(len(chunks), -(-len(self.content) // 4096))
+        self.assertIsNotNone(stats.finished)
+
+    def test_fail_fast(self):
+
+        vault = _Vault(fail_at=0)
+        api = connect(FilesAPI, vault)
+
+        with self.assertRaises(ValueError):
+            api.upload_file(self.path, 'F-1', workers=1, chunk_size=1000)
+
+        self.assertEqual(vault.received, {})
+        self.assertEqual(vault.commits, [])
+
+    def test_empty_file(self):
+
+        vault = _Vault()
+        api = connect(FilesAPI, vault)
+
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+
+        try:
+            api.upload_file(path, 'F-1')
+        finally:
+            os.remove(path)
+
+        self.assertEqual(vault.received, {})
+        self.assertEqual(len(vault.commits), 1)
+
+    def test_escape_url(self):
+
+        vault = _Vault()
+        api = connect(FilesAPI, vault)
+
+        self.assertEqual(
+            api._escapeURL("50% (v2) 'a'+b?#.step"),
+            "50%25%20%28v2%29%20%27a%27%2Bb%3F%23.step"
+        )
+
+    def test_resume_from_journal(self):
+
+        journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, journal_dir)
+        journal_path = os.path.join(journal_dir, 'uploads.json')
+
+        first_vault = _Vault(die_at=50000)
+        first = connect(FilesAPI, first_vault)
+
+        with self.assertRaises(requests.ConnectionError):
+            first.upload_file(self.path, 'F-1', workers=1, chunk_size=10000,
+                              journal=UploadJournal(journal_path))
+
+        self.assertEqual(sorted(first_vault.received), [0, 10000, 20000, 30000,
+                                                  40000])
+
+        # a new process picks up the journal and sends only the rest
+        second_vault = _Vault()
+        second = connect(FilesAPI, second_vault)
+        journal = UploadJournal(journal_path)
+        second.upload_file(self.path, 'F-1', workers=1, chunk_size=10000,
+                           journal=journal)
+
+        self.assertEqual(second_vault.transactions, 0)
+        self.assertEqual(min(second_vault.received), 50000)
+        self.assertEqual(len(second_vault.commits), 1)
+        self.assertEqual(second_vault.committed_transactions, ['T1'])
+        self.assertEqual(
+            first_vault.assembled() + second_vault.assembled(),
+            self.content
+        )
+        self.assertIsNone(journal.get(journal.make_key(
+            second._base_url, second._database, self.path
+        )))
+
+    def test_resume_dropped_transaction(self):
+
+        journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, journal_dir)
+        journal_path = os.path.join(journal_dir, 'uploads.json')
+
+        first_vault = _Vault(die_at=30000)
+        first = connect(FilesAPI, first_vault)
+
+        with self.assertRaises(requests.ConnectionError):
+            first.upload_file(self.path, 'F-1', workers=1, chunk_size=10000,
+                              journal=UploadJournal(journal_path))
+
+        # the vault forgot T1, so the upload starts again from byte 0
+        second_vault = _Vault(forgetful=True)
+        second = connect(FilesAPI, second_vault)
+        second.upload_file(self.path, 'F-1', workers=1, chunk_size=10000,
+                           journal=UploadJournal(journal_path))
+
+        self.assertEqual(second_vault.transactions, 1)
+        self.assertEqual(second_vault.assembled(), self.content)
+        self.assertEqual(len(second_vault.commits), 1)
+
+    def test_journal_ignores_changed_file(self):
+
+        journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, journal_dir)
+        journal_path = os.path.join(journal_dir, 'uploads.json')
+
+        first_vault = _Vault(die_at=30000)
+        first = connect(FilesAPI, first_vault)
+
+        with self.assertRaises(requests.ConnectionError):
+            first.upload_file(self.path, 'F-1', workers=1, chunk_size=10000,
+                              journal=UploadJournal(journal_path))
+
+        with open(self.path, 'r+b') as f:
+            f.write(b'changed')
+
+        second_vault = _Vault()
+        second = connect(FilesAPI, second_vault)
+        second.upload_file(self.path, 'F-1', workers=1, chunk_size=10000,
+                           journal=UploadJournal(journal_path))
+
+        self.assertEqual(second_vault.transactions, 1)
+        self.assertEqual(min(second_vault.received), 0)
+
+    def test_dedup_skips_indexed_content(self):
+
+        vault = _Vault()
+        api = connect(FilesAPI, vault)
+        index = ContentIndex()
+
+        file_id = api.upload_file_dedup(self.path, 'F-1', index)
+
+        self.assertEqual(list(vault.files), [file_id])
+        self.assertEqual(len(vault.commits), 1)
+
+        self.assertEqual(api.upload_file_dedup(self.path, 'F-1', index),
+                         file_id)
+        self.assertEqual(len(vault.commits), 1)
+
+    def test_dedup_reuploads_deleted_file(self):
+
+        vault = _Vault()
+        api = connect(FilesAPI, vault)
+        index = ContentIndex()
+
+        file_id = api.upload_file_dedup(self.path, 'F-1', index)
+        del vault.files[file_id]
+
+        self.assertNotEqual(api.upload_file_dedup(self.path, 'F-1', index),
+                            file_id)
+        self.assertEqual(len(vault.commits), 2)
+
+    def test_dedup_matches_server_checksum(self):
+
+        vault = _Vault()
+        api = connect(FilesAPI, vault)
+        name = os.path.basename(self.path)
+        vault.files['EXISTING'] = {
+            'id': 'EXISTING',
+            'filename': name,
+            'file_size': len(self.content),
+            'checksum': hashlib.md5(self.content).hexdigest().upper()
+        }
+        vault.files['OTHER'] = dict(vault.files['EXISTING'], id='OTHER',
+                                  checksum='0' * 32)
+
+        index = ContentIndex()
+
+        self.assertEqual(api.upload_file_dedup(self.path, 'F-1', index),
+                         'EXISTING')
+        self.assertEqual(vault.commits, [])
+
+    def test_upload_files_single_transaction(self):
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        contents = {}
+        files = []
+        for number in range(5):
+            path = os.path.join(directory, f"part{number}.step")
+            contents[path] = os.urandom(5000 + number)
+
+            with open(path, 'wb') as f:
+                f.write(contents[path])
+
+            files.append((path, f"N-{number}"))
+
+        vault = _Vault(fail_number='N-1', reject_commit='part3.step')
+        api = connect(FilesAPI, vault)
+
+        results = api.upload_files(files, workers=3, chunk_size=1024)
+
+        self.assertEqual(vault.transactions, 1)
+        self.assertEqual(len(vault.commits), 1)
+        self.assertEqual([result.file_path for result in results],
+                         [path for path, _ in files])
+        self.assertEqual([result.ok for result in results],
+                         [True, False, True, False, True])
+        self.assertEqual(results[3].commit_status, 400)
+        self.assertIsNone(results[1].commit_status)
+
+        for result in results:
+            if result.ok:
+                chunks = vault.received_by_file[result.file_id]
+                self.assertEqual(
+                    b''.join(chunks[start] for start in sorted(chunks)),
+                    contents[result.file_path]
+                )
+                self.assertEqual(result.size, len(contents[result.file_path]))
+                self.assertIn(result.file_id, vault.files)
+
+    def test_upload_files_unmatched_commit(self):
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        files = []
+        for number in range(3):
+            path = os.path.join(directory, f"part{number}.step")
+
+            with open(path, 'wb') as f:
+                f.write(os.urandom(100))
+
+            files.append((path, f"N-{number}"))
+
+        # a short reply cannot be matched to the files
+        api = connect(FilesAPI, _Vault(commit_parts=2))
+        results = api.upload_files(files)
+
+        self.assertEqual([result.ok for result in results],
+                         [False, False, False])
+        self.assertIsNone(results[0].commit_status)
+
+        # a lost commit is reported on every file instead of raised
+        api = connect(FilesAPI, _Vault(commit_lost=True))
+        results = api.upload_files(files)
+
+        self.assertTrue(all(isinstance(result.error, requests.ConnectionError)
+                            for result in results))
+        self.assertTrue(all(result.file_id for result in results))
+
+    def test_upload_files_stats(self):
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        files = []
+        for number in range(3):
+            path = os.path.join(directory, f"part{number}.step")
+
+            with open(path, 'wb') as f:
+                f.write(os.urandom(3000 + number))
+
+            files.append((path, f"N-{number}"))
+
+        vault = _Vault()
+        api = connect(FilesAPI, vault)
+        stats = UploadStats()
+
+        # left over from an earlier transfer
+        stats.start(1)
+        stats.record_chunk(0, 1, 0.1)
+
+        api.upload_files(files, workers=3, chunk_size=1024, stats=stats)
+
+        self.assertEqual(stats.file_size, 9003)
+        self.assertEqual(stats.bytes_sent, 9003)
+        self.assertEqual(len(stats.chunks), 9)
+        self.assertEqual(set(stats.phases),
+                         {'transaction', 'chunks', 'commit'})
+        self.assertIsNotNone(stats.finished)
+
+    def test_upload_files_empty(self):
+
+        vault = _Vault()
+        api = connect(FilesAPI, vault)
+
+        self.assertEqual(api.upload_files([]), [])
+        self.assertEqual(vault.transactions, 0)
+
+    def test_upload_content_sources(self):
+
+        def blocks():
+            for start in range(0, len(self.content), 777):
+                yield self.content[start:start + 777]
+
+        sources = [
+            (self.content, None),
+            (io.BytesIO(self.content), None),
+            (blocks(), len(self.content))
+        ]
+
+        for source, size in sources:
+            vault = _Vault()
+            api = connect(FilesAPI, vault)
+            api.upload_file(source, 'F-1', workers=4, chunk_size=4096,
+                            file_name='part.step', size=size)
+
+            record, = vault.files.values()
+
+            self.assertEqual(vault.assembled(), self.content)
+            self.assertEqual(record['filename'], 'part.step')
+            self.assertEqual(record['file_size'], len(self.content))
+
+    def test_upload_short_source(self):
+
+        vault = _Vault()
+        api = connect(FilesAPI, vault)
+
+        with self.assertRaises(ValueError):
+            api.upload_file(iter([self.content[:5000]]), 'F-1',
+                            chunk_size=4096, file_name='part.step',
+                            size=len(self.content))
+
+        self.assertEqual(vault.commits, [])
+
+    def test_invalid_arguments(self):
+
+        vault = _Vault()
+        api = connect(FilesAPI, vault)
+
+        with self.assertRaises(ValueError):
+            api.upload_file(self.path, 'F-1', workers=0)
+
+        with self.assertRaises(ValueError):
+            api.upload_file(self.path, 'F-1', chunk_size=0)
+
+        with self.assertRaises(ValueError):
+            api.upload_file(self.content, 'F-1')
+
+        with self.assertRaises(ValueError):
+            api.upload_file(iter([self.content]), 'F-1', file_name='a.step')
+
+        with self.assertRaises(ValueError):
+            api.upload_file(self.content, 'F-1', file_name='a.step',
+                            journal=UploadJournal(self.path + '.journal'))
+
+
+class TestSyncDirectory(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.manifest_path = os.path.join(self.directory, 'manifest.json')
+
+        os.mkdir(os.path.join(self.directory, 'sub'))
+        self.write('a.step', b'a' * 5000)
+        self.write('sub/b.step', b'b' * 7000)
+        self.write('sub/c.step', b'c' * 10)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, relative_path, content):
+        with open(os.path.join(self.directory, relative_path), 'wb') as f:
+            f.write(content)
+
+    def test_incremental_sync(self):
+
+        vault = _Vault()
+        api = connect(FilesAPI, vault)
+        manifest = SyncManifest(self.manifest_path)
+
+        result = api.sync_directory(self.directory, manifest, workers=4,
+                                    chunk_size=4096, batch_size=2)
+
+        self.assertTrue(result.ok)
+        self.assertEqual(sorted(r.file_number for r in result.uploaded),
+                         ['a.step', 'sub/b.step', 'sub/c.step'])
+        self.assertEqual(vault.transactions, 2)
+
+        # a reloaded manifest skips everything
+        manifest = SyncManifest(self.manifest_path)
+        result = api.sync_directory(self.directory, manifest)
+
+        self.assertEqual(result.uploaded, [])
+        self.assertEqual(len(result.unchanged), 3)
+        self.assertEqual(vault.transactions, 2)
+
+        # touched files are hashed but not uploaded, changed ones are
+        path = os.path.join(self.directory, 'a.step')
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10 ** 9))
+        self.write('sub/b.step', b'B' * 7000)
+        os.remove(os.path.join(self.directory, 'sub', 'c.step'))
+
+        file_id = manifest.get('a.step')['file_id']
+        result = api.sync_directory(self.directory, manifest)
+
+        self.assertEqual([r.file_number for r in result.uploaded],
+                         ['sub/b.step'])
+        self.assertEqual(result.unchanged, ['a.step'])
+        self.assertEqual(result.removed, ['sub/c.step'])
+        self.assertEqual(manifest.get('a.step')['file_id'], file_id)
+        self.assertEqual(len(SyncManifest(self.manifest_path)), 2)
+
+    def test_stats_cover_all_batches(self):
+
+        vault = _Vault()
+        api = connect(FilesAPI, vault)
+        stats = UploadStats()
+
+        api.sync_directory(self.directory, SyncManifest(), chunk_size=4096,
+                           batch_size=2, stats=stats)
+
+        self.assertEqual(vault.transactions, 2)
+        self.assertEqual(stats.file_size, 12010)
+        self.assertEqual(stats.bytes_sent, 12010)
+        self.assertEqual(set(stats.phases),
+                         {'hash', 'transaction', 'chunks', 'commit'})
+        self.assertIsNotNone(stats.finished)
+
+    def test_failed_upload_is_retried(self):
+
+        vault = _Vault(fail_number='b.step')
+        api = connect(FilesAPI, vault)
+        manifest = SyncManifest()
+
+        result = api.sync_directory(self.directory, manifest)
+
+        self.assertEqual([r.file_number for r in result.failed],
+                         ['sub/b.step'])
+        self.assertIsNone(manifest.get('sub/b.step'))
+
+        vault.fail_number = None
+        result = api.sync_directory(self.directory, manifest)
+
+        self.assertTrue(result.ok)
+        self.assertEqual([r.file_number for r in result.uploaded],
+                         ['sub/b.step'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+from fakes import FakeServer, connect, parse_url
+from src.api.parts import PartsAPI
+import re
+import unittest
+
+
+def _row(bom_id, parent_id, child_id, quantity, modified_on):
+    return {
+        'id': bom_id,
+        'source_id@aras.id': parent_id,
+        'related_id@aras.id': child_id,
+        'quantity': quantity,
+        'modified_on': modified_on
+    }
+
+
+class _BOMServer(FakeServer):
+    """
+    Server paging Part BOM rows from a list, honoring a modified_on ge
+    filter and recording the query options of every page request.
+    """
+
+    def __init__(self, rows):
+        super().__init__()
+        self.rows = rows
+        self.listings = []
+
+    def handle(self, method, url, headers, data, **kwargs):
+        path, params = parse_url(url)
+        self.listings.append(params)
+
+        match = re.match(r'modified_on ge (\S+)', params.get('$filter', ''))
+        rows = [
+            row for row in self.rows
+            if match is None or row['modified_on'] >= match.group(1)
+        ]
+
+        return self.page(rows, params)
+
+
+class TestWhereUsed(unittest.TestCase):
+
+    def setUp(self):
+        # A uses B and C, both use the shared bolt D; E uses A
+        self.server = _BOMServer([
+            _row('1', 'A', 'B', '2', '2024-01-01T00:00:00'),
+            _row('2', 'A', 'C', '1', '2024-01-01T00:00:00'),
+            _row('3', 'B', 'D', '4', '2024-01-02T00:00:00'),
+            _row('4', 'C', 'D', None, '2024-01-02T00:00:00'),
+            _row('5', 'E', 'A', '1', '2024-01-03T00:00:00')
+        ])
+        self.api = connect(PartsAPI, self.server)
+        self.index = self.api.where_used_index(page_size=2)
+
+    def test_load_selects_only_bom_columns(self):
+
+        params = self.server.listings[0]
+
+        self.assertEqual(params['$select'],
+                         'id,source_id,related_id,quantity,modified_on')
+        self.assertNotIn('$filter', params)
+        self.assertEqual(len(self.index), 5)
+
+    def test_queries(self):
+
+        self.assertEqual(sorted(self.index.where_used('D')),
+                         [('B', 4.0), ('C', None)])
+        self.assertEqual(self.index.where_used('E'), [])
+        self.assertEqual(self.index.impact('D'), ['B', 'C', 'A', 'E'])
+        self.assertEqual(self.index.top_level('D'), ['E'])
+
+    def test_incremental_refresh(self):
+
+        # row 3 now points B at a new bolt F, and F is also used by C
+        self.server.rows[2] = _row('3', 'B', 'F', '4', '2024-02-01T00:00:00')
+        self.server.rows.append(
+            _row('6', 'C', 'F', '8', '2024-02-01T00:00:00')
+        )
+
+        # the newest row already seen is read again, see refresh
+        self.assertEqual(self.index.refresh(), 3)
+        self.assertEqual(
+            [params['$filter'] for params in self.server.listings
+             if '$filter' in params],
+            ['modified_on ge 2024-01-03T00:00:00'] * 2
+        )
+
+        self.assertEqual(self.index.where_used('D'), [('C', None)])
+        self.assertEqual(sorted(self.index.where_used('F')),
+                         [('B', 4.0), ('C', 8.0)])
+        self.assertEqual(self.index.modified_since, '2024-02-01T00:00:00')
+
+    def test_refresh_drops_deleted_rows(self):
+
+        # C no longer uses the bolt D, nothing else changed
+        del self.server.rows[3]
+
+        self.assertEqual(self.index.refresh(), 1)
+        self.assertEqual(self.index.where_used('D'), [('B', 4.0)])
+        self.assertEqual(self.index.impact('D'), ['B', 'A', 'E'])
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(self.server.listings[-1]['$select'], 'id')
+
+    def test_expanded_item_properties(self):
+
+        api = connect(PartsAPI, _BOMServer([{
+            'id': '1',
+            'source_id': {'id': 'A'},
+            'related_id': {'id': 'B'},
+            'quantity': 3,
+            'modified_on': '2024-01-01T00:00:00'
+        }]))
+
+        self.assertEqual(api.where_used_index().where_used('B'),
+                         [('A', 3.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,4 @@
+from src.api.bomdiff import BOMSnapshot, diff_boms
 import os
 import pandas as pd
 
@@ -8,8 +9,9 @@ class TransferPipeline:
     environment to the Aras Innovator environment.
     """
     def __init__(self, aras_parts_api, aras_files_api, ht_api, bom_file,
-                 space_id, path=None):
+                 space_id, path=None, content_index=None):
         self.ht_api = ht_api
+        self.content_index = content_index
         self.space_id = space_id
         self.path = path
         self.bom_file = bom_file
@@ -148,12 +150,20 @@ class TransferPipeline:
                 }
             )
 
-        # uploads the files in the list
+        # uploads the files in the list, skipping files already in the
+        # vault when a content index is available
         for pair in updated_local_files:
-            self.aras_files_api.upload_file(
-                file_path=pair['file_number'],
-                file_number=str(pair['item number'])
-            )
+            if self.content_index is not None:
+                self.aras_files_api.upload_file_dedup(
+                    file_path=pair['file_number'],
+                    file_number=str(pair['item number']),
+                    index=self.content_index
+                )
+            else:
+                self.aras_files_api.upload_file(
+                    file_path=pair['file_number'],
+                    file_number=str(pair['item number'])
+                )
 
     def _link_files_to_parts(self):
         """
@@ -184,6 +194,29 @@ class TransferPipeline:
             )
         print('Pairing Process Completed.')
 
+    def diff_bom(self, part_id, item_number):
+        """
+        Compares the BOM of an existing Aras assembly with the BOM
+        spreadsheet and returns the BOMChange operations that would bring
+        Aras in line with it, so a re-import only touches what changed.
+
+        Parameters
+        ----------
+        part_id: str
+            the id of the assembly in Aras
+        item_number: str
+            the item number of the assembly, the root of the spreadsheet
+        """
+        aras_bom = BOMSnapshot.from_structure(
+            self.aras_parts_api.get_product_structure(part_id), item_number
+        )
+        sheet_bom = BOMSnapshot.from_dataframe(
+            pd.read_excel(self.bom_file, dtype={'ITEM NO.': str}),
+            item_number
+        )
+
+        return diff_boms(aras_bom, sheet_bom)
+
     def create_parts_from_metadata(self):
         """
         Uses metadata from a list of hyperthought files to create parts